@@ -1,18 +1,18 @@
 import streamlit as st
-import pandas as pd
-from pymongo import MongoClient
-from datetime import datetime, timedelta, timezone
-import plotly.express as px
-from google import generativeai as genai
-from modules.refresh_ado_workitems import refresh_work_items
-from modules.refresh_iterations import refresh_iterations  # updated import
 from modules.hide_pages import hide_internal_pages
+from modules.perf_trace import start_trace, get_trace, timed
 
 # ---------------------------------------------
 # HIDE PAGES FROM NAV
 # ---------------------------------------------
 hide_internal_pages()
 
+# ---------------------------------------------
+# PERFORMANCE TRACE (opt-in debug panel via ?debug=perf)
+# ---------------------------------------------
+show_perf_panel = st.query_params.get("debug") == "perf" or st.secrets.get("debug", {}).get("perf_panel", False)
+start_trace(track_memory=show_perf_panel)
+
 # ---------------------------------------------
 # PAGE TITLE
 # ---------------------------------------------
@@ -33,6 +33,121 @@ if not st.session_state["logged_in"]:
         )
     st.stop()
 
+# ---------------------------------------------
+# HEAVY IMPORTS (only for logged-in users; Gemini and ADO SDKs load on use)
+# ---------------------------------------------
+with timed("imports"):
+    import threading
+    from itertools import chain
+    import pandas as pd
+    import plotly.express as px
+    from pymongo import MongoClient
+    from datetime import datetime, timezone
+    from functools import partial
+    from modules.ai_insights import (
+        AI_CACHE_COLLECTION, DEFAULT_CACHE_TTL_HOURS, DEFAULT_CACHE_MAX_ENTRIES, DEFAULT_TIMEOUT_SECONDS,
+        InsightStream, active_model_name, build_prompt, cache_key, create_model, get_cached_insight, store_insight
+    )
+    from modules.metrics import (
+        ITERATION_PROJECTION, WORKITEM_PROJECTION, DEFAULT_FRAME_CHUNK_SIZE, build_iterations_frame,
+        load_workitems_frame, frame_memory_mb, add_lead_cycle_times, lead_cycle_summary,
+        burnup_counts, burnup_effort, cfd_counts, cfd_effort, estimate_accuracy, build_metrics_summary,
+        duration_stats, VALID_TYPES
+    )
+    from modules.archive import ARCHIVE_COLLECTION, archived_count, load_rollup, with_rollup_columns
+    from modules.datasets import ensure_access, user_team, dataset_subscribers
+    from modules.sync_runner import MessageLog, SyncConfigError, sync_settings, sync_user, sync_user_connections
+    from modules.connections import connection_name, switch_connection, user_connections
+    from modules.sync_state import get_sync_state
+    from modules.pregenerate_insights import get_pregenerated_insight, pregenerate_insights, saved_team_settings
+    from modules.forecast import CONFIDENCE_LEVELS, DEFAULT_TARGET_DAYS, delivery_forecast, forecast_settings
+    from modules.metric_sketches import frame_summary, iterations_summary
+    from modules.dashboard_filters import (
+        AREA_PATH_FIELD, is_filtered, iteration_query, iteration_range_paths, narrows_stories, workitem_query
+    )
+    from modules.chart_data import chart_settings, reduce_points, stacked_area
+    from modules.live_updates import (
+        DEFAULT_CHECK_SECONDS, DEFAULT_SETTLE_SECONDS, DEFAULT_POLL_SECONDS, changed_since, dataset_version,
+        start_listener
+    )
+
+
+def run_refresh():
+    """Sync the user's shared project dataset; returns True when there is new data to show.
+
+    The Azure DevOps SDK is only imported when a sync runs (see `modules.sync_runner`).
+    """
+    connections = user_connections(user)
+    if len(connections) > 1:
+        status = sync_connections(connections)
+        if status == "no-config":
+            st.error("Your active connection is incomplete. Check its settings.")
+            return False
+    else:
+        try:
+            status = sync_user(db, user_email, st)
+        except SyncConfigError as e:
+            st.error(str(e))
+            return False
+
+    if status in ("no-user", "no-access"):
+        st.error("Your PAT cannot read this project. Check the organization URL, project name and PAT in your settings.")
+        return False
+    if status == "fresh":
+        st.info("This project was synced a few minutes ago; showing that data.")
+        return True
+    if status == "busy":
+        st.info("Another user is syncing this project right now; its data will appear when that sync finishes.")
+        return False
+
+    # Optional post-sync stage: have the AI insight ready before the dashboard asks for it
+    ai_settings = st.secrets.get("ai", {})
+    if ai_settings.get("pregenerate"):
+        dataset = users_col.find_one({"email": user_email}, {"dataset_id": 1}).get("dataset_id")
+        model_factory = partial(create_model, st.secrets["google"]["api_key"], dict(ai_settings))
+        threading.Thread(
+            target=pregenerate_insights,
+            args=(db, dataset_subscribers(db, dataset), model_factory, dict(ai_settings)),
+            daemon=True
+        ).start()
+    return status == "synced"
+
+def sync_connections(connections):
+    """Sync all of the user's connections (different projects in parallel); returns the active one's status."""
+    logs = {}
+
+    def log_for(name):
+        return logs.setdefault(name, MessageLog())
+
+    with st.spinner(f"Syncing {len(connections)} connections..."):
+        results = sync_user_connections(db, user_email, log_for, max_workers=sync_settings())
+    for name, status in results.items():
+        with st.expander(f"{name}: {status}", expanded=status not in ("synced", "fresh", "shared")):
+            if name in logs:
+                logs[name].replay(st)
+
+    active = next((c for c in connections if c.get("id") == user.get("active_connection")), connections[0])
+    status = results.get(connection_name(active), "failed")
+    # The active team's data came with a sync of another connection to the same project
+    return "synced" if status == "shared" else status
+
+
+def render_connection_switcher():
+    """Sidebar choice of the active project/team; the other connections' data is already synced."""
+    connections = [c for c in user_connections(user) if c.get("id")]
+    if len(connections) < 2:
+        return
+    names = {c["id"]: connection_name(c) for c in connections}
+    ids = list(names)
+    active = user.get("active_connection")
+    choice = st.sidebar.selectbox("Project / team", ids, index=ids.index(active) if active in ids else 0,
+                                  format_func=names.get)
+    if choice != active and switch_connection(users_col, user, choice):
+        # Filters of the previous project do not apply to the new one
+        for key in ("filter_window", "filter_iterations", "filter_types", "filter_area"):
+            st.session_state.pop(key, None)
+        st.rerun()
+
 # ---------------------------------------------
 # CONNECT TO MONGO
 # ---------------------------------------------
@@ -45,6 +160,7 @@ try:
 
     iterations_col = db["ado-iterations"]
     workitems_col = db["ado-workitems"]
+    archive_col = db[ARCHIVE_COLLECTION]
     users_col = db["users"]
 
 except Exception as e:
@@ -52,34 +168,115 @@ except Exception as e:
     st.stop()
 
 # ---------------------------------------------
-# LOAD DATA FROM MONGO (FILTER BY ops_user)
+# LIVE UPDATES (rerun open dashboards when their dataset changes)
+# ---------------------------------------------
+live_settings = st.secrets.get("live", {})
+live_enabled = live_settings.get("enabled", True)
+if live_enabled:
+    start_listener(db, live_settings.get("change_stream", True), live_settings.get("poll_seconds", DEFAULT_POLL_SECONDS))
+
+
+@st.fragment(run_every=live_settings.get("check_seconds", DEFAULT_CHECK_SECONDS))
+def rerun_on_dataset_change(ds, loaded_version):
+    """Cheap timer check; the full page only reruns when another sync or a service hook changed the data."""
+    if changed_since(ds, loaded_version, live_settings.get("settle_seconds", DEFAULT_SETTLE_SECONDS)):
+        st.rerun()
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def area_path_options(ds, data_version):
+    """Area paths used in the dataset, archived stories included (index scans); refreshed when the data changes."""
+    paths = set(workitems_col.distinct(AREA_PATH_FIELD, {"dataset_id": ds}))
+    paths.update(archive_col.distinct(AREA_PATH_FIELD, {"dataset_id": ds}))
+    return sorted(p for p in paths if p)
+
+
+def render_filters(iteration_options, area_paths):
+    """Sidebar filters; the returned dict is pushed down into the MongoDB queries."""
+    st.sidebar.header("Filters")
+    filters = {}
+
+    window = st.sidebar.date_input("Date window", value=(), key="filter_window",
+                                   help="Stories created by the end of the window and not closed before its start.")
+    if len(window) == 2:
+        filters["start_date"], filters["end_date"] = window
+
+    paths = [doc["path"] for doc in iteration_options]
+    if len(paths) > 1:
+        first, last = st.sidebar.select_slider(
+            "Iterations", options=paths, value=(paths[0], paths[-1]), key="filter_iterations",
+            format_func=lambda path: path.rsplit("\\", 1)[-1]
+        )
+        if (first, last) != (paths[0], paths[-1]):
+            filters["iteration_paths"] = iteration_range_paths(iteration_options, first, last)
+
+    filters["types"] = st.sidebar.multiselect("Work item types", VALID_TYPES, default=VALID_TYPES,
+                                              key="filter_types") or VALID_TYPES
+
+    area_path = st.sidebar.selectbox("Area path (with sub-areas)", ["All"] + area_paths, key="filter_area")
+    if area_path != "All":
+        filters["area_path"] = area_path
+    return filters
+
+
+# ---------------------------------------------
+# LOAD DATA FROM MONGO (SHARED PROJECT DATASET)
 # ---------------------------------------------
 try:
     user_email = st.session_state.get("user_email")
-
-    iterations = list(iterations_col.find(
-        {"ops_user": user_email},
-        {"_id": 0, "path": 1, "startDate": 1, "finishDate": 1}
-    ))
-
-    workitems = list(workitems_col.find(
-        {"ops_user": user_email},
-        {
-            "_id": 0,
-            "System_CreatedDate": 1,
-            "Microsoft_VSTS_Common_ClosedDate": 1,
-            "System_IterationPath": 1,
-            "System_WorkItemType": 1,
-            "Microsoft_VSTS_Scheduling_Effort": 1,
-            "Microsoft_VSTS_Common_ActivatedDate": 1
-        }
-    ))
+    user = users_col.find_one({"email": user_email}, {"_id": 0}) if user_email else None
+    if user:
+        render_connection_switcher()
+
+    # Access to the project's dataset is granted by the user's own PAT (re-checked hourly)
+    with timed("dataset_access"):
+        dataset = ensure_access(db, user) if user else None
+    # Taken before loading so a change during the load still triggers a rerun
+    loaded_version = dataset_version(dataset) if dataset else None
+
+    iteration_options, iterations, has_workitems, dashboard_filters = [], [], False, {}
+    if dataset:
+        has_workitems = (workitems_col.find_one({"dataset_id": dataset}, {"_id": 1}) is not None
+                         or archive_col.find_one({"dataset_id": dataset}, {"_id": 1}) is not None)
+        iteration_options = list(iterations_col.find(
+            {"dataset_id": dataset, "teams": user_team(user)}, {"_id": 0, "path": 1}
+        ).sort("startDate", 1))
+        if iteration_options and has_workitems:
+            dashboard_filters = render_filters(iteration_options, area_path_options(dataset, loaded_version))
+
+        # Filters are part of the queries, so a filtered view only reads its slice
+        with timed("mongo_load.iterations") as record:
+            iterations = list(iterations_col.find(iteration_query(dataset, user_team(user), dashboard_filters),
+                                                  ITERATION_PROJECTION))
+            record["rows"] = len(iterations)
+
+    # Stream work items from the cursor straight into the compact frame
+    rollup = None
+    if iterations and has_workitems:
+        with timed("mongo_load.workitems_frame") as record:
+            iterations_df = build_iterations_frame(iterations)
+            query = workitem_query(dataset, dashboard_filters)
+            cursor = workitems_col.find(query, WORKITEM_PROJECTION, batch_size=DEFAULT_FRAME_CHUNK_SIZE)
+            # Archived stories come as per-iteration roll-ups; views filtered within iterations read them
+            if narrows_stories(dashboard_filters):
+                cursor = chain(cursor, archive_col.find(query, WORKITEM_PROJECTION,
+                                                        batch_size=DEFAULT_FRAME_CHUNK_SIZE))
+            workitems_df = load_workitems_frame(cursor, iterations_df)
+            record["rows"] = len(workitems_df)
+            record["frame_mb"] = round(frame_memory_mb(workitems_df), 3)
+            record["filtered"] = is_filtered(dashboard_filters)
+        if not narrows_stories(dashboard_filters):
+            with timed("mongo_load.rollups") as record:
+                rollup = load_rollup(db, dataset, iterations_df["path"].dropna().unique().tolist())
+                record["rows"] = rollup["count"] if rollup else 0
 except Exception as e:
     st.error(f"Error loading data from MongoDB: {e}")
     st.stop()
 
-if not iterations or not workitems:
+if not iteration_options or not has_workitems:
     user = users_col.find_one({"email": user_email}, {"_id": 0}) if user_email else None
+    if user:
+        render_connection_switcher()
 
     if not user:
         st.warning("User not found in database.")
@@ -94,92 +291,40 @@ if not iterations or not workitems:
         if user and missing_fields:
             st.write(f"⚠️ Missing fields: {', '.join(missing_fields)}")
 
-    if st.button("↻ Refresh", disabled=not all_fields_present):
-        refresh_iterations()
-        refresh_work_items()
+    if st.button("↻ Refresh", disabled=not all_fields_present) and run_refresh():
         st.success("Refreshed successfully!")
         st.rerun()
 
+    if live_enabled and dataset:
+        rerun_on_dataset_change(dataset, loaded_version)
     st.warning("No data found in MongoDB collections.")
     st.stop()
 
-# ---------------------------------------------
-# CONVERT TO DATAFRAMES AND NORMALIZE DATES
-# ---------------------------------------------
-iterations_df = pd.DataFrame(iterations)
-workitems_df = pd.DataFrame(workitems)
-
-# ✅ FILTER ONLY USER STORIES / PBIs
-valid_types = ["User Story", "PBI", "Product Backlog Item"]
-workitems_df = workitems_df[workitems_df["System_WorkItemType"].isin(valid_types)]
+if is_filtered(dashboard_filters) and (not iterations or (workitems_df.empty and not rollup)):
+    st.warning("No stories match the filters. Widen the date window, iterations, types or area path in the sidebar.")
+    st.stop()
 
-if workitems_df.empty:
+if workitems_df.empty and not rollup:
     st.warning("No User Stories or PBIs found in the work items collection.")
     st.stop()
 
-# Convert string dates to UTC datetime
-iterations_df["startDate"] = pd.to_datetime(iterations_df["startDate"], utc=True, errors="coerce")
-iterations_df["finishDate"] = pd.to_datetime(iterations_df["finishDate"], utc=True, errors="coerce")
-workitems_df["System_CreatedDate"] = pd.to_datetime(workitems_df["System_CreatedDate"], utc=True, errors="coerce")
-workitems_df["Microsoft_VSTS_Common_ClosedDate"] = pd.to_datetime(workitems_df["Microsoft_VSTS_Common_ClosedDate"], utc=True, errors="coerce")
-
-# Drop work items with missing created date
-workitems_df = workitems_df.dropna(subset=["System_CreatedDate"])
-
-# ---------------------------------------------
-# CREATE ITERATION START DATE MAPPING
-# ---------------------------------------------
-iteration_start_map = iterations_df.set_index("path")["startDate"].to_dict()
-
-# Add Cycle Start Date to each work item
-def get_iteration_start(row):
-    iteration_path = row["System_IterationPath"]
-    return iteration_start_map.get(iteration_path, pd.NaT)
-
-workitems_df["IterationStartDate"] = workitems_df.apply(get_iteration_start, axis=1)
-
-# Exclude work items without valid iteration start
-workitems_df = workitems_df.dropna(subset=["IterationStartDate"])
-
 # ---------------------------------------------
 # CALCULATE LEAD TIME AND CYCLE TIME
 # ---------------------------------------------
 now = datetime.now(timezone.utc)
-
-def calc_lead_time(row):
-    closed = row["Microsoft_VSTS_Common_ClosedDate"]
-    created = row["System_CreatedDate"]
-    if pd.isna(created):
-        return None
-    return (closed - created).days if not pd.isna(closed) else (now - created).days
-
-def calc_cycle_time(row):
-    closed = row["Microsoft_VSTS_Common_ClosedDate"]
-    start = row["IterationStartDate"]
-    if pd.isna(start):
-        return None
-    return (closed - start).days if not pd.isna(closed) else (now - start).days
-
-workitems_df["LeadTimeDays"] = workitems_df.apply(calc_lead_time, axis=1)
-workitems_df["CycleTimeDays"] = workitems_df.apply(calc_cycle_time, axis=1)
-
-# ---------------------------------------------
-# FIND LATEST ITERATION
-# ---------------------------------------------
-latest_iteration = iterations_df.sort_values(by="finishDate", ascending=False).iloc[0]
-latest_finish = latest_iteration["finishDate"]
-cutoff_date = latest_finish - timedelta(days=30)
+with timed("lead_cycle_time", rows=len(workitems_df)):
+    workitems_df = with_rollup_columns(add_lead_cycle_times(workitems_df, now), rollup)
 
 # ---------------------------------------------
 # CALCULATE METRICS
 # ---------------------------------------------
-overall_lead_time = workitems_df["LeadTimeDays"].mean()
-recent_lead_items = workitems_df[workitems_df["System_CreatedDate"] > cutoff_date]
-recent_lead_time = recent_lead_items["LeadTimeDays"].mean() if not recent_lead_items.empty else None
-
-overall_cycle_time = workitems_df["CycleTimeDays"].mean()
-recent_cycle_items = workitems_df[workitems_df["System_CreatedDate"] > cutoff_date]
-recent_cycle_time = recent_cycle_items["CycleTimeDays"].mean() if not recent_cycle_items.empty else None
+with timed("lead_cycle_summary", rows=len(workitems_df)):
+    lead_cycle = lead_cycle_summary(iterations_df, workitems_df, rollup)
+latest_iteration = lead_cycle["latest_iteration"]
+overall_lead_time = lead_cycle["overall_lead_time"]
+recent_lead_time = lead_cycle["recent_lead_time"]
+overall_cycle_time = lead_cycle["overall_cycle_time"]
+recent_cycle_time = lead_cycle["recent_cycle_time"]
 
 # ---------------------------------------------
 # REFRESH BUTTON (disabled if missing user info)
@@ -199,12 +344,25 @@ if not all_fields_present:
     if user and missing_fields:
         st.write(f"⚠️ Missing fields: {', '.join(missing_fields)}")
 
-if st.button("↻ Refresh", disabled=not all_fields_present):
-    refresh_iterations()
-    refresh_work_items()
+if st.button("↻ Refresh", disabled=not all_fields_present) and run_refresh():
     st.success("Refreshed successfully!")
     st.rerun()
 
+# Last completed sync, and any unfinished one the next Refresh will resume
+sync_state = get_sync_state(db, "workitems", dataset)
+if sync_state:
+    last_completed = sync_state.get("last_completed")
+    if last_completed:
+        st.caption(f"Showing data from the sync completed {last_completed['completed_at']:%Y-%m-%d %H:%M} UTC "
+                   f"({last_completed['items']} work items).")
+    if sync_state.get("status") in ("running", "failed") and sync_state.get("ids"):
+        total_batches = -(-len(sync_state["ids"]) // sync_state["batch_size"])
+        st.info(f"⏸ A sync is in progress or was interrupted after {len(sync_state['completed_offsets'])} of "
+                f"{total_batches} batches. Refresh resumes it from there.")
+
+if live_enabled:
+    rerun_on_dataset_change(dataset, loaded_version)
+
 # ---------------------------------------------
 # DISPLAY SCORECARDS
 # ---------------------------------------------
@@ -241,25 +399,8 @@ with col4:
 # ---------------------------------------------
 st.subheader("Burn-Up Chart (Story Count)")
 
-burnup_data = []
-for _, iteration in iterations_df.iterrows():
-    path = iteration["path"]
-    finish_date = iteration["finishDate"]
-    total_items = workitems_df[workitems_df["System_IterationPath"] == path]
-    total_count = len(total_items)
-    completed_count = len(total_items[total_items["Microsoft_VSTS_Common_ClosedDate"].notna()])
-    
-    burnup_data.append({
-        "IterationPath": path,
-        "FinishDate": finish_date,
-        "TotalStories": total_count,
-        "CompletedStories": completed_count
-    })
-
-burnup_df = pd.DataFrame(burnup_data).sort_values("FinishDate")
-
-burnup_df["CumulativeTotal"] = burnup_df["TotalStories"].cumsum()
-burnup_df["CumulativeCompleted"] = burnup_df["CompletedStories"].cumsum()
+with timed("burnup_counts", rows=len(workitems_df)):
+    burnup_df = burnup_counts(iterations_df, workitems_df, rollup)
 
 fig_burnup = px.line(
     burnup_df,
@@ -272,37 +413,17 @@ fig_burnup = px.line(
 fig_burnup.update_traces(mode="lines+markers")
 fig_burnup.update_layout(legend_title_text="Metric", legend=dict(x=0.05, y=0.95))
 
-st.plotly_chart(fig_burnup, use_container_width=True)
+with timed("burnup_counts.render", rows=len(burnup_df)):
+    st.plotly_chart(fig_burnup, use_container_width=True)
 
 # ---------------------------------------------
 # BURN-UP CHART (EFFORT-BASED)
 # ---------------------------------------------
-if "Microsoft_VSTS_Scheduling_Effort" in workitems_df.columns:
+with timed("burnup_effort", rows=len(workitems_df)):
+    burnup_effort_df = burnup_effort(iterations_df, workitems_df, rollup)
+if burnup_effort_df is not None:
     st.subheader("Burn-Up Chart (Effort / Story Points)")
 
-    burnup_effort_data = []
-    for _, iteration in iterations_df.iterrows():
-        path = iteration["path"]
-        finish_date = iteration["finishDate"]
-        iteration_items = workitems_df[workitems_df["System_IterationPath"] == path]
-
-        total_effort = iteration_items["Microsoft_VSTS_Scheduling_Effort"].sum(skipna=True)
-        completed_effort = iteration_items.loc[
-            iteration_items["Microsoft_VSTS_Common_ClosedDate"].notna(), "Microsoft_VSTS_Scheduling_Effort"
-        ].sum(skipna=True)
-
-        burnup_effort_data.append({
-            "IterationPath": path,
-            "FinishDate": finish_date,
-            "TotalEffort": total_effort,
-            "CompletedEffort": completed_effort
-        })
-
-    burnup_effort_df = pd.DataFrame(burnup_effort_data).sort_values("FinishDate")
-
-    burnup_effort_df["CumulativeTotal"] = burnup_effort_df["TotalEffort"].cumsum()
-    burnup_effort_df["CumulativeCompleted"] = burnup_effort_df["CompletedEffort"].cumsum()
-
     fig_effort = px.line(
         burnup_effort_df,
         x="FinishDate",
@@ -314,7 +435,8 @@ if "Microsoft_VSTS_Scheduling_Effort" in workitems_df.columns:
     fig_effort.update_traces(mode="lines+markers")
     fig_effort.update_layout(legend_title_text="Metric", legend=dict(x=0.05, y=0.95))
 
-    st.plotly_chart(fig_effort, use_container_width=True)
+    with timed("burnup_effort.render", rows=len(burnup_effort_df)):
+        st.plotly_chart(fig_effort, use_container_width=True)
 else:
     st.info("No effort field found in work items for effort-based burn-up chart.")
 
@@ -323,70 +445,29 @@ else:
 # ---------------------------------------------
 st.subheader("Cumulative Flow Diagram (CFD)")
 
-if "Microsoft_VSTS_Common_ActivatedDate" in workitems_df.columns:
-    # Parse activated and closed columns (keep tz-aware)
-    workitems_df["Microsoft_VSTS_Common_ActivatedDate"] = pd.to_datetime(
-        workitems_df["Microsoft_VSTS_Common_ActivatedDate"], utc=True, errors="coerce"
-    )
-    workitems_df["Microsoft_VSTS_Common_ClosedDate"] = pd.to_datetime(
-        workitems_df["Microsoft_VSTS_Common_ClosedDate"], utc=True, errors="coerce"
-    )
-
-    # Normalize the relevant dates to calendar dates for daily buckets (preserves tz)
-    created_norm = workitems_df["System_CreatedDate"].dt.normalize()
-    activated_norm = workitems_df["Microsoft_VSTS_Common_ActivatedDate"].dt.normalize()
-    closed_norm = workitems_df["Microsoft_VSTS_Common_ClosedDate"].dt.normalize()
-
-    # Determine min and max dates based on work item activity (normalized)
-    min_date = created_norm.min()
-    # take latest of activated/closed (ignoring NaT)
-    max_date_candidates = [activated_norm.max(), closed_norm.max()]
-    max_date = max([d for d in max_date_candidates if pd.notna(d)])
-
-    # Build inclusive daily range
-    date_range = pd.date_range(start=min_date, end=max_date + pd.Timedelta(days=1), freq="D")
-
-    cfd_data = []
-
-    # Pre-store column series for speed
-    total_count_all = len(workitems_df)
-
-    for current_date in date_range:
-        # current_date is midnight of the day (Timestamp)
-        # Masks for states (Done overrides In Progress)
-        done_mask = (closed_norm.notna()) & (closed_norm <= current_date)
-
-        in_progress_mask = (
-            (activated_norm.notna())
-            & (activated_norm <= current_date)
-            & (~done_mask)  # ensure done items are not counted as in progress
-        )
-
-        todo_mask = ~done_mask & ~in_progress_mask
-
-        done_count = done_mask.sum()
-        in_progress_count = in_progress_mask.sum()
-        todo_count = todo_mask.sum()
-
-        # Append row
-        cfd_data.append({
-            "Date": current_date,
-            "Done": int(done_count),
-            "In Progress": int(in_progress_count),
-            "To Do": int(todo_count)
-        })
-
-    cfd_df = pd.DataFrame(cfd_data)
-
-    fig_cfd = px.area(
-        cfd_df,
-        x="Date",
-        y=["Done", "In Progress", "To Do"],
-        title="Cumulative Flow Diagram (User Stories / PBIs)",
-        labels={"value": "Number of Stories", "Date": "Date", "variable": "State"},
-        color_discrete_map={"Done": "green", "In Progress": "blue", "To Do": "gray"}
+CFD_STATES = ["Done", "In Progress", "To Do"]
+CFD_COLORS = {"Done": "green", "In Progress": "blue", "To Do": "gray"}
+chart_max_points, chart_method, chart_webgl = chart_settings()
+
+with timed("cfd_counts", rows=len(workitems_df)) as record:
+    cfd_df = cfd_counts(workitems_df, rollup)
+    record["days"] = len(cfd_df) if cfd_df is not None else 0
+if cfd_df is not None:
+    # One row per day since the first story; bounded to the chart point budget before plotting
+    cfd_chart_df, cfd_granularity = reduce_points(cfd_df, "Date", CFD_STATES, chart_max_points, chart_method)
+    fig_cfd = stacked_area(
+        cfd_chart_df,
+        "Date",
+        CFD_STATES,
+        "Cumulative Flow Diagram (User Stories / PBIs)",
+        "Number of Stories",
+        CFD_COLORS,
+        chart_webgl
     )
-    st.plotly_chart(fig_cfd, use_container_width=True)
+    with timed("cfd_counts.render", rows=len(cfd_chart_df)):
+        st.plotly_chart(fig_cfd, use_container_width=True)
+    if len(cfd_chart_df) < len(cfd_df):
+        st.caption(f"{len(cfd_df)} days shown as {len(cfd_chart_df)} {cfd_granularity} points.")
 
 else:
     st.info("Activated date field not found. Cannot generate Cumulative Flow Diagram.")
@@ -396,91 +477,36 @@ else:
 # ---------------------------------------------
 st.subheader("Cumulative Flow Diagram (Effort-Based)")
 
-effort_field = "Microsoft_VSTS_Scheduling_Effort"
-if effort_field not in workitems_df.columns:
+with timed("cfd_effort", rows=len(workitems_df)) as record:
+    cfd_effort_df = cfd_effort(workitems_df, rollup)
+    record["days"] = len(cfd_effort_df) if cfd_effort_df is not None else 0
+if cfd_effort_df is None:
     st.info("No effort field found for CFD.")
 else:
-    # Prepare normalized dates and effort column
-    workitems_df["ActivatedDate"] = pd.to_datetime(workitems_df.get("Microsoft_VSTS_Common_ActivatedDate"), utc=True, errors="coerce")
-    workitems_df["ClosedDate"] = pd.to_datetime(workitems_df.get("Microsoft_VSTS_Common_ClosedDate"), utc=True, errors="coerce")
-
-    created_norm = workitems_df["System_CreatedDate"].dt.normalize()
-    activated_norm = workitems_df["ActivatedDate"].dt.normalize()
-    closed_norm = workitems_df["ClosedDate"].dt.normalize()
-
-    # Normalized min/max for range
-    min_date = created_norm.min()
-    max_date = pd.concat([created_norm, activated_norm, closed_norm]).max()
-
-    date_range = pd.date_range(start=min_date, end=max_date + pd.Timedelta(days=1), freq="D")
-
-    cfd_data = []
-
-    # For numeric operations ensure effort is numeric (NaN -> 0 for sums)
-    effort_series = pd.to_numeric(workitems_df.get(effort_field), errors="coerce").fillna(0)
-
-    for current_date in date_range:
-        done_mask = (closed_norm.notna()) & (closed_norm <= current_date)
-
-        in_progress_mask = (
-            (activated_norm.notna())
-            & (activated_norm <= current_date)
-            & (~done_mask)  # ensure done items are not counted as in progress
-        )
-
-        # Sum effort per state
-        done_effort = effort_series[done_mask].sum(skipna=True)
-        in_progress_effort = effort_series[in_progress_mask].sum(skipna=True)
-        total_effort = effort_series.sum(skipna=True)
-        todo_effort = total_effort - done_effort - in_progress_effort
-
-        # Guard against tiny negative float rounding
-        if todo_effort < 0 and todo_effort > -1e-8:
-            todo_effort = 0.0
-
-        cfd_data.append({
-            "Date": current_date,
-            "Done": float(done_effort),
-            "In Progress": float(in_progress_effort),
-            "To Do": float(todo_effort)
-        })
-
-    cfd_df = pd.DataFrame(cfd_data)
-
-    fig_cfd_effort = px.area(
-        cfd_df,
-        x="Date",
-        y=["Done", "In Progress", "To Do"],
-        labels={"value": "Effort / Story Points", "Date": "Date", "variable": "State"},
-        title="Cumulative Flow Diagram (Effort-Based)",
-        color_discrete_map={"Done": "green", "In Progress": "blue", "To Do": "gray"}
+    cfd_df = cfd_effort_df
+
+    cfd_chart_df, cfd_granularity = reduce_points(cfd_df, "Date", CFD_STATES, chart_max_points, chart_method)
+    fig_cfd_effort = stacked_area(
+        cfd_chart_df,
+        "Date",
+        CFD_STATES,
+        "Cumulative Flow Diagram (Effort-Based)",
+        "Effort / Story Points",
+        CFD_COLORS,
+        chart_webgl
     )
-    st.plotly_chart(fig_cfd_effort, use_container_width=True)
+    with timed("cfd_effort.render", rows=len(cfd_chart_df)):
+        st.plotly_chart(fig_cfd_effort, use_container_width=True)
+    if len(cfd_chart_df) < len(cfd_df):
+        st.caption(f"{len(cfd_df)} days shown as {len(cfd_chart_df)} {cfd_granularity} points.")
 
 # ---------------------------------------------
 # ESTIMATE ACCURACY
 # ---------------------------------------------
-workitems_df["ActivatedDate"] = pd.to_datetime(workitems_df.get("Microsoft_VSTS_Common_ActivatedDate"), utc=True, errors="coerce")
-workitems_df["ClosedDate"] = workitems_df["Microsoft_VSTS_Common_ClosedDate"]
-
-def calc_cycle_time_effort(row):
-    start = row["ActivatedDate"]
-    end = row["ClosedDate"]
-    effort = row.get("Microsoft_VSTS_Scheduling_Effort", 0)
-    if pd.isna(start) or pd.isna(end) or not effort or effort == 0:
-        return None
-    return (end - start).days / effort if effort else None
-
-workitems_df["EstimateAccuracy"] = workitems_df.apply(calc_cycle_time_effort, axis=1)
-
-valid_estimates = workitems_df["EstimateAccuracy"].dropna()
-active_time_indicator = valid_estimates.mean() if not valid_estimates.empty else None
+with timed("estimate_accuracy", rows=len(workitems_df)):
+    active_time_indicator, active_time_indicator_last_sprint = estimate_accuracy(workitems_df, latest_iteration, rollup)
 
 last_iter_path = latest_iteration["path"]
-last_iter_items = workitems_df[workitems_df["System_IterationPath"] == last_iter_path]
-last_iter_estimates = last_iter_items["EstimateAccuracy"].dropna()
-active_time_indicator_last_sprint = last_iter_estimates.mean() if not last_iter_estimates.empty else None
-
 last_iter_name = last_iter_path.split("\\")[-1]
 
 st.subheader("Active time ratio indicator (Cycle Time / Story Points)")
@@ -498,6 +524,39 @@ with col2:
         value=f"{active_time_indicator_last_sprint:.2f} %" if active_time_indicator_last_sprint else "N/A"
     )
 
+# ---------------------------------------------
+# DELIVERY FORECAST (MONTE CARLO)
+# ---------------------------------------------
+st.subheader("Delivery Forecast")
+
+open_items = int(workitems_df["Microsoft_VSTS_Common_ClosedDate"].isna().sum())
+with st.form(key="forecast_form"):
+    col1, col2 = st.columns(2)
+    with col1:
+        forecast_items = st.number_input("Items to complete", min_value=0, value=open_items, step=1)
+    with col2:
+        forecast_target = st.date_input("Target date", value=(now + pd.Timedelta(days=DEFAULT_TARGET_DAYS)).date())
+    st.form_submit_button("Update forecast")
+
+with timed("forecast", rows=len(workitems_df)):
+    forecast = delivery_forecast(
+        iterations_df, workitems_df, now, remaining=int(forecast_items), target_date=forecast_target,
+        **forecast_settings()
+    )
+
+if forecast is None:
+    st.info("No stories were closed in the forecast's lookback window, so there is no throughput to sample.")
+else:
+    st.caption(f"{forecast['simulations']:,} simulations on {forecast['mode']} throughput "
+               f"(last {forecast['history_periods']} periods, mean {forecast['mean_throughput']:.1f} items).")
+    st.markdown(f"**When will {forecast['remaining_items']} items be done?**")
+    for col, level in zip(st.columns(len(CONFIDENCE_LEVELS)), CONFIDENCE_LEVELS):
+        date = forecast["completion_dates"][level]
+        col.metric(f"{level}% confidence", f"{date:%Y-%m-%d}" if date is not None else "Beyond horizon")
+    st.markdown(f"**How many items by {forecast['target_date']:%Y-%m-%d}?**")
+    for col, level in zip(st.columns(len(CONFIDENCE_LEVELS)), CONFIDENCE_LEVELS):
+        col.metric(f"{level}% confidence", f"{forecast['items_by_target'][level]} or more")
+
 # ---------------------------------------------
 # AI INSIGHTS
 # ---------------------------------------------
@@ -509,13 +568,11 @@ except KeyError:
     st.error("API Key not found in Streamlit secrets. Please ensure it's named 'GEMINI_API_KEY'.")
     st.stop()
 
-# Configure Gemini
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-2.5-flash')  # or 'gemini-2.5-pro'
-
 # -------------------------
-# AI Input Form
+# AI Input Form (defaults to the team settings saved with the last analysis)
 # -------------------------
+saved_team_size, saved_capacity_per_person = saved_team_settings(user)
+
 with st.form(key="ai_insights_form"):
     col1, col2 = st.columns(2)
     
@@ -523,7 +580,7 @@ with st.form(key="ai_insights_form"):
         temp_team_size = st.number_input(
             label="Team Size",
             min_value=1,
-            value=5,
+            value=saved_team_size,
             step=1
         )
     
@@ -531,81 +588,62 @@ with st.form(key="ai_insights_form"):
         temp_capacity_per_person = st.number_input(
             label="Capacity per Person",
             min_value=1,
-            value=8,
+            value=saved_capacity_per_person,
             step=1
         )
     
     submit = st.form_submit_button("🧠 Generate AI Analysis")
 
 # -------------------------
-# Trigger AI only after form submit
+# Cached or pre-generated insight on load; model call only after form submit
 # -------------------------
+insight_stream = None
+
 if submit:
-    # Assign committed values to session_state
+    # Assign committed values to session_state and keep them for post-sync pre-generation
     st.session_state["team_size"] = temp_team_size
     st.session_state["capacity_per_person"] = temp_capacity_per_person
+    users_col.update_one(
+        {"email": user_email},
+        {"$set": {"team_size": int(temp_team_size), "capacity_per_person": int(temp_capacity_per_person)}}
+    )
 
-    # Number of iterations
-    num_iterations = len(iterations_df)
-
-    # Build base metrics summary
-    metrics_summary = {
-        "Overall lead time": overall_lead_time,
-        "Recent lead time (last 30 days)": recent_lead_time,
-        "Overall cycle time": overall_cycle_time,
-        "Recent cycle time (last 30 days)": recent_cycle_time,
-        "Overall active time indicator": active_time_indicator,
-        "Recent active time indicator": active_time_indicator_last_sprint,
-        "Last iteration": latest_iteration["path"],
-        "Iteration count": num_iterations,
-        # "Workitem count (total number of User Stories)": len(workitems_df),
-        "Team size": st.session_state["team_size"],
-        "Capacity per person per iteration": st.session_state["capacity_per_person"],
-    }
-
-    # Include effort-based CFD metrics if available
-    if 'cfd_df' in locals() and not cfd_df.empty:
-        last_row = cfd_df.iloc[-1]
-        total_done_effort = last_row["Done"]
-        total_in_progress_effort = last_row["In Progress"]
-        total_todo_effort = last_row["To Do"]
-
-        # Average daily throughput (Done effort per day)
-        daily_done_diff = cfd_df["Done"].diff().dropna()
-        avg_daily_throughput = daily_done_diff.mean() if not daily_done_diff.empty else 0
-        avg_per_iteration_throughput = total_done_effort / num_iterations if num_iterations else 0
-        
-
-        metrics_summary.update({
-            "Total effort done": total_done_effort,
-            "Total in progress effort": total_in_progress_effort,
-            "Total effort to be done": total_todo_effort,
-            # "Average daily throughput (effort done per day)": avg_daily_throughput,
-            "Average throughput (effort done per Iteration)": avg_per_iteration_throughput
-        })
-
-    # -------------------------
-    # Send to AI
-    # -------------------------
-    with st.spinner("Analyzing metrics..."):
-        prompt = f"""
-        You are an Agile performance analyst.
-        Here are key delivery metrics for a software team:
-
-        {metrics_summary}
-
-        Provide a short, data-driven summary of:
-        - Performance trends (lead time, cycle time)
-        - Bottlenecks or issues (based on CFD and team capacity, active time indicator)
-        - Recommendations for improvement (actions, workshops, etc.)
-        - Iterations are Sprints, and they are two weeks long
-        - Capacity is per iteration
-        Be brief, concise. If data is unclear, make sure to note that too.
-        The paradigm for capacity and effort is 1 capacity (day) is 1 effort (story point), with fibbonacci in mind (effort is estimated in 1, 2, 3, 5, 8, 13, 21+)
-        """
-
-        response = model.generate_content(prompt)
-        st.markdown(response.text)
+metrics_summary = build_metrics_summary(
+    lead_cycle,
+    active_time_indicator,
+    active_time_indicator_last_sprint,
+    len(iterations_df),
+    cfd_df,
+    int(temp_team_size),
+    int(temp_capacity_per_person),
+    forecast
+)
+
+ai_settings = st.secrets.get("ai", {})
+ai_cache_col = db[AI_CACHE_COLLECTION]
+ai_model_name = active_model_name(ai_settings)
+ai_cache_key = cache_key(metrics_summary, model_name=ai_model_name)
+with timed("ai_insights.cache_lookup"):
+    cached_insight = get_cached_insight(ai_cache_col, ai_cache_key)
+    cache_caption = "⚡ Served from the AI insights cache (same metrics, prompt and model)."
+    # The pre-generated insight covers the unfiltered dashboard
+    if cached_insight is None and not submit and not is_filtered(dashboard_filters):
+        cached_insight = get_pregenerated_insight(
+            ai_cache_col, user, int(temp_team_size), int(temp_capacity_per_person), ai_model_name
+        )
+        cache_caption = "⚡ Pre-generated after the last sync. Submit the form to re-run the analysis."
+
+ai_container = st.container()
+if cached_insight is not None:
+    ai_container.markdown(cached_insight)
+    ai_container.caption(cache_caption)
+elif submit:
+    # Send to AI (streamed on a worker thread; rendered at the end of the page)
+    insight_stream = InsightStream(partial(create_model, api_key, ai_settings), build_prompt(metrics_summary))
+    ai_status = ai_container.empty()
+    with ai_status.container():
+        st.button("✖ Cancel analysis")  # any rerun cancels the worker
+        st.info("🧠 Analyzing metrics... the rest of the dashboard keeps loading meanwhile.")
 
 # ---------------------------------------------
 # DETAILS SECTION
@@ -617,16 +655,24 @@ with st.expander("See data details"):
     st.write("### Work Items Sample")
     st.dataframe(workitems_df.head())
 
+    # Percentiles of closed stories come from the sketches maintained at ingest (no sorting here),
+    # which are per iteration; views filtered within iterations use the loaded stories
+    if narrows_stories(dashboard_filters):
+        closed_summary = frame_summary(workitems_df)
+    else:
+        closed_summary = iterations_summary(db, dataset, iterations_df["path"].dropna().unique().tolist())
+
     st.write("### Work Item Lead Time Summary")
-    valid_lead_times = workitems_df["LeadTimeDays"].dropna()
-    valid_lead_times = valid_lead_times[valid_lead_times >= 0]
+    lead_stats = duration_stats(workitems_df["LeadTimeDays"], rollup and rollup["lead"])
 
-    if not valid_lead_times.empty:
+    if lead_stats is not None:
         stats_lead = {
-            "Min Lead Time (days)": valid_lead_times.min(),
-            "Max Lead Time (days)": valid_lead_times.max(),
-            "Average Lead Time (days)": valid_lead_times.mean(),
-            "Median Lead Time (days)": valid_lead_times.median()
+            "Min Lead Time (days)": lead_stats[0],
+            "Max Lead Time (days)": lead_stats[1],
+            "Average Lead Time (days)": lead_stats[2],
+            "Median Lead Time, closed stories (days)": closed_summary["lead"]["p50"],
+            "85th Percentile Lead Time, closed stories (days)": closed_summary["lead"]["p85"],
+            "95th Percentile Lead Time, closed stories (days)": closed_summary["lead"]["p95"]
         }
         summary_df_lead = pd.DataFrame(list(stats_lead.items()), columns=["Metric", "Value"])
         st.dataframe(summary_df_lead, use_container_width=True)
@@ -634,15 +680,16 @@ with st.expander("See data details"):
         st.info("No valid lead time data available for summary.")
 
     st.write("### Work Item Cycle Time Summary")
-    valid_cycle_times = workitems_df["CycleTimeDays"].dropna()
-    valid_cycle_times = valid_cycle_times[valid_cycle_times >= 0]
+    cycle_stats = duration_stats(workitems_df["CycleTimeDays"], rollup and rollup["cycle"])
 
-    if not valid_cycle_times.empty:
+    if cycle_stats is not None:
         stats_cycle = {
-            "Min Cycle Time (days)": valid_cycle_times.min(),
-            "Max Cycle Time (days)": valid_cycle_times.max(),
-            "Average Cycle Time (days)": valid_cycle_times.mean(),
-            "Median Cycle Time (days)": valid_cycle_times.median()
+            "Min Cycle Time (days)": cycle_stats[0],
+            "Max Cycle Time (days)": cycle_stats[1],
+            "Average Cycle Time (days)": cycle_stats[2],
+            "Median Cycle Time, closed stories (days)": closed_summary["cycle"]["p50"],
+            "85th Percentile Cycle Time, closed stories (days)": closed_summary["cycle"]["p85"],
+            "95th Percentile Cycle Time, closed stories (days)": closed_summary["cycle"]["p95"]
         }
         summary_df_cycle = pd.DataFrame(list(stats_cycle.items()), columns=["Metric", "Value"])
         st.dataframe(summary_df_cycle, use_container_width=True)
@@ -650,7 +697,7 @@ with st.expander("See data details"):
         st.info("No valid cycle time data available for summary.")
 
     def load_work_items():
-        work_items = list(workitems_col.find({"ops_user": user_email}, {"_id": 0}))
+        work_items = list(workitems_col.find({"dataset_id": dataset}, {"_id": 0}))
         if not work_items:
             return None, "No work items found in MongoDB. Please refresh."
         return work_items, None
@@ -660,9 +707,47 @@ with st.expander("See data details"):
     if error_message:
         st.warning(error_message)
     else:
-        st.write(f"Total Work Items: {len(work_items)}")
+        archived_stories = archived_count(db, dataset)
+        st.write(f"Total Work Items: {len(work_items)}"
+                 + (f" (plus {archived_stories} archived stories)" if archived_stories else ""))
         if isinstance(work_items, list) and all(isinstance(i, dict) for i in work_items):
             df = pd.DataFrame(work_items)
             st.dataframe(df)
         else:
             st.json(work_items)
+
+# ---------------------------------------------
+# AI INSIGHTS STREAM (fills the container reserved in the AI section)
+# ---------------------------------------------
+if insight_stream is not None:
+    with ai_container:
+        try:
+            with timed("ai_insights.stream") as record:
+                insight_text = st.write_stream(
+                    insight_stream.iter_text(ai_settings.get("timeout_seconds", DEFAULT_TIMEOUT_SECONDS))
+                )
+                record["first_chunk_seconds"] = insight_stream.first_chunk_seconds
+            ai_status.empty()
+            store_insight(
+                ai_cache_col,
+                ai_cache_key,
+                insight_text,
+                ttl_hours=ai_settings.get("cache_ttl_hours", DEFAULT_CACHE_TTL_HOURS),
+                max_entries=ai_settings.get("cache_max_entries", DEFAULT_CACHE_MAX_ENTRIES),
+                model_name=ai_model_name
+            )
+        except TimeoutError as e:
+            ai_status.empty()
+            st.warning(f"⏱️ {e} Please try again.")
+        except Exception as e:
+            ai_status.empty()
+            st.error(f"AI analysis failed: {e}")
+
+# ---------------------------------------------
+# PERFORMANCE PANEL (opt-in)
+# ---------------------------------------------
+if show_perf_panel:
+    with st.expander("⏱️ Performance trace (this rerun)", expanded=True):
+        trace_df = pd.DataFrame(get_trace())
+        st.write(f"Total traced time: {trace_df['seconds'].sum():.3f} s")
+        st.dataframe(trace_df, use_container_width=True)
@@ -0,0 +1,220 @@
+"""insightops: command-line syncs, metric exports, email delivery and benchmarks without the Streamlit UI.
+
+Run from the repository root (settings come from `.streamlit/secrets.toml`):
+
+    python insightops.py sync --user someone@example.com
+    python insightops.py sync --all --profile           # e.g. from cron
+    python insightops.py metrics --user someone@example.com --format csv --section burnup
+    python insightops.py archive --all --months 12
+    python insightops.py outbox --loop
+    python insightops.py bench --sizes 1000 10000
+
+`sync` runs the same steps as the dashboard's Refresh button (see
+`modules/sync_runner.py`) for every project/team connection of the user;
+`sync --all` syncs every subscribed project once plus the iterations of each
+further team. Different projects are synced in parallel (`--workers`). `metrics` prints the same JSON as the
+metrics API, or one of its sections as CSV. `archive` moves old closed stories
+into per-iteration roll-ups (see `modules/archive.py`). `outbox` sends the
+queued emails that are due, or keeps running as the sender worker with `--loop`
+(see `modules/email_outbox.py`). `bench` forwards its arguments to
+`tools/bench.py`. The exit status is non-zero when a sync or export failed.
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime, timezone
+
+METRICS_SECTIONS = ("summary", "burnup", "burnup_effort", "cfd", "cfd_effort")
+FAILED_STATUSES = ("failed", "no-access", "no-user", "no-config")
+
+
+def _connect():
+    import streamlit as st
+    from pymongo import MongoClient
+
+    return MongoClient(st.secrets["mongo"]["uri"])[st.secrets["mongo"].get("db_name", "insightops")]
+
+
+def _flatten(value, prefix=""):
+    """`(key, value)` rows for the scalar metrics, nested keys joined with dots."""
+    if isinstance(value, dict):
+        rows = []
+        for key, item in value.items():
+            rows.extend(_flatten(item, f"{prefix}{key}."))
+        return rows
+    if isinstance(value, list):
+        return []  # tables are exported with --section
+    return [(prefix[:-1], value)]
+
+
+# ---------------------------------------------
+# SUBCOMMANDS
+# ---------------------------------------------
+def cmd_sync(args):
+    from modules.perf_trace import get_trace, start_trace
+    from modules.sync_runner import ConsoleReporter, sync_all, sync_settings, sync_user_connections
+
+    db = _connect()
+    start_trace(track_memory=args.profile)
+    fresh_minutes = 0 if args.force else None
+    max_workers = args.workers or sync_settings()
+
+    def reporter(key):
+        return ConsoleReporter(prefix=f"[{key}] ", quiet=args.quiet)
+
+    if args.all:
+        results = sync_all(db, reporter, fresh_minutes, max_workers)
+    else:
+        results = {}
+        for email in args.user:
+            connections = sync_user_connections(
+                db, email, lambda name, email=email: reporter(f"{email} ({name})"), fresh_minutes, max_workers
+            )
+            results.update({email if name == email else f"{email} ({name})": status
+                            for name, status in connections.items()})
+
+    for email, status in sorted(results.items()):
+        print(f"{status:>9}  {email}")
+
+    if args.profile:
+        print("\nsection                                   calls   seconds      rows")
+        totals = {}
+        for record in get_trace():
+            total = totals.setdefault(record["section"], {"calls": 0, "seconds": 0.0, "rows": 0})
+            total["calls"] += 1
+            total["seconds"] += record["seconds"]
+            total["rows"] += record.get("rows") or 0
+        for section, total in sorted(totals.items(), key=lambda kv: -kv[1]["seconds"]):
+            print(f"{section:<40} {total['calls']:>6} {total['seconds']:>9.3f} {total['rows']:>9}")
+
+    return 1 if any(status in FAILED_STATUSES for status in results.values()) else 0
+
+
+def cmd_metrics(args):
+    from modules.datasets import user_team
+    from modules.metrics_api import metrics_payload
+
+    db = _connect()
+    user_doc = db["users"].find_one({"email": args.user.lower()}, {"_id": 0, "email": 1, "dataset_id": 1,
+                                                                  "team_name": 1, "project_name": 1,
+                                                                  "data_version": 1})
+    if not user_doc or not user_doc.get("dataset_id"):
+        print(f"No synced project for {args.user}; run `sync --user {args.user}` first.", file=sys.stderr)
+        return 1
+
+    team = args.team or user_team(user_doc)
+    payload = metrics_payload(db, user_doc["dataset_id"], team, datetime.now(timezone.utc))
+    if payload is None:
+        print(f"No stories or iterations for team '{team}'.", file=sys.stderr)
+        return 1
+    payload.update({"dataset": user_doc["dataset_id"], "team": team, "data_version": user_doc.get("data_version", 0)})
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "json":
+            data = payload if args.section == "summary" else payload[args.section]
+            json.dump(data, out, indent=2)
+            out.write("\n")
+        elif args.section == "summary":
+            writer = csv.writer(out)
+            writer.writerow(["metric", "value"])
+            writer.writerows(_flatten(payload))
+        else:
+            rows = payload[args.section] or []
+            writer = csv.DictWriter(out, fieldnames=list(rows[0]) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def cmd_archive(args):
+    from modules.archive import archive_all, archive_settings
+
+    db = _connect()
+    results = archive_all(db, args.months or archive_settings(), args.dataset)
+    for ds, moved in sorted(results.items()):
+        print(f"{moved:>7}  {ds}")
+    return 0
+
+
+def cmd_outbox(args):
+    from modules.email_outbox import (
+        OutboxWorker, SmtpSender, deliver_due, ensure_outbox_indexes, outbox_settings, outbox_status_counts,
+        smtp_settings
+    )
+
+    db = _connect()
+    ensure_outbox_indexes(db)
+    if args.loop:
+        OutboxWorker(db, smtp_settings(), outbox_settings()).run()
+        return 0
+
+    sender = SmtpSender(smtp_settings())
+    try:
+        counts = deliver_due(db, sender, outbox_settings())
+    finally:
+        sender.close()
+    print(f"sent {counts['sent']}, retrying {counts['retry']}, failed {counts['failed']}")
+    print("outbox " + ", ".join(f"{status} {n}" for status, n in outbox_status_counts(db).items()))
+    return 1 if counts["failed"] or counts["stopped"] else 0
+
+
+def cmd_bench(args):
+    from tools.bench import main as bench_main
+
+    bench_main(args.extra)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="insightops", description="InsightOps syncs and metrics from the command line.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    sync = subcommands.add_parser("sync", help="Sync Azure DevOps data like the dashboard's Refresh button.")
+    target = sync.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Every subscribed project.")
+    target.add_argument("--user", action="append", help="User email (repeatable).")
+    sync.add_argument("--force", action="store_true", help="Sync even if the project was synced a few minutes ago.")
+    sync.add_argument("--workers", type=int, help="Projects synced in parallel (default from [sync] max_workers).")
+    sync.add_argument("--profile", action="store_true", help="Print time spent per sync stage.")
+    sync.add_argument("--quiet", action="store_true", help="Only print warnings, errors and results.")
+    sync.set_defaults(func=cmd_sync)
+
+    metrics = subcommands.add_parser("metrics", help="Export a user's dashboard metrics.")
+    metrics.add_argument("--user", required=True, help="User email.")
+    metrics.add_argument("--team", help="Another team of the project, or * for the whole project.")
+    metrics.add_argument("--format", choices=("json", "csv"), default="json")
+    metrics.add_argument("--section", choices=METRICS_SECTIONS, default="summary",
+                         help="summary (every metric) or one table.")
+    metrics.add_argument("--output", help="File to write instead of stdout.")
+    metrics.set_defaults(func=cmd_metrics)
+
+    archive = subcommands.add_parser("archive", help="Move old closed stories into per-iteration roll-ups.")
+    target = archive.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Every subscribed project.")
+    target.add_argument("--dataset", action="append", help="Dataset id (organization URL|project), repeatable.")
+    archive.add_argument("--months", type=int, help="Archive stories closed more than this many months ago "
+                                                    "(default from [archive] in secrets.toml).")
+    archive.set_defaults(func=cmd_archive)
+
+    outbox = subcommands.add_parser("outbox", help="Send the queued emails that are due.")
+    outbox.add_argument("--loop", action="store_true", help="Keep running as the sender worker.")
+    outbox.set_defaults(func=cmd_outbox)
+
+    bench = subcommands.add_parser("bench", help="Benchmark the metric stages (arguments go to tools.bench).")
+    bench.set_defaults(func=cmd_bench)
+
+    # Unknown arguments are tools.bench's own (e.g. --sizes)
+    args, extra = parser.parse_known_args(argv)
+    args.extra = extra
+    if extra and args.command != "bench":
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
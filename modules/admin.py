@@ -0,0 +1,8 @@
+import streamlit as st
+
+def is_admin(user_email):
+    """True when the email is listed in the `[admin] emails` Streamlit secret."""
+    if not user_email:
+        return False
+    admin_emails = [e.lower() for e in st.secrets.get("admin", {}).get("emails", [])]
+    return user_email.lower() in admin_emails
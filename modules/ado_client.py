@@ -0,0 +1,118 @@
+"""Shared Azure DevOps connections, cached per user for the life of the app process.
+
+`refresh_iterations` and `refresh_work_items` run back to back on every sync;
+getting their clients from here means the PAT is decrypted, the resource areas
+and locations are resolved, and the TLS connection is opened once per sync
+instead of once per module. Every client gets the same HTTP policy, set through
+its public msrest configuration (`client.config`):
+
+- `keep_alive`, so msrest keeps its session (one per thread) open between calls
+  (gzip is negotiated by requests),
+- `DEFAULT_TIMEOUT_SECONDS` per request,
+- retries with back-off on 429 / 5xx for every method, honouring `Retry-After`.
+  WIQL and batch reads are POSTs, which msrest's own retry settings skip.
+"""
+import hashlib
+import threading
+import time
+
+from azure.devops.connection import Connection
+from msrest.authentication import BasicAuthentication
+from urllib3.util.retry import Retry
+
+from modules.ops_runs import record_response
+from modules.pat_crypto import decrypt_pat
+
+DEFAULT_TIMEOUT_SECONDS = 30
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_MAX_BACKOFF_SECONDS = 60
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+CONNECTION_TTL_SECONDS = 30 * 60
+
+_connections = {}  # (user email, connection fingerprint) -> cached connection entry
+_lock = threading.Lock()
+
+
+def retry_policy():
+    policy = Retry(
+        total=DEFAULT_RETRIES,
+        connect=DEFAULT_RETRIES,
+        read=DEFAULT_RETRIES,
+        status=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=None,  # retry POST as well: WIQL and workitemsbatch are reads
+        respect_retry_after_header=True,
+        raise_on_status=False,  # hand the final response to msrest so it raises its usual error
+    )
+    policy.BACKOFF_MAX = DEFAULT_MAX_BACKOFF_SECONDS  # read by msrest's retry settings
+    return policy
+
+
+def _session_policy(session, global_config, local_config, **kwargs):
+    """msrest session callback: mount the retry policy on the session (one per thread) sending the call."""
+    max_retries = global_config.retry_policy()
+    for adapter in session.adapters.values():
+        if adapter.max_retries is not max_retries:
+            adapter.max_retries = max_retries
+    return kwargs
+
+
+def _configure(config):
+    """Apply the HTTP policy to a client's msrest configuration (once per client)."""
+    config.keep_alive = True  # msrest closes the session after each call otherwise
+    config.connection.timeout = DEFAULT_TIMEOUT_SECONDS
+    config.retry_policy.policy = retry_policy()
+    # msrest only mounts the retry policy on sessions it opens later; this covers open ones too
+    config.session_configuration_callback = _session_policy
+    # The run counters: the hook counts for the sync run of the calling thread
+    config.hooks.append(record_response)
+
+
+def _fingerprint(user_doc):
+    key = f"{user_doc.get('organization_url', '')}|{user_doc.get('pat', '')}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _entry(user_doc):
+    # Keyed per connection too: a user's connections are synced in parallel
+    key = (user_doc["email"].lower(), _fingerprint(user_doc))
+    now = time.monotonic()
+
+    with _lock:
+        entry = _connections.get(key)
+        if entry and now - entry["created_at"] < CONNECTION_TTL_SECONDS:
+            return entry
+        # Drop expired connections (including this one) before opening a new one
+        for expired in [k for k, e in _connections.items() if now - e["created_at"] >= CONNECTION_TTL_SECONDS]:
+            del _connections[expired]
+
+        credentials = BasicAuthentication('', decrypt_pat(user_doc.get("pat", "")))
+        entry = {
+            "connection": Connection(base_url=user_doc["organization_url"], creds=credentials),
+            "lock": threading.Lock(),
+            "fingerprint": key[1],
+            "created_at": now,
+        }
+        _connections[key] = entry
+        return entry
+
+
+def _client(user_doc, getter):
+    entry = _entry(user_doc)
+    # The connection caches its clients; the first lookup resolves the resource areas
+    with entry["lock"]:
+        client = getter(entry["connection"].clients)
+        if record_response not in client.config.hooks:
+            _configure(client.config)
+    return client
+
+
+def get_work_client(user_doc):
+    return _client(user_doc, lambda clients: clients.get_work_client())
+
+
+def get_wit_client(user_doc):
+    return _client(user_doc, lambda clients: clients.get_work_item_tracking_client())
+
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import math
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+MODEL_NAME = "gemini-2.5-flash"  # or 'gemini-2.5-pro'
+# Answers of the offline stand-in (`ai.fake_model`) are cached under their own model name
+FAKE_MODEL_NAME = "fake-gemini"
+
+# Bump whenever PROMPT_TEMPLATE changes so cached answers to the old prompt are not reused
+PROMPT_VERSION = "2"
+
+PROMPT_TEMPLATE = """
+        You are an Agile performance analyst.
+        Here are key delivery metrics for a software team:
+
+        {metrics_summary}
+
+        Provide a short, data-driven summary of:
+        - Performance trends (lead time, cycle time)
+        - Bottlenecks or issues (based on CFD and team capacity, active time indicator)
+        - Delivery outlook (based on the Monte Carlo forecast percentiles, not on averages)
+        - Recommendations for improvement (actions, workshops, etc.)
+        - Iterations are Sprints, and they are two weeks long
+        - Capacity is per iteration
+        Be brief, concise. If data is unclear, make sure to note that too.
+        The paradigm for capacity and effort is 1 capacity (day) is 1 effort (story point), with fibbonacci in mind (effort is estimated in 1, 2, 3, 5, 8, 13, 21+)
+        """
+
+AI_CACHE_COLLECTION = "ai-insights-cache"
+DEFAULT_CACHE_TTL_HOURS = 24 * 7
+DEFAULT_CACHE_MAX_ENTRIES = 1000
+DEFAULT_TIMEOUT_SECONDS = 90
+
+_STREAM_DONE = object()
+
+
+def normalize_summary(metrics_summary):
+    """Plain-Python copy of the summary with floats rounded to 2 decimals and NaN as None.
+
+    Both the prompt and the cache key are built from this, so numerically equal
+    summaries always hit the same cache entry.
+    """
+    normalized = {}
+    for key, value in metrics_summary.items():
+        if hasattr(value, "item"):  # numpy / pandas scalars
+            value = value.item()
+        if isinstance(value, float):
+            value = None if math.isnan(value) else round(value, 2)
+        elif not isinstance(value, (int, str, bool, type(None))):
+            value = str(value)
+        normalized[key] = value
+    return normalized
+
+
+def build_prompt(metrics_summary):
+    return PROMPT_TEMPLATE.format(metrics_summary=normalize_summary(metrics_summary))
+
+
+def cache_key(metrics_summary, model_name=MODEL_NAME, prompt_version=PROMPT_VERSION):
+    """Content address of an AI answer: normalized summary + prompt version + model."""
+    payload = json.dumps(
+        {"summary": normalize_summary(metrics_summary), "prompt_version": prompt_version, "model": model_name},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_insight(cache_col, key):
+    """Return the cached text for `key`, or None when missing or expired."""
+    now = datetime.now(timezone.utc)
+    doc = cache_col.find_one_and_update(
+        {"_id": key, "expires_at": {"$gt": now}},
+        {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+        projection={"text": 1}
+    )
+    return doc["text"] if doc else None
+
+
+def store_insight(cache_col, key, text, ttl_hours=DEFAULT_CACHE_TTL_HOURS, max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+                  model_name=MODEL_NAME):
+    """Store an answer and evict the least recently used entries beyond `max_entries`."""
+    now = datetime.now(timezone.utc)
+
+    # Mongo removes expired entries itself through the TTL index
+    cache_col.create_index("expires_at", expireAfterSeconds=0)
+    cache_col.create_index("last_used_at")
+
+    cache_col.update_one(
+        {"_id": key},
+        {"$set": {
+            "text": text,
+            "model": model_name,
+            "prompt_version": PROMPT_VERSION,
+            "created_at": now,
+            "last_used_at": now,
+            "expires_at": now + timedelta(hours=ttl_hours),
+            "hits": 0
+        }},
+        upsert=True
+    )
+
+    excess = cache_col.count_documents({}) - max_entries
+    if excess > 0:
+        stale = [d["_id"] for d in cache_col.find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess)]
+        cache_col.delete_many({"_id": {"$in": stale}})
+
+
+def active_model_name(ai_settings=None):
+    """Name of the model `create_model` builds for these settings; part of every cache key."""
+    return FAKE_MODEL_NAME if (ai_settings or {}).get("fake_model") else MODEL_NAME
+
+
+def create_model(api_key, ai_settings=None):
+    """Gemini model for `api_key`, or the offline fake when `ai.fake_model` is set.
+
+    The Gemini SDK is imported here so it is only loaded when a model is needed.
+    """
+    ai_settings = ai_settings or {}
+    if ai_settings.get("fake_model"):
+        from tools.fake_gemini import FakeGenerativeModel
+        return FakeGenerativeModel(
+            model_name=FAKE_MODEL_NAME,
+            first_token_seconds=ai_settings.get("fake_first_token_seconds", 1.0),
+            tokens_per_second=ai_settings.get("fake_tokens_per_second", 40)
+        )
+    from google import generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(MODEL_NAME)
+
+
+def get_or_generate_insight(cache_col, metrics_summary, model_factory, model_name=MODEL_NAME,
+                            ttl_hours=DEFAULT_CACHE_TTL_HOURS, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+    """Return `(text, from_cache)`; the model is only built (and called) on a cache miss.
+
+    `model_name` must name the model `model_factory` builds (see `active_model_name`).
+    """
+    key = cache_key(metrics_summary, model_name=model_name)
+    text = get_cached_insight(cache_col, key)
+    if text is not None:
+        return text, True
+
+    response = model_factory().generate_content(build_prompt(metrics_summary))
+    store_insight(cache_col, key, response.text, ttl_hours=ttl_hours, max_entries=max_entries, model_name=model_name)
+    return response.text, False
+
+
+class InsightStream:
+    """Streaming `generate_content` call running on a worker thread.
+
+    The worker builds the model (so the SDK import happens off the script thread
+    too) and puts text chunks on a queue; the script thread drains it with
+    `iter_text()`, e.g. through `st.write_stream`. Leaving `iter_text()` early,
+    by timeout, error or a Streamlit rerun, cancels the worker.
+    """
+
+    def __init__(self, model_factory, prompt):
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self.started_at = time.monotonic()
+        self.first_chunk_seconds = None
+        self._thread = threading.Thread(target=self._run, args=(model_factory, prompt), daemon=True)
+        self._thread.start()
+
+    def _run(self, model_factory, prompt):
+        try:
+            response = model_factory().generate_content(prompt, stream=True)
+            for chunk in response:
+                if self._cancelled.is_set():
+                    break
+                text = chunk.text
+                if text:
+                    self._queue.put(text)
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            self._queue.put(_STREAM_DONE)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def iter_text(self, timeout_seconds=DEFAULT_TIMEOUT_SECONDS):
+        """Yield text chunks as they arrive; raises TimeoutError once `timeout_seconds` have passed."""
+        deadline = self.started_at + timeout_seconds
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"AI analysis did not finish within {timeout_seconds} seconds.")
+                try:
+                    item = self._queue.get(timeout=min(remaining, 0.5))
+                except queue.Empty:
+                    continue
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                if self.first_chunk_seconds is None:
+                    self.first_chunk_seconds = time.monotonic() - self.started_at
+                yield item
+        finally:
+            self.cancel()
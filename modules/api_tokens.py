@@ -0,0 +1,58 @@
+"""Per-user API tokens for the headless metrics API.
+
+Tokens are shown once when created; only their sha256 is stored, in the user's
+`api_tokens` list. A token authenticates as its user and can read the metrics
+of the datasets that user subscribes to.
+"""
+import hashlib
+import secrets
+from datetime import datetime, timezone
+
+TOKEN_PREFIX = "iop_"
+MAX_TOKENS_PER_USER = 10
+
+
+def _hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_api_token(users_col, email, name):
+    """Create a token for `email`; returns the plaintext token, or None when the user has too many."""
+    user_doc = users_col.find_one({"email": email}, {"api_tokens": 1})
+    if not user_doc or len(user_doc.get("api_tokens") or []) >= MAX_TOKENS_PER_USER:
+        return None
+
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    users_col.create_index("api_tokens.hash")
+    users_col.update_one(
+        {"email": email},
+        {"$push": {"api_tokens": {
+            "id": secrets.token_hex(4),
+            "name": name or "API token",
+            "hash": _hash(token),
+            "created_at": datetime.now(timezone.utc),
+            "last_used_at": None,
+        }}}
+    )
+    return token
+
+
+def list_api_tokens(user_doc):
+    """The user's tokens without their hashes."""
+    return [{k: v for k, v in t.items() if k != "hash"} for t in (user_doc or {}).get("api_tokens") or []]
+
+
+def revoke_api_token(users_col, email, token_id):
+    users_col.update_one({"email": email}, {"$pull": {"api_tokens": {"id": token_id}}})
+
+
+def authenticate(users_col, token):
+    """User document the token belongs to, or None; records when the token was last used."""
+    if not token or not token.startswith(TOKEN_PREFIX):
+        return None
+    token_hash = _hash(token)
+    return users_col.find_one_and_update(
+        {"api_tokens.hash": token_hash},
+        {"$set": {"api_tokens.$.last_used_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0, "password": 0, "pat": 0, "api_tokens": 0}
+    )
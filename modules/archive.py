@@ -0,0 +1,330 @@
+"""Tiered storage for old closed stories: raw archive plus per-iteration roll-ups.
+
+Stories closed more than `after_months` ago no longer change in practice, yet
+every dashboard load used to read them again. The archive job moves them from
+`ado-workitems` to `ado-workitems-archive` and keeps one roll-up document per
+dataset and iteration path in `workitem-rollups` with what the dashboard needs
+from them: counts and effort sums (burn-ups), lead/cycle time histograms
+(averages, min/max), created-day totals (the last-30-days averages), daily
+state changes (CFDs) and active-days-per-point sums (active time indicator).
+The dashboard merges the roll-ups of its iterations with the live stories and
+gets the same answers while reading only recent documents. Views filtered
+within iterations (dates, types, area) read the archived stories themselves.
+
+Roll-ups are rebuilt from the archive for the affected paths only, so every
+step can be re-run. A sync or service hook that sees a newer revision of an
+archived story moves it back to the live collection first. The forecast's
+lookback windows are much shorter than `MIN_AFTER_MONTHS` and only use live stories.
+
+Settings in `.streamlit/secrets.toml` (optional):
+
+    [archive]
+    after_months = 12
+
+Run from the repository root, e.g. nightly from cron:
+
+    python insightops.py archive --all
+    python -m modules.archive --dataset "https://dev.azure.com/org|project" --months 18
+"""
+import argparse
+from collections import Counter
+from itertools import chain
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from modules.dashboard_filters import WORKITEM_FILTER_INDEXES
+from modules.metrics import (
+    DATETIME_DTYPE, ITERATION_PROJECTION, VALID_TYPES, WORKITEM_PROJECTION, add_lead_cycle_times, build_iterations_frame,
+    load_workitems_frame
+)
+
+ARCHIVE_COLLECTION = "ado-workitems-archive"
+ROLLUPS_COLLECTION = "workitem-rollups"
+DEFAULT_AFTER_MONTHS = 12
+MIN_AFTER_MONTHS = 6  # well beyond the forecast's lookback windows
+DEFAULT_BATCH_SIZE = 1000
+EFFORT_FIELD = "Microsoft_VSTS_Scheduling_Effort"
+ACTIVATED_FIELD = "Microsoft_VSTS_Common_ActivatedDate"
+# Roll-up fields summed across paths, and the `{key: value}` maps merged key by key
+ROLLUP_TOTALS = ["count", "effort_sum", "estimate_sum", "estimate_count"]
+ROLLUP_MAPS = ["lead", "cycle", "created_n", "created_lead", "created_cycle",
+               "done", "done_effort", "progress", "progress_effort"]
+
+
+def _rollup_id(ds, path):
+    return f"{ds}|{path}"
+
+
+def archive_settings():
+    """`after_months` from `.streamlit/secrets.toml`, never below `MIN_AFTER_MONTHS`."""
+    import streamlit as st
+
+    return max(MIN_AFTER_MONTHS, int(st.secrets.get("archive", {}).get("after_months", DEFAULT_AFTER_MONTHS)))
+
+
+def archive_cutoff(now, months):
+    """ISO date before which closed stories are archived (dates are stored as ISO strings)."""
+    return (pd.Timestamp(now) - pd.DateOffset(months=months)).strftime("%Y-%m-%d")
+
+
+# ---------------------------------------------
+# ROLL-UPS
+# ---------------------------------------------
+def _day_totals(days, weights):
+    """`{"YYYY-MM-DD": total}` of `weights` per (non-null) day."""
+    totals = weights.groupby(days.dt.strftime("%Y-%m-%d")).sum()
+    return {day: value for day, value in totals.to_dict().items() if value}
+
+
+def _histogram(days):
+    return {str(d): int(n) for d, n in days.value_counts().items()}
+
+
+def build_rollups(docs, iterations_df):
+    """`{path: roll-up fields}` of archived (closed) story documents, using the dashboard's own frame build."""
+    workitems_df = load_workitems_frame(docs, iterations_df)
+    if workitems_df.empty:
+        return {}
+    # Every archived story is closed, so `now` does not affect its times
+    workitems_df = add_lead_cycle_times(workitems_df, datetime.now(timezone.utc))
+    has_activated = ACTIVATED_FIELD in workitems_df.columns
+    has_effort = EFFORT_FIELD in workitems_df.columns
+
+    rollups = {}
+    for path, items in workitems_df.groupby("System_IterationPath", observed=True):
+        ones = pd.Series(1, index=items.index)
+        effort = items[EFFORT_FIELD].astype("float64").fillna(0) if has_effort else ones * 0.0
+        created = items["System_CreatedDate"].dt.normalize()
+        closed = items["Microsoft_VSTS_Common_ClosedDate"].dt.normalize()
+        rollup = {
+            "count": len(items),
+            "effort_sum": float(effort.sum()),
+            "has_activated": has_activated,
+            "has_effort": has_effort,
+            "lead": _histogram(items["LeadTimeDays"]),
+            "cycle": _histogram(items["CycleTimeDays"]),
+            "created_n": _day_totals(created, ones),
+            "created_lead": _day_totals(created, items["LeadTimeDays"].astype("int64")),
+            "created_cycle": _day_totals(created, items["CycleTimeDays"].astype("int64")),
+            "done": _day_totals(closed, ones),
+            "done_effort": _day_totals(closed, effort),
+            "progress": {},
+            "progress_effort": {},
+            "estimate_sum": 0.0,
+            "estimate_count": 0,
+        }
+        if has_activated:
+            activated = items[ACTIVATED_FIELD].dt.normalize()
+            started = activated.notna()
+            # In progress from the activation day until the day it is done (same day: never)
+            leaves = activated[started].where(activated[started] > closed[started], closed[started])
+            for key, weights in (("progress", ones), ("progress_effort", effort)):
+                deltas = Counter(_day_totals(activated[started], weights[started]))
+                deltas.subtract(_day_totals(leaves, weights[started]))
+                rollup[key] = {day: value for day, value in deltas.items() if value}
+        if has_effort:
+            active_days = (items["Microsoft_VSTS_Common_ClosedDate"] - items[ACTIVATED_FIELD]).dt.days \
+                if has_activated else pd.Series(float("nan"), index=items.index)
+            raw_effort = items[EFFORT_FIELD].astype("float64")
+            estimates = (active_days / raw_effort).where(raw_effort != 0).dropna()
+            rollup["estimate_sum"] = float(estimates.sum())
+            rollup["estimate_count"] = len(estimates)
+        rollups[path] = rollup
+    return rollups
+
+
+def _iterations_frame(db, ds, paths):
+    iterations = {d["path"]: d for d in db["ado-iterations"].find(
+        {"dataset_id": ds, "path": {"$in": list(paths)}}, ITERATION_PROJECTION
+    )}
+    return build_iterations_frame(list(iterations.values()))
+
+
+def refresh_rollups(db, ds, paths):
+    """Rebuild the roll-ups of `paths` from their archived stories; paths without any lose theirs."""
+    paths = sorted({p for p in paths if p})
+    if not paths:
+        return
+    docs = list(db[ARCHIVE_COLLECTION].find({"dataset_id": ds, "System_IterationPath": {"$in": paths}},
+                                            WORKITEM_PROJECTION))
+    rollups = build_rollups(docs, _iterations_frame(db, ds, paths)) if docs else {}
+    rollups_col = db[ROLLUPS_COLLECTION]
+    now = datetime.now(timezone.utc)
+    for path in paths:
+        if path in rollups:
+            rollups_col.replace_one({"_id": _rollup_id(ds, path)},
+                                    {"dataset_id": ds, "iteration_path": path, "updated_at": now, **rollups[path]},
+                                    upsert=True)
+        else:
+            rollups_col.delete_one({"_id": _rollup_id(ds, path)})
+
+
+def merge_rollups(docs):
+    """Merge roll-up documents into one dict for the metrics; None when there are none."""
+    docs = list(docs)
+    if not docs:
+        return None
+    merged = {key: 0 for key in ROLLUP_TOTALS}
+    maps = {key: Counter() for key in ROLLUP_MAPS}
+    merged.update(paths={}, has_activated=False, has_effort=False)
+    for doc in docs:
+        for key in ROLLUP_TOTALS:
+            merged[key] += doc.get(key) or 0
+        for key in ROLLUP_MAPS:
+            maps[key].update(doc.get(key) or {})
+        merged["has_activated"] |= bool(doc.get("has_activated"))
+        merged["has_effort"] |= bool(doc.get("has_effort"))
+        merged["paths"][doc["iteration_path"]] = {key: doc.get(key) or 0 for key in ROLLUP_TOTALS}
+
+    for key in ("lead", "cycle"):
+        merged[key] = {int(days): n for days, n in maps[key].items() if n}
+    # Day maps as Series indexed by UTC midnight, like the normalized dates of the stories frame
+    for key in ROLLUP_MAPS[2:]:
+        values = {day: value for day, value in maps[key].items() if value}
+        merged[key] = pd.Series(list(values.values()), dtype="float64",
+                                index=pd.DatetimeIndex(pd.to_datetime(list(values), utc=True)).as_unit("us"),
+                                ).sort_index()
+    return merged
+
+
+def load_rollup(db, ds, paths):
+    """Merged roll-up of the dataset's archived stories in `paths`; None when nothing is archived there."""
+    return load_rollups(db, [(ds, paths)])
+
+
+def load_rollups(db, views):
+    """Merged roll-up over several `(dataset, paths)`, e.g. the teams of a cross-team view."""
+    return merge_rollups(chain.from_iterable(
+        db[ROLLUPS_COLLECTION].find({"dataset_id": ds, "iteration_path": {"$in": list(paths)}}, {"_id": 0})
+        for ds, paths in views
+    ))
+
+
+def with_rollup_columns(workitems_df, rollup):
+    """Add the optional columns archived stories have but no live story does (all empty)."""
+    if rollup:
+        if rollup["has_activated"] and ACTIVATED_FIELD not in workitems_df.columns:
+            workitems_df[ACTIVATED_FIELD] = pd.Series(pd.NaT, index=workitems_df.index, dtype=DATETIME_DTYPE)
+        if rollup["has_effort"] and EFFORT_FIELD not in workitems_df.columns:
+            workitems_df[EFFORT_FIELD] = pd.Series(float("nan"), index=workitems_df.index, dtype="float32")
+    return workitems_df
+
+
+def archived_count(db, ds):
+    """Archived stories of the dataset (from the roll-ups, without touching the archive)."""
+    counts = db[ROLLUPS_COLLECTION].aggregate([
+        {"$match": {"dataset_id": ds}},
+        {"$group": {"_id": None, "count": {"$sum": "$count"}}},
+    ])
+    return next(iter(counts), {}).get("count", 0)
+
+
+# ---------------------------------------------
+# ARCHIVE AND RESTORE
+# ---------------------------------------------
+def archive_dataset(db, ds, months=DEFAULT_AFTER_MONTHS, now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Move the dataset's stories closed before the cutoff to the archive; returns how many moved.
+
+    Each batch is copied to the archive and rolled up before it is deleted from
+    the live collection, so an interrupted run loses nothing and the next run
+    finishes it.
+    """
+    now = now or datetime.now(timezone.utc)
+    known_paths = db["ado-iterations"].distinct("path", {"dataset_id": ds, "startDate": {"$ne": None}})
+    query = {
+        "dataset_id": ds,
+        "System_WorkItemType": {"$in": VALID_TYPES},
+        "System_IterationPath": {"$in": known_paths},
+        "Microsoft_VSTS_Common_ClosedDate": {"$lt": archive_cutoff(now, max(months, MIN_AFTER_MONTHS))},
+    }
+    workitems_col = db["ado-workitems"]
+    archive_col = db[ARCHIVE_COLLECTION]
+    moved = 0
+    while True:
+        docs = list(workitems_col.find(query, limit=batch_size))
+        if not docs:
+            break
+        for doc in docs:
+            archive_col.replace_one({"dataset_id": ds, "System_Id": doc["System_Id"]},
+                                    {**{k: v for k, v in doc.items() if k != "_id"}, "archived_at": now}, upsert=True)
+        refresh_rollups(db, ds, {doc["System_IterationPath"] for doc in docs})
+        moved += workitems_col.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}}).deleted_count
+    return moved
+
+
+def archived_revisions(db, ds, ids):
+    """`{System_Id: System_Rev}` of the archived stories among `ids`."""
+    return {
+        d["System_Id"]: d.get("System_Rev") or 0
+        for d in db[ARCHIVE_COLLECTION].find({"dataset_id": ds, "System_Id": {"$in": list(ids)}},
+                                             {"_id": 0, "System_Id": 1, "System_Rev": 1})
+    }
+
+
+def restore_archived(db, ds, ids):
+    """Move archived stories back to the live collection (before newer revisions are stored over them)."""
+    docs = list(db[ARCHIVE_COLLECTION].find({"dataset_id": ds, "System_Id": {"$in": list(ids)}}, {"_id": 0}))
+    if not docs:
+        return 0
+    for doc in docs:
+        doc.pop("archived_at", None)
+        db["ado-workitems"].replace_one({"dataset_id": ds, "System_Id": doc["System_Id"]}, doc, upsert=True)
+    db[ARCHIVE_COLLECTION].delete_many({"dataset_id": ds, "System_Id": {"$in": [d["System_Id"] for d in docs]}})
+    refresh_rollups(db, ds, {doc.get("System_IterationPath") for doc in docs})
+    return len(docs)
+
+
+def delete_archived(db, ds, work_item_id):
+    """Remove an archived story deleted in Azure DevOps; returns its document (None when not archived)."""
+    deleted = db[ARCHIVE_COLLECTION].find_one_and_delete({"dataset_id": ds, "System_Id": work_item_id})
+    if deleted is not None:
+        refresh_rollups(db, ds, [deleted.get("System_IterationPath")])
+    return deleted
+
+
+def ensure_archive_indexes(db):
+    db[ARCHIVE_COLLECTION].create_index([("dataset_id", 1), ("System_Id", 1)], unique=True)
+    db[ARCHIVE_COLLECTION].create_index([("dataset_id", 1), ("System_IterationPath", 1)])
+    db[ROLLUPS_COLLECTION].create_index([("dataset_id", 1), ("iteration_path", 1)])
+    # Views filtered within iterations read archived stories with the same queries as live ones
+    for keys, name in WORKITEM_FILTER_INDEXES:
+        db[ARCHIVE_COLLECTION].create_index(keys, name=name)
+
+
+def archive_all(db, months=DEFAULT_AFTER_MONTHS, datasets=None):
+    """Archive every subscribed dataset (or `datasets`); returns `{dataset: stories moved}`."""
+    from modules.datasets import DATASETS_COLLECTION
+
+    ensure_archive_indexes(db)
+    if datasets is None:
+        datasets = [d["_id"] for d in db[DATASETS_COLLECTION].find({}, {"_id": 1})]
+    results = {}
+    for ds in datasets:
+        results[ds] = archive_dataset(db, ds, months)
+        if results[ds]:
+            db[DATASETS_COLLECTION].update_one({"_id": ds}, {"$set": {"archived_at": datetime.now(timezone.utc)}})
+    return results
+
+
+def main(argv=None):
+    import streamlit as st
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Archive old closed stories into per-iteration roll-ups.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Every subscribed project.")
+    target.add_argument("--dataset", action="append", help="Dataset id (organization URL|project), repeatable.")
+    parser.add_argument("--months", type=int, help=f"Archive stories closed more than this many months ago "
+                                                   f"(at least {MIN_AFTER_MONTHS}; default from [archive]).")
+    args = parser.parse_args(argv)
+
+    db = MongoClient(st.secrets["mongo"]["uri"])[st.secrets["mongo"].get("db_name", "insightops")]
+    months = args.months or archive_settings()
+    for ds, moved in sorted(archive_all(db, months, None if args.all else args.dataset).items()):
+        print(f"{moved:>7}  {ds}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
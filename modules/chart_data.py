@@ -0,0 +1,126 @@
+"""Bounded chart data for long histories.
+
+The CFDs have one row per day since the first story was created, so multi-year
+projects would send thousands of points per series to every browser. Before
+plotting, a series is reduced to at most `max_points` rows:
+
+- "resample" (default): daily, weekly or monthly, the finest that fits the
+  budget. Each period keeps its last day, which is exact for cumulative
+  snapshots like the CFD. LTTB is used if even months do not fit.
+- "lttb": Largest-Triangle-Three-Buckets, which keeps the shape (peaks and
+  turns) of each series at any zoom.
+
+Stacked areas switch to WebGL (`Scattergl`) when the reduced series is still
+longer than `WEBGL_MIN_POINTS`, like Plotly Express does for lines.
+
+Settings in `.streamlit/secrets.toml` (all optional):
+
+    [charts]
+    max_points = 500
+    method = "resample"   # or "lttb"
+    webgl = true
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+DEFAULT_MAX_POINTS = 500
+DEFAULT_METHOD = "resample"
+WEBGL_MIN_POINTS = 1000  # Plotly Express "auto" render mode switches at the same size
+RESAMPLE_PERIODS = [("D", "daily"), ("W", "weekly"), ("M", "monthly")]
+
+
+# ---------------------------------------------
+# REDUCTION
+# ---------------------------------------------
+def _period_keys(dates, period):
+    return dates.dt.tz_convert(None).dt.to_period(period) if dates.dt.tz is not None else dates.dt.to_period(period)
+
+
+def resample_last(df, x, period):
+    """Last row of each calendar period (`D`, `W` or `M`), keeping its real date."""
+    return df.groupby(_period_keys(df[x], period), sort=False).tail(1).reset_index(drop=True)
+
+
+def lttb_indices(x, y, threshold):
+    """Row indices chosen by Largest-Triangle-Three-Buckets; first and last are always kept."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for b in range(threshold - 2):
+        start, end = edges[b], edges[b + 1]
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        # Average point of the next bucket (the last point for the final bucket)
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(areas.argmax())
+        selected[b + 1] = previous
+    return selected
+
+
+def lttb(df, x, ys, max_points):
+    """Rows kept by LTTB over every series (budget split between them), in order."""
+    x_values = df[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype("int64")
+    per_series = max(3, max_points // max(len(ys), 1))
+    keep = np.unique(np.concatenate([lttb_indices(x_values, df[y].fillna(0), per_series) for y in ys]))
+    return df.iloc[keep].reset_index(drop=True)
+
+
+def reduce_points(df, x, ys, max_points=DEFAULT_MAX_POINTS, method=DEFAULT_METHOD):
+    """`(reduced_df, granularity)`; granularity is "daily", "weekly", "monthly" or "LTTB"."""
+    if df is None or len(df) <= max_points:
+        return df, RESAMPLE_PERIODS[0][1]
+    if method == "resample":
+        for period, label in RESAMPLE_PERIODS[1:]:
+            reduced = resample_last(df, x, period)
+            if len(reduced) <= max_points:
+                return reduced, label
+    return lttb(df, x, ys, max_points), "LTTB"
+
+
+# ---------------------------------------------
+# FIGURES
+# ---------------------------------------------
+def stacked_area(df, x, ys, title, y_label, colors, webgl=True):
+    """Stacked area chart like `px.area`; WebGL traces for long series when `webgl`."""
+    use_webgl = webgl and len(df) > WEBGL_MIN_POINTS
+    trace = go.Scattergl if use_webgl else go.Scatter
+    fig = go.Figure()
+    base = np.zeros(len(df))
+    for i, y in enumerate(ys):
+        values = df[y].fillna(0).to_numpy(dtype=np.float64)
+        options = dict(x=df[x], name=y, mode="lines", line=dict(color=colors.get(y)))
+        if use_webgl:
+            # Scattergl has no stackgroup; stack the totals, fill between traces and hover the own value
+            base = base + values
+            fig.add_trace(trace(y=base, fill="tozeroy" if i == 0 else "tonexty", customdata=values,
+                                hovertemplate=f"{y}: %{{customdata:,.4~g}}<extra></extra>", **options))
+        else:
+            fig.add_trace(trace(y=values, stackgroup="one", hovertemplate=f"{y}: %{{y:,.4~g}}<extra></extra>",
+                                **options))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y_label, legend_title_text="State",
+                      hovermode="x unified")
+    return fig
+
+
+def chart_settings():
+    """`(max_points, method, webgl)` from `.streamlit/secrets.toml`."""
+    import streamlit as st
+
+    settings = st.secrets.get("charts", {})
+    return (
+        int(settings.get("max_points", DEFAULT_MAX_POINTS)),
+        settings.get("method", DEFAULT_METHOD),
+        bool(settings.get("webgl", True)),
+    )
@@ -0,0 +1,129 @@
+"""Several Azure DevOps project/team connections per user.
+
+`users.connections` lists the user's connections, each with `id`, `name`,
+`organization_url`, `project_name`, `team_name`, `pat` (encrypted) and, once
+verified, `dataset_id` / `dataset_access`. The top-level fields of the user
+document hold the active one (`active_connection`), which is what the
+dashboard, the aging report, the metrics API and the AI pre-generation read.
+
+Every connection stays subscribed to its shared dataset and is synced with the
+others, so switching only copies another connection to the top level; nothing
+is downloaded again. Users without `connections` have one implicit connection
+made of the top-level fields.
+"""
+import secrets
+
+from modules.datasets import leave_dataset, user_dataset_id, user_team
+
+CONNECTION_FIELDS = ("organization_url", "project_name", "team_name", "pat")
+ACCESS_FIELDS = ("dataset_id", "dataset_access")
+MAX_CONNECTIONS = 10
+
+
+def connection_name(connection):
+    return connection.get("name") or f"{connection.get('project_name')} / {user_team(connection)}"
+
+
+def user_connections(user_doc):
+    """The user's connections; a user without any has the top-level one (with id None)."""
+    user_doc = user_doc or {}
+    if user_doc.get("connections"):
+        return list(user_doc["connections"])
+    if user_doc.get("organization_url") and user_doc.get("project_name"):
+        return [{"id": None, **{f: user_doc.get(f) for f in CONNECTION_FIELDS + ACCESS_FIELDS}}]
+    return []
+
+
+def connection_user_doc(user_doc, connection):
+    """The user document as one connection sees it, for the sync and access code that reads the top-level fields."""
+    if connection.get("id") is None or connection["id"] == user_doc.get("active_connection"):
+        return user_doc
+    return {
+        **user_doc,
+        **{f: connection.get(f) for f in CONNECTION_FIELDS + ACCESS_FIELDS},
+        "connection_id": connection["id"],
+    }
+
+
+def dataset_connection(user_doc, ds):
+    """The user's first connection to the project of dataset `ds`; None when none uses it."""
+    return next((c for c in user_connections(user_doc) if user_dataset_id(c) == ds), None)
+
+
+# ---------------------------------------------
+# EDITING
+# ---------------------------------------------
+def _new_connection(name, fields):
+    return {"id": secrets.token_hex(4), "name": name, **{f: fields.get(f) for f in CONNECTION_FIELDS}}
+
+
+def add_connection(users_col, user_doc, name, fields):
+    """Add a connection (`fields` has the `CONNECTION_FIELDS`); returns its id, or None when the user has too many.
+
+    The top-level connection of a user without `connections` becomes the first
+    (active) one; a user without any connection gets the new one as active.
+    """
+    email = user_doc["email"]
+    connections = user_connections(user_doc)
+    if len(connections) >= MAX_CONNECTIONS:
+        return None
+
+    connection = _new_connection(name, fields)
+    if not connections:
+        users_col.update_one({"email": email}, {
+            "$set": {**{f: connection[f] for f in CONNECTION_FIELDS}, "active_connection": connection["id"]},
+            "$push": {"connections": connection},
+        })
+        return connection["id"]
+
+    if not user_doc.get("connections"):
+        current = {**connections[0], "id": secrets.token_hex(4), "name": ""}
+        users_col.update_one({"email": email, "connections": {"$exists": False}},
+                             {"$set": {"connections": [current], "active_connection": current["id"]}})
+    users_col.update_one({"email": email}, {"$push": {"connections": connection}})
+    return connection["id"]
+
+
+def save_active_connection(users_col, user_doc, updates):
+    """Save profile `updates`; connection fields also go to the active connection's entry."""
+    query = {"email": user_doc["email"]}
+    update = dict(updates)
+    active = user_doc.get("active_connection")
+    if active and any(f in updates for f in CONNECTION_FIELDS):
+        query["connections.id"] = active
+        update.update({f"connections.$.{f}": updates[f] for f in CONNECTION_FIELDS if f in updates})
+    users_col.update_one(query, {"$set": update})
+
+
+def switch_connection(users_col, user_doc, connection_id):
+    """Make another connection active; its dataset is already synced, so the dashboard shows it right away."""
+    connection = next((c for c in user_connections(user_doc) if c.get("id") == connection_id), None)
+    if connection is None:
+        return False
+    fields = CONNECTION_FIELDS + ACCESS_FIELDS
+    update = {
+        "$set": {**{f: connection[f] for f in fields if connection.get(f) is not None},
+                 "active_connection": connection_id},
+        # Another dataset: pre-generated insights of the previous one no longer apply
+        "$inc": {"data_version": 1},
+    }
+    missing = {f: "" for f in fields if connection.get(f) is None}
+    if missing:
+        update["$unset"] = missing
+    users_col.update_one({"email": user_doc["email"]}, update)
+    return True
+
+
+def remove_connection(db, user_doc, connection_id):
+    """Remove an inactive connection and leave its dataset unless another connection still uses it."""
+    if connection_id == user_doc.get("active_connection"):
+        return False
+    connection = next((c for c in user_connections(user_doc) if c.get("id") == connection_id), None)
+    if connection is None:
+        return False
+    db["users"].update_one({"email": user_doc["email"]}, {"$pull": {"connections": {"id": connection_id}}})
+    ds = user_dataset_id(connection)
+    others = {user_dataset_id(c) for c in user_connections(user_doc) if c.get("id") != connection_id}
+    if ds and ds not in others:
+        leave_dataset(db, ds, user_doc["email"])
+    return True
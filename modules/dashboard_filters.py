@@ -0,0 +1,95 @@
+"""Dashboard filters translated into MongoDB queries, so a filtered view loads only its slice.
+
+Filters are a dict with any of:
+
+- `start_date` / `end_date` (`datetime.date`): stories active in the window
+  (created by its end, not closed before its start) and iterations overlapping it
+- `iteration_paths`: stories and iterations of these iterations only
+- `types`: work item types (always within the dashboard's story types)
+- `area_path`: stories under this area path, sub-areas included
+
+Work item dates are stored as Azure DevOps returns them (UTC ISO strings), so
+date-only bounds compare correctly as strings and can use an index.
+"""
+import re
+from datetime import datetime, time, timedelta, timezone
+
+from modules.metrics import VALID_TYPES
+
+AREA_PATH_FIELD = "System_AreaPath"
+# Equality fields first, then the created date range (equality-sort-range)
+WORKITEM_FILTER_INDEXES = [
+    ([("dataset_id", 1), ("System_WorkItemType", 1), ("System_IterationPath", 1), ("System_CreatedDate", 1)],
+     "dashboard_slice"),
+    ([("dataset_id", 1), (AREA_PATH_FIELD, 1), ("System_CreatedDate", 1)], "area_slice"),
+]
+ITERATION_FILTER_INDEXES = [
+    ([("dataset_id", 1), ("teams", 1), ("startDate", 1)], "team_iterations_by_start"),
+]
+
+
+def is_filtered(filters):
+    """True when the filters narrow the view beyond the dashboard's defaults."""
+    return bool((filters or {}).get("iteration_paths")) or narrows_stories(filters)
+
+
+def narrows_stories(filters):
+    """True when stories are filtered within iterations (dates, types or area), which sketches do not cover."""
+    filters = filters or {}
+    return bool(filters.get("start_date") or filters.get("end_date") or filters.get("area_path")
+                or set(filters.get("types") or VALID_TYPES) != set(VALID_TYPES))
+
+
+def _day_after(day):
+    return (day + timedelta(days=1)).isoformat()
+
+
+def workitem_query(ds, filters=None):
+    """`find` filter on `ado-workitems` for the dataset's stories matching `filters`."""
+    filters = filters or {}
+    types = [t for t in (filters.get("types") or VALID_TYPES) if t in VALID_TYPES]
+    query = {"dataset_id": ds, "System_WorkItemType": {"$in": types}}
+
+    if filters.get("iteration_paths"):
+        query["System_IterationPath"] = {"$in": list(filters["iteration_paths"])}
+    if filters.get("area_path"):
+        # Anchored prefix regexes are answered from the index
+        query[AREA_PATH_FIELD] = {"$regex": f"^{re.escape(filters['area_path'])}(\\\\|$)"}
+    if filters.get("end_date"):
+        query["System_CreatedDate"] = {"$lt": _day_after(filters["end_date"])}
+    if filters.get("start_date"):
+        query["$or"] = [
+            {"Microsoft_VSTS_Common_ClosedDate": None},
+            {"Microsoft_VSTS_Common_ClosedDate": {"$gte": filters["start_date"].isoformat()}},
+        ]
+    return query
+
+
+def iteration_query(ds, team, filters=None):
+    """`find` filter on `ado-iterations` for the team's iterations matching `filters`."""
+    filters = filters or {}
+    query = {"dataset_id": ds, "teams": team}
+    if filters.get("iteration_paths"):
+        query["path"] = {"$in": list(filters["iteration_paths"])}
+    # Iteration dates are stored as datetimes
+    if filters.get("end_date"):
+        query["startDate"] = {"$lt": datetime.combine(filters["end_date"] + timedelta(days=1), time(), timezone.utc)}
+    if filters.get("start_date"):
+        query["finishDate"] = {"$gte": datetime.combine(filters["start_date"], time(), timezone.utc)}
+    return query
+
+
+def iteration_range_paths(iterations, first_path, last_path):
+    """Paths from `first_path` to `last_path` of iterations ordered by start date."""
+    paths = [doc["path"] for doc in iterations]
+    if first_path not in paths or last_path not in paths:
+        return paths
+    first, last = sorted((paths.index(first_path), paths.index(last_path)))
+    return paths[first:last + 1]
+
+
+def ensure_filter_indexes(db):
+    for keys, name in WORKITEM_FILTER_INDEXES:
+        db["ado-workitems"].create_index(keys, name=name)
+    for keys, name in ITERATION_FILTER_INDEXES:
+        db["ado-iterations"].create_index(keys, name=name)
@@ -0,0 +1,9 @@
+from datetime import datetime, timezone
+
+
+def bump_data_version(users_col, dataset_id):
+    """Mark the synced data as changed for every subscriber of the dataset."""
+    users_col.update_many(
+        {"dataset_id": dataset_id},
+        {"$inc": {"data_version": 1}, "$set": {"data_synced_at": datetime.now(timezone.utc)}}
+    )
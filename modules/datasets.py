@@ -0,0 +1,243 @@
+"""Shared Azure DevOps datasets, one per (organization, project).
+
+Work items and iterations are stored once per dataset (`dataset_id` on every
+document, iterations also list the `teams` they belong to) instead of once per
+user. Users subscribe to the dataset of the project in their settings; access
+is granted by checking that their own PAT can read that project, re-checked
+every `ACCESS_TTL`. One subscriber's sync refreshes the data for everyone, and
+a Refresh shortly after someone else's sync reuses it instead of downloading
+the project again. Users with several connections (`modules/connections.py`)
+subscribe to the dataset of each.
+"""
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+import requests
+import streamlit as st
+from requests.auth import HTTPBasicAuth
+
+from modules.pat_crypto import decrypt_pat
+from modules.sync_state import SYNC_STATE_COLLECTION
+from modules.metric_sketches import SKETCHES_COLLECTION
+from modules.aging_wip import OPEN_FLAG, OPEN_INDEX_NAME
+from modules.dashboard_filters import ensure_filter_indexes
+from modules.archive import ARCHIVE_COLLECTION, ROLLUPS_COLLECTION, ensure_archive_indexes
+
+DATASETS_COLLECTION = "datasets"
+ACCESS_TTL = timedelta(hours=1)
+SYNC_LOCK_TTL = timedelta(minutes=30)
+DEFAULT_FRESH_MINUTES = 5
+
+
+def dataset_id(organization_url, project_name):
+    return f"{organization_url.strip().rstrip('/').lower()}|{project_name.strip().lower()}"
+
+
+def sanitize_keys(d):
+    """Replace invalid MongoDB characters ('.' and '$') in JSON keys; syncs and service hooks store the same keys."""
+    if isinstance(d, dict):
+        return {k.replace(".", "_").replace("$", "_"): sanitize_keys(v) for k, v in d.items()}
+    elif isinstance(d, list):
+        return [sanitize_keys(i) for i in d]
+    else:
+        return d
+
+
+def user_dataset_id(user_doc):
+    """Dataset of the project in the user's settings, or None when it is not configured."""
+    if not user_doc or not user_doc.get("organization_url") or not user_doc.get("project_name"):
+        return None
+    return dataset_id(user_doc["organization_url"], user_doc["project_name"])
+
+
+def user_team(user_doc):
+    """Team whose iterations the user sees (the project's default team when none is set)."""
+    return user_doc.get("team_name") or user_doc.get("project_name")
+
+
+def ensure_dataset_indexes(db):
+    db["ado-workitems"].create_index([("dataset_id", 1), ("System_Id", 1)])
+    db["ado-iterations"].create_index([("dataset_id", 1), ("id", 1)])
+    db["ado-iterations"].create_index([("dataset_id", 1), ("teams", 1)])
+    # Only open stories are indexed; the aging report never touches closed history
+    db["ado-workitems"].create_index(
+        [("dataset_id", 1), ("System_IterationPath", 1)],
+        name=OPEN_INDEX_NAME,
+        partialFilterExpression={OPEN_FLAG: True}
+    )
+    # Dashboard filters (date window, iterations, types, area path)
+    ensure_filter_indexes(db)
+    ensure_archive_indexes(db)
+
+
+def _other_datasets(user_doc):
+    """Datasets of the user's connections other than the one `user_doc` is seen through."""
+    current = user_doc.get("connection_id") or user_doc.get("active_connection")
+    return {user_dataset_id(c) for c in user_doc.get("connections") or [] if c.get("id") != current} - {None}
+
+
+def _store_access(db, user_doc, op, fields):
+    """Apply `{op: fields}` to the user's connection entry, and to the user document for the active connection."""
+    query = {"email": user_doc["email"]}
+    update = {} if "connection_id" in user_doc else dict(fields)
+    entry_id = user_doc.get("connection_id") or user_doc.get("active_connection")
+    if entry_id and any(c.get("id") == entry_id for c in user_doc.get("connections") or []):
+        query["connections.id"] = entry_id
+        update.update({f"connections.$.{k}": v for k, v in fields.items()})
+    db["users"].update_one(query, {op: update})
+
+
+# ---------------------------------------------
+# ACCESS
+# ---------------------------------------------
+def check_pat_access(organization_url, project_name, pat, timeout=15):
+    """True when `pat` can read the project (one `GET _apis/projects/{project}` call)."""
+    if not pat:
+        return False
+    try:
+        response = requests.get(
+            f"{organization_url.rstrip('/')}/_apis/projects/{quote(project_name)}",
+            params={"api-version": "7.0"},
+            auth=HTTPBasicAuth("", pat),
+            timeout=timeout,
+            allow_redirects=False  # an invalid PAT is redirected to the sign-in page
+        )
+    except requests.RequestException as e:
+        print(f"PAT access check failed for {organization_url}: {e}")
+        return False
+    return response.status_code == 200
+
+
+def ensure_access(db, user_doc, force=False):
+    """Subscribe the user to their project's dataset if their PAT can read it.
+
+    Returns the dataset id, or None when the project is not configured or access was denied.
+    A successful check is remembered on the user document for `ACCESS_TTL`.
+    """
+    ds = user_dataset_id(user_doc)
+    if not ds:
+        return None
+
+    email = user_doc["email"]
+    now = datetime.now(timezone.utc)
+    access = user_doc.get("dataset_access") or {}
+    verified_at = access.get("verified_at")
+    if (not force and access.get("dataset_id") == ds and verified_at
+            and verified_at.replace(tzinfo=timezone.utc) + ACCESS_TTL > now):
+        return ds
+
+    datasets_col = db[DATASETS_COLLECTION]
+    # Other connections of the user may share a dataset with this one
+    others = _other_datasets(user_doc)
+
+    # Leave the previous dataset when the organization or project changed
+    previous = user_doc.get("dataset_id")
+    if previous and previous != ds and previous not in others:
+        datasets_col.update_one({"_id": previous}, {"$pull": {"subscribers": email}})
+
+    if not check_pat_access(user_doc["organization_url"], user_doc["project_name"], decrypt_pat(user_doc.get("pat"))):
+        _store_access(db, user_doc, "$unset", {"dataset_id": "", "dataset_access": ""})
+        if ds not in others:
+            datasets_col.update_one({"_id": ds}, {"$pull": {"subscribers": email}})
+        return None
+
+    _store_access(db, user_doc, "$set", {"dataset_id": ds, "dataset_access": {"dataset_id": ds, "verified_at": now}})
+    datasets_col.update_one(
+        {"_id": ds},
+        {
+            "$setOnInsert": {
+                "organization_url": user_doc["organization_url"],
+                "project_name": user_doc["project_name"],
+                "created_at": now,
+            },
+            "$addToSet": {"subscribers": email},
+        },
+        upsert=True
+    )
+    return ds
+
+
+def dataset_subscribers(db, ds):
+    doc = db[DATASETS_COLLECTION].find_one({"_id": ds}, {"subscribers": 1})
+    return doc.get("subscribers", []) if doc else []
+
+
+def unsubscribe(db, email):
+    """Remove the user from the datasets of all their connections; data is deleted once nobody subscribes.
+
+    Returns `(deleted_workitems, deleted_iterations)`.
+    """
+    user_doc = db["users"].find_one({"email": email}, {"dataset_id": 1, "connections": 1})
+    if not user_doc:
+        return 0, 0
+    connections = user_doc.get("connections") or []
+    datasets = {user_doc.get("dataset_id")} | {c.get("dataset_id") for c in connections}
+    update = {"$unset": {"dataset_id": "", "dataset_access": ""}}
+    if connections:
+        update["$set"] = {"connections": [{k: v for k, v in c.items() if k not in ("dataset_id", "dataset_access")}
+                                          for c in connections]}
+    db["users"].update_one({"email": email}, update)
+
+    deleted_workitems = deleted_iterations = 0
+    for ds in datasets - {None}:
+        workitems, iterations = leave_dataset(db, ds, email)
+        deleted_workitems += workitems
+        deleted_iterations += iterations
+    return deleted_workitems, deleted_iterations
+
+
+def leave_dataset(db, ds, email):
+    """Remove one subscriber; deletes the dataset's data once nobody subscribes.
+
+    Returns `(deleted_workitems, deleted_iterations)`.
+    """
+    datasets_col = db[DATASETS_COLLECTION]
+    datasets_col.update_one({"_id": ds}, {"$pull": {"subscribers": email}})
+    if dataset_subscribers(db, ds):
+        return 0, 0
+
+    deleted_workitems = db["ado-workitems"].delete_many({"dataset_id": ds}).deleted_count
+    deleted_workitems += db[ARCHIVE_COLLECTION].delete_many({"dataset_id": ds}).deleted_count
+    db[ROLLUPS_COLLECTION].delete_many({"dataset_id": ds})
+    deleted_iterations = db["ado-iterations"].delete_many({"dataset_id": ds}).deleted_count
+    db[SYNC_STATE_COLLECTION].delete_many({"dataset_id": ds})
+    db[SKETCHES_COLLECTION].delete_many({"dataset_id": ds})
+    datasets_col.delete_one({"_id": ds})
+    return deleted_workitems, deleted_iterations
+
+
+# ---------------------------------------------
+# SHARED SYNC
+# ---------------------------------------------
+def claim_dataset_sync(db, ds, email, fresh_minutes=None):
+    """Claim the dataset for a sync by `email`.
+
+    Returns "claimed", "fresh" (someone synced it within `fresh_minutes`) or
+    "busy" (another subscriber's sync holds the claim).
+    """
+    if fresh_minutes is None:
+        fresh_minutes = st.secrets.get("sync", {}).get("shared_fresh_minutes", DEFAULT_FRESH_MINUTES)
+    datasets_col = db[DATASETS_COLLECTION]
+    now = datetime.now(timezone.utc)
+
+    doc = datasets_col.find_one({"_id": ds}, {"last_synced_at": 1})
+    last_synced_at = doc.get("last_synced_at") if doc else None
+    if last_synced_at and last_synced_at.replace(tzinfo=timezone.utc) + timedelta(minutes=fresh_minutes) > now:
+        return "fresh"
+
+    claimed = datasets_col.find_one_and_update(
+        {"_id": ds, "$or": [
+            {"sync_lock_until": None},
+            {"sync_lock_until": {"$lt": now}},
+            {"sync_locked_by": email},
+        ]},
+        {"$set": {"sync_locked_by": email, "sync_lock_until": now + SYNC_LOCK_TTL}}
+    )
+    return "claimed" if claimed else "busy"
+
+
+def release_dataset_sync(db, ds, email, succeeded):
+    update = {"$unset": {"sync_locked_by": "", "sync_lock_until": ""}}
+    if succeeded:
+        update["$set"] = {"last_synced_at": datetime.now(timezone.utc), "last_synced_by": email}
+    db[DATASETS_COLLECTION].update_one({"_id": ds, "sync_locked_by": email}, update)
@@ -0,0 +1,291 @@
+"""Email outbox: pages queue messages in MongoDB, a sender worker delivers them.
+
+Registration and password recovery only insert a document into `email-outbox`
+and return. One worker thread per server process (or `python insightops.py
+outbox --loop` in a process of its own) claims due messages and sends them over
+one authenticated SMTP connection that stays open between messages. Each
+message records its delivery: `status` is "pending", "sending", "sent" or
+"failed", with `attempts`, `last_error` and `sent_at`. Connection errors and 4xx
+replies are retried with exponential backoff; 5xx replies and exhausted
+attempts end as "failed". Sent and failed messages are removed after `keep_days`.
+
+The SMTP server and account come from `[google_smtp]` in
+`.streamlit/secrets.toml`. Optional settings:
+
+    [google_smtp]
+    starttls = true        # false for a local stand-in (tools/fake_smtp_server.py)
+
+    [email_outbox]
+    max_attempts = 5
+    backoff_seconds = 30   # doubled after each failed attempt, at most an hour
+    idle_seconds = 60      # close the SMTP connection after this long without mail
+    poll_seconds = 30      # how often an idle worker looks for due retries
+    keep_days = 30
+"""
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+
+from pymongo import ASCENDING, ReturnDocument
+
+OUTBOX_COLLECTION = "email-outbox"
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+DEFAULT_IDLE_SECONDS = 60
+DEFAULT_POLL_SECONDS = 30
+DEFAULT_KEEP_DAYS = 30
+SMTP_TIMEOUT_SECONDS = 30
+# A "sending" message whose worker died is picked up again after this
+SEND_LEASE = timedelta(minutes=5)
+
+_worker = None
+_wake = threading.Event()
+_lock = threading.Lock()
+
+
+def smtp_settings():
+    """SMTP server and account from `[google_smtp]` in `.streamlit/secrets.toml`."""
+    import streamlit as st
+
+    smtp = st.secrets["google_smtp"]
+    return {
+        "server": smtp["server"],
+        "port": int(smtp["port"]),
+        "email": smtp["email"],
+        "password": smtp.get("password"),
+        "starttls": smtp.get("starttls", True),
+    }
+
+
+def outbox_settings():
+    """Retry, connection reuse and retention settings from `[email_outbox]`."""
+    import streamlit as st
+
+    settings = st.secrets.get("email_outbox", {})
+    return {
+        "max_attempts": max(1, int(settings.get("max_attempts", DEFAULT_MAX_ATTEMPTS))),
+        "backoff_seconds": float(settings.get("backoff_seconds", DEFAULT_BACKOFF_SECONDS)),
+        "idle_seconds": float(settings.get("idle_seconds", DEFAULT_IDLE_SECONDS)),
+        "poll_seconds": float(settings.get("poll_seconds", DEFAULT_POLL_SECONDS)),
+        "keep_days": float(settings.get("keep_days", DEFAULT_KEEP_DAYS)),
+    }
+
+
+def ensure_outbox_indexes(db):
+    outbox_col = db[OUTBOX_COLLECTION]
+    outbox_col.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="due")
+    outbox_col.create_index("delete_after", name="retention", expireAfterSeconds=0)
+
+
+def queue_email(db, to, subject, body, kind):
+    """Queue a message for the sender worker and wake it up; returns right away."""
+    now = datetime.now(timezone.utc)
+    result = db[OUTBOX_COLLECTION].insert_one({
+        "to": to,
+        "subject": subject,
+        "body": body,
+        "kind": kind,
+        "status": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+    })
+    _wake.set()
+    return result.inserted_id
+
+
+# ---------------------------------------------
+# SMTP CONNECTION
+# ---------------------------------------------
+class SmtpSender:
+    """One authenticated SMTP connection, opened on first use and reused for the following messages."""
+
+    def __init__(self, settings, timeout=SMTP_TIMEOUT_SECONDS):
+        self.settings = settings
+        self.timeout = timeout
+        self.connections = 0
+        self.last_used = 0.0
+        self._smtp = None
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.settings["server"], self.settings["port"], timeout=self.timeout)
+        try:
+            if self.settings.get("starttls", True):
+                smtp.starttls()
+            if self.settings.get("password"):
+                smtp.login(self.settings["email"], self.settings["password"])
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.connections += 1
+
+    def send(self, to, subject, body):
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = self.settings["email"]
+        msg["To"] = to
+
+        for retry in (False, True):
+            if self._smtp is None:
+                self._connect()
+            try:
+                self._smtp.sendmail(self.settings["email"], [to], msg.as_string())
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server closed the connection while it was idle; reconnect once
+                self._smtp = None
+                if retry:
+                    raise
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                raise  # the connection is still usable
+            except Exception:
+                self.close()
+                raise
+
+    def close_if_idle(self, idle_seconds):
+        if self._smtp is not None and time.monotonic() - self.last_used >= idle_seconds:
+            self.close()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+    @property
+    def is_open(self):
+        return self._smtp is not None
+
+
+def _rejected(error):
+    """True when the server refused this message; other errors concern the connection or the account."""
+    return isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError))
+
+
+def _permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return _rejected(error) and error.smtp_code >= 500
+
+
+# ---------------------------------------------
+# DELIVERY
+# ---------------------------------------------
+def _claim(outbox_col, now):
+    return outbox_col.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lte": now}},
+        ]},
+        {"$set": {"status": "sending", "lease_until": now + SEND_LEASE}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def deliver_due(db, sender, settings):
+    """Send every due message over `sender`; returns the `sent` / `retry` / `failed` counts.
+
+    A connection or login failure reschedules the claimed message and ends the
+    round (`stopped`), since the other messages would fail the same way.
+    """
+    outbox_col = db[OUTBOX_COLLECTION]
+    keep = timedelta(days=settings["keep_days"])
+    counts = {"sent": 0, "retry": 0, "failed": 0, "stopped": False}
+    while True:
+        doc = _claim(outbox_col, datetime.now(timezone.utc))
+        if doc is None:
+            return counts
+        try:
+            sender.send(doc["to"], doc["subject"], doc["body"])
+        except Exception as e:
+            now = datetime.now(timezone.utc)
+            error = f"{type(e).__name__}: {e}"
+            if _permanent(e) or doc["attempts"] >= settings["max_attempts"]:
+                print(f"Email to {doc['to']} failed after {doc['attempts']} attempt(s): {error}")
+                update = {"status": "failed", "failed_at": now, "delete_after": now + keep}
+                counts["failed"] += 1
+            else:
+                delay = min(settings["backoff_seconds"] * 2 ** (doc["attempts"] - 1), MAX_BACKOFF_SECONDS)
+                update = {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay)}
+                counts["retry"] += 1
+            outbox_col.update_one({"_id": doc["_id"]},
+                                  {"$set": {**update, "last_error": error}, "$unset": {"lease_until": ""}})
+            if not _rejected(e):
+                counts["stopped"] = True
+                return counts
+            continue
+
+        now = datetime.now(timezone.utc)
+        outbox_col.update_one({"_id": doc["_id"]}, {
+            "$set": {"status": "sent", "sent_at": now, "delete_after": now + keep},
+            "$unset": {"lease_until": ""}
+        })
+        counts["sent"] += 1
+
+
+def seconds_to_next_retry(db):
+    """Seconds until the earliest pending message is due; None when nothing is pending."""
+    doc = db[OUTBOX_COLLECTION].find_one({"status": "pending"}, {"next_attempt_at": 1},
+                                         sort=[("next_attempt_at", ASCENDING)])
+    if doc is None:
+        return None
+    due = doc["next_attempt_at"].replace(tzinfo=timezone.utc)
+    return max(0.0, (due - datetime.now(timezone.utc)).total_seconds())
+
+
+def outbox_status_counts(db):
+    return {status: db[OUTBOX_COLLECTION].count_documents({"status": status})
+            for status in ("pending", "sending", "sent", "failed")}
+
+
+class OutboxWorker(threading.Thread):
+    """Delivers queued messages in the background; `queue_email` wakes it up."""
+
+    def __init__(self, db, smtp, settings):
+        super().__init__(name="email-outbox", daemon=True)
+        self.db = db
+        self.sender = SmtpSender(smtp)
+        self.settings = settings
+
+    def _wait_seconds(self):
+        wait = self.settings["poll_seconds"]
+        next_retry = seconds_to_next_retry(self.db)
+        if next_retry is not None:
+            wait = min(wait, next_retry)
+        if self.sender.is_open:
+            wait = min(wait, max(0.0, self.settings["idle_seconds"] - (time.monotonic() - self.sender.last_used)))
+        return wait
+
+    def run(self):
+        while True:
+            _wake.clear()
+            try:
+                counts = deliver_due(self.db, self.sender, self.settings)
+                # After a connection failure the other due messages wait for the backoff too
+                wait = self.settings["backoff_seconds"] if counts["stopped"] else self._wait_seconds()
+            except Exception as e:
+                print(f"Email outbox round failed: {e}")
+                wait = self.settings["poll_seconds"]
+            # New mail, a due retry or the idle timeout of the open connection ends the wait
+            _wake.wait(wait)
+            self.sender.close_if_idle(self.settings["idle_seconds"])
+
+
+def start_outbox_worker(db):
+    """Start this process's sender worker once; later calls return the running one."""
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            ensure_outbox_indexes(db)
+            _worker = OutboxWorker(db, smtp_settings(), outbox_settings())
+            _worker.start()
+        return _worker
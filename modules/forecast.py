@@ -0,0 +1,230 @@
+"""Monte Carlo delivery forecasts from historical throughput.
+
+Throughput is sampled from the closed dates already stored for the stories,
+either per calendar day over a lookback window or per finished iteration. Each
+simulation draws future periods from that history with replacement. All
+simulations run together as NumPy array operations. Far from the goal a
+simulation advances 32 periods per draw, sampled from the exact distribution of
+their sum, so 100k simulations take a fraction of a second.
+
+Two questions are answered, each at the 50/85/95 % confidence levels:
+- "when will N items be done": completion date that many simulations finish by
+- "how many by date D": item count that many simulations reach by then
+
+Settings in `.streamlit/secrets.toml` (all optional):
+
+    [forecast]
+    mode = "daily"          # or "iteration"
+    simulations = 10000
+    lookback_days = 90      # daily mode
+    lookback_iterations = 10  # iteration mode
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIMULATIONS = 10_000
+DEFAULT_LOOKBACK_DAYS = 90
+DEFAULT_LOOKBACK_ITERATIONS = 10
+DEFAULT_TARGET_DAYS = 30
+DEFAULT_SEED = 0  # fixed, so the same data gives the same forecast (and the same AI cache key)
+CONFIDENCE_LEVELS = (50, 85, 95)
+MAX_PERIODS = {"daily": 3650, "iteration": 260}
+MAX_BLOCK_CELLS = 2_000_000  # simulations x periods drawn per step
+JUMP_PERIODS = 32
+
+
+# ---------------------------------------------
+# THROUGHPUT HISTORY
+# ---------------------------------------------
+def _utc_values(dates):
+    return dates.dt.tz_convert(None).to_numpy(dtype="datetime64[us]")
+
+
+def daily_throughput(workitems_df, now, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """Stories closed on each of the `lookback_days` full days before `now` (zero days included)."""
+    end = pd.Timestamp(now).normalize()
+    start = end - pd.Timedelta(days=lookback_days)
+    closed = workitems_df["Microsoft_VSTS_Common_ClosedDate"].dropna().dt.normalize()
+    closed = closed[(closed >= start) & (closed < end)]
+    offsets = ((closed - start) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+    return np.bincount(offsets, minlength=lookback_days)
+
+
+def iteration_throughput(iterations_df, workitems_df, now, lookback_iterations=DEFAULT_LOOKBACK_ITERATIONS):
+    """`(closed_per_iteration, mean_iteration_days)` for the last finished iterations."""
+    finished = iterations_df[iterations_df["finishDate"] <= pd.Timestamp(now)].dropna(subset=["startDate", "finishDate"])
+    finished = finished.sort_values("finishDate").tail(lookback_iterations)
+    if finished.empty:
+        return np.zeros(0, dtype=np.int64), None
+
+    closed = np.sort(_utc_values(workitems_df["Microsoft_VSTS_Common_ClosedDate"].dropna()))
+    starts = _utc_values(finished["startDate"])
+    # finishDate is midnight at the start of the last day; count closures up to the end of that day
+    ends = _utc_values(finished["finishDate"]) + np.timedelta64(1, "D")
+    counts = np.searchsorted(closed, ends, side="left") - np.searchsorted(closed, starts, side="left")
+    iteration_days = float(((finished["finishDate"] - finished["startDate"]).dt.days + 1).mean())
+    return counts.astype(np.int64), iteration_days
+
+
+# ---------------------------------------------
+# SIMULATION
+# ---------------------------------------------
+def _block_periods(simulations):
+    return max(1, MAX_BLOCK_CELLS // max(simulations, 1))
+
+
+def _pmf(samples):
+    counts = np.bincount(samples)
+    return counts / counts.sum()
+
+
+def _sum_pmf(pmf, periods):
+    """Distribution of the sum of `periods` independent draws (convolution by repeated squaring)."""
+    result, base = np.array([1.0]), pmf
+    while periods:
+        if periods & 1:
+            result = np.convolve(result, base)
+        periods >>= 1
+        if periods:
+            base = np.convolve(base, base)
+    return result / result.sum()
+
+
+def _draw_sums(rng, pmf, size):
+    return rng.choice(pmf.size, size=size, p=pmf)
+
+
+def simulate_periods_to_complete(samples, remaining, simulations=DEFAULT_SIMULATIONS,
+                                 max_periods=MAX_PERIODS["daily"], rng=None):
+    """Periods each simulation needs to finish `remaining` items (`inf` beyond `max_periods`)."""
+    rng = rng or np.random.default_rng(DEFAULT_SEED)
+    samples = np.asarray(samples, dtype=np.int64)
+    result = np.full(simulations, np.inf)
+    if remaining <= 0:
+        result[:] = 0
+        return result
+    if samples.size == 0 or samples.max() == 0:
+        return result
+
+    done = np.zeros(simulations, dtype=np.int64)
+    elapsed = np.zeros(simulations, dtype=np.int64)
+
+    # Far from the goal, jump JUMP_PERIODS at a time with one draw from the distribution of their sum
+    jump_pmf = _sum_pmf(_pmf(samples), JUMP_PERIODS)
+    cannot_finish_below = remaining - JUMP_PERIODS * int(samples.max())
+    while True:
+        jumping = np.flatnonzero((done < cannot_finish_below) & (elapsed + JUMP_PERIODS <= max_periods))
+        if not jumping.size:
+            break
+        done[jumping] += _draw_sums(rng, jump_pmf, jumping.size)
+        elapsed[jumping] += JUMP_PERIODS
+
+    # Close to it, period by period to find the one that crosses
+    active = np.flatnonzero(elapsed < max_periods)
+    while active.size:
+        block = _block_periods(active.size)
+        cumulative = done[active, None] + np.cumsum(rng.choice(samples, size=(active.size, block)), axis=1)
+        reached = cumulative >= remaining
+        finished = reached.any(axis=1)
+        result[active[finished]] = elapsed[active[finished]] + reached[finished].argmax(axis=1) + 1
+        done[active] = cumulative[:, -1]
+        elapsed[active] += block
+        active = active[~finished]
+        active = active[elapsed[active] < max_periods]
+
+    result[result > max_periods] = np.inf
+    return result
+
+
+def simulate_items_in_periods(samples, periods, simulations=DEFAULT_SIMULATIONS, rng=None):
+    """Items each simulation completes within `periods`."""
+    rng = rng or np.random.default_rng(DEFAULT_SEED)
+    samples = np.asarray(samples, dtype=np.int64)
+    totals = np.zeros(simulations, dtype=np.int64)
+    if samples.size == 0 or periods <= 0:
+        return totals
+
+    pmf = _pmf(samples)
+    jumps, rest = divmod(periods, JUMP_PERIODS)
+    if jumps:
+        totals += _draw_sums(rng, _sum_pmf(pmf, JUMP_PERIODS), (simulations, jumps)).sum(axis=1)
+    if rest:
+        totals += _draw_sums(rng, _sum_pmf(pmf, rest), simulations)
+    return totals
+
+
+def completion_percentiles(periods_needed, levels=CONFIDENCE_LEVELS):
+    """Periods that `level` % of simulations finish within; None when beyond the horizon."""
+    result = {}
+    for level in levels:
+        value = np.percentile(periods_needed, level, method="higher")
+        result[level] = None if np.isinf(value) else int(value)
+    return result
+
+
+def items_percentiles(items_done, levels=CONFIDENCE_LEVELS):
+    """Items that `level` % of simulations reach at least."""
+    return {level: int(np.percentile(items_done, 100 - level, method="lower")) for level in levels}
+
+
+# ---------------------------------------------
+# DASHBOARD FORECAST
+# ---------------------------------------------
+def delivery_forecast(iterations_df, workitems_df, now, remaining=None, target_date=None, mode="daily",
+                      simulations=DEFAULT_SIMULATIONS, lookback_days=DEFAULT_LOOKBACK_DAYS,
+                      lookback_iterations=DEFAULT_LOOKBACK_ITERATIONS, seed=DEFAULT_SEED):
+    """Forecast for `remaining` items (default: open stories) and `target_date` (default: in 30 days).
+
+    Returns None when the history has no closed stories to sample from.
+    """
+    now = pd.Timestamp(now)
+    if remaining is None:
+        remaining = int(workitems_df["Microsoft_VSTS_Common_ClosedDate"].isna().sum())
+    if target_date is None:
+        target_date = now + pd.Timedelta(days=DEFAULT_TARGET_DAYS)
+    target_date = pd.Timestamp(target_date)
+    if target_date.tzinfo is None:
+        target_date = target_date.tz_localize(now.tzinfo)
+
+    if mode == "iteration":
+        samples, period_days = iteration_throughput(iterations_df, workitems_df, now, lookback_iterations)
+    else:
+        mode, period_days = "daily", 1.0
+        samples = daily_throughput(workitems_df, now, lookback_days)
+    if not samples.size or not samples.sum():
+        return None
+
+    rng = np.random.default_rng(seed)
+    days_to_target = max((target_date - now).days, 0)
+    target_periods = int(days_to_target // period_days)
+
+    periods_needed = simulate_periods_to_complete(samples, remaining, simulations, MAX_PERIODS[mode], rng)
+    items_done = simulate_items_in_periods(samples, target_periods, simulations, rng)
+
+    completion_dates = {
+        level: None if periods is None else (now + pd.Timedelta(days=periods * period_days)).normalize()
+        for level, periods in completion_percentiles(periods_needed).items()
+    }
+    return {
+        "mode": mode,
+        "simulations": simulations,
+        "history_periods": int(samples.size),
+        "mean_throughput": float(samples.mean()),
+        "remaining_items": remaining,
+        "completion_dates": completion_dates,
+        "target_date": target_date.normalize(),
+        "items_by_target": items_percentiles(items_done),
+    }
+
+
+def forecast_settings():
+    """Keyword arguments for `delivery_forecast` from `.streamlit/secrets.toml`."""
+    import streamlit as st
+
+    settings = st.secrets.get("forecast", {})
+    return {
+        "mode": settings.get("mode", "daily"),
+        "simulations": int(settings.get("simulations", DEFAULT_SIMULATIONS)),
+        "lookback_days": int(settings.get("lookback_days", DEFAULT_LOOKBACK_DAYS)),
+        "lookback_iterations": int(settings.get("lookback_iterations", DEFAULT_LOOKBACK_ITERATIONS)),
+    }
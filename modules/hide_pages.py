@@ -1,12 +1,20 @@
 import streamlit as st
+from modules.admin import is_admin
 
 def hide_internal_pages():
-    st.markdown("""
+    admin_rule = ""
+    if not is_admin(st.session_state.get("user_email")):
+        admin_rule = """
+        section[data-testid="stSidebar"] ul li a[href*="ops-admin"] {
+            display: none !important;
+        }"""
+
+    st.markdown(f"""
         <style>
         section[data-testid="stSidebar"] ul li a[href*="forgot-password"],
         section[data-testid="stSidebar"] ul li a[href*="reset-password"],
-        section[data-testid="stSidebar"] ul li a[href*="verify"] {
+        section[data-testid="stSidebar"] ul li a[href*="verify"] {{
             display: none !important;
-        }
+        }}{admin_rule}
         </style>
     """, unsafe_allow_html=True)
@@ -0,0 +1,150 @@
+"""Live invalidation of dashboard data when a shared dataset changes.
+
+One background listener per server process follows a MongoDB change stream on
+`ado-workitems` and `ado-iterations` and bumps an in-process version per
+dataset. Change streams need a replica set (Atlas, or a local single-node
+`mongod --replSet rs0`); on a standalone server the listener falls back to
+polling the `datasets` collection for finished syncs and service-hook events.
+In-process caches register with `on_invalidate` (the metrics API evicts its
+payloads of the changed dataset); open dashboards compare `dataset_version` on
+a timer and rerun once the changes have settled.
+
+Settings in `.streamlit/secrets.toml`:
+
+    [live]
+    enabled = true
+    change_stream = true   # false always polls
+    check_seconds = 10     # how often an open dashboard checks for changes
+    settle_seconds = 3     # rerun only after a running sync has been quiet this long
+    poll_seconds = 15      # polling fallback interval
+"""
+import threading
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from modules.datasets import DATASETS_COLLECTION
+
+WATCHED_COLLECTIONS = ("ado-workitems", "ado-iterations")
+ALL_DATASETS = "*"  # deletes carry no dataset_id; they invalidate every dataset
+DEFAULT_CHECK_SECONDS = 10
+DEFAULT_SETTLE_SECONDS = 3
+DEFAULT_POLL_SECONDS = 15
+RECONNECT_SECONDS = 5
+
+_versions = {}  # dataset id -> number of changes seen by this process
+_changed_at = {}  # dataset id -> time.monotonic() of the latest change
+_callbacks = []
+_listener = None
+_lock = threading.Lock()
+
+
+def dataset_version(ds):
+    """In-process version of the dataset; it changes whenever the dataset's documents change."""
+    with _lock:
+        return _versions.get(ds, 0) + _versions.get(ALL_DATASETS, 0)
+
+
+def changed_since(ds, version, settle_seconds=DEFAULT_SETTLE_SECONDS):
+    """True when the dataset moved past `version` and has been quiet for `settle_seconds`."""
+    with _lock:
+        current = _versions.get(ds, 0) + _versions.get(ALL_DATASETS, 0)
+        last_change = max(_changed_at.get(ds, 0), _changed_at.get(ALL_DATASETS, 0))
+    return current != version and time.monotonic() - last_change >= settle_seconds
+
+
+def on_invalidate(callback):
+    """Call `callback(dataset_id)` on every change (`ALL_DATASETS` for deletes)."""
+    with _lock:
+        _callbacks.append(callback)
+
+
+def notify_change(ds):
+    with _lock:
+        _versions[ds] = _versions.get(ds, 0) + 1
+        _changed_at[ds] = time.monotonic()
+        callbacks = list(_callbacks)
+    for callback in callbacks:
+        try:
+            callback(ds)
+        except Exception as e:
+            print(f"Cache invalidation for {ds} failed: {e}")
+
+
+# ---------------------------------------------
+# LISTENER
+# ---------------------------------------------
+class ChangeListener(threading.Thread):
+    def __init__(self, db, use_change_stream=True, poll_seconds=DEFAULT_POLL_SECONDS):
+        super().__init__(name="insightops-change-listener", daemon=True)
+        self.db = db
+        self.use_change_stream = use_change_stream
+        self.poll_seconds = poll_seconds
+        self.mode = None
+        self._resume_token = None
+        self._seen = {}
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        if self.use_change_stream:
+            self._follow_change_stream()
+        if not self._stop_event.is_set():
+            self._poll()
+
+    def _follow_change_stream(self):
+        """Follow the change stream until stopped; returns early when the deployment has none."""
+        while not self._stop_event.is_set():
+            try:
+                self._watch()
+            except OperationFailure as e:
+                if self.mode is None:
+                    print(f"Change streams unavailable ({e}); polling for dataset changes instead.")
+                    return
+                # The resume point fell out of the oplog; start over and treat everything as changed
+                print(f"Change stream lost its position ({e}); restarting.")
+                self._resume_token = None
+                notify_change(ALL_DATASETS)
+                self._stop_event.wait(RECONNECT_SECONDS)
+            except PyMongoError as e:
+                print(f"Change stream interrupted ({e}); reconnecting in {RECONNECT_SECONDS}s.")
+                self._stop_event.wait(RECONNECT_SECONDS)
+
+    def _watch(self):
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}},
+            {"$project": {"operationType": 1, "fullDocument.dataset_id": 1}},
+        ]
+        with self.db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token,
+                           max_await_time_ms=1000) as stream:
+            self.mode = "change_stream"
+            while not self._stop_event.is_set() and stream.alive:
+                change = stream.try_next()
+                self._resume_token = stream.resume_token
+                if change is not None:
+                    notify_change((change.get("fullDocument") or {}).get("dataset_id") or ALL_DATASETS)
+
+    def _poll(self):
+        self.mode = "polling"
+        while not self._stop_event.is_set():
+            try:
+                for doc in self.db[DATASETS_COLLECTION].find({}, {"last_synced_at": 1, "last_event_at": 1}):
+                    stamp = (doc.get("last_synced_at"), doc.get("last_event_at"))
+                    if doc["_id"] in self._seen and self._seen[doc["_id"]] != stamp:
+                        notify_change(doc["_id"])
+                    self._seen[doc["_id"]] = stamp
+            except PyMongoError as e:
+                print(f"Polling for dataset changes failed: {e}")
+            self._stop_event.wait(self.poll_seconds)
+
+
+def start_listener(db, use_change_stream=True, poll_seconds=DEFAULT_POLL_SECONDS):
+    """Start this process's listener once; later calls return the running one."""
+    global _listener
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = ChangeListener(db, use_change_stream, poll_seconds)
+            _listener.start()
+        return _listener
@@ -0,0 +1,58 @@
+"""Cache for slowly changing Azure DevOps metadata (team iterations today).
+
+Metadata is stored serialized in `ado-metadata-cache` with a content hash.
+Within the TTL a sync reads it from Mongo without calling Azure DevOps; after
+the TTL it is fetched again and the hash tells whether anything changed.
+`content_hash` is also used to skip re-upserting documents that are unchanged.
+
+TTL in `.streamlit/secrets.toml` (0 always refetches):
+
+    [ado]
+    metadata_ttl_minutes = 60
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+import streamlit as st
+
+METADATA_CACHE_COLLECTION = "ado-metadata-cache"
+DEFAULT_METADATA_TTL_MINUTES = 60
+
+
+def content_hash(data):
+    """Stable sha256 of a JSON-like document (dates and other values via `str`)."""
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def metadata_ttl():
+    return timedelta(minutes=st.secrets.get("ado", {}).get("metadata_ttl_minutes", DEFAULT_METADATA_TTL_MINUTES))
+
+
+def get_cached_metadata(db, kind, scope, fetch, model_class, ttl=None):
+    """Return `(models, status)` for metadata of `kind` under `scope` (e.g. org, project, team).
+
+    `fetch()` calls Azure DevOps and returns a list of msrest models of `model_class`.
+    `status` is "hit" (served from the cache), "unchanged" (fetched, same content)
+    or "changed" (fetched, new content or first fetch).
+    """
+    ttl = metadata_ttl() if ttl is None else ttl
+    cache_col = db[METADATA_CACHE_COLLECTION]
+    key = content_hash({"kind": kind, "scope": list(scope)})
+    now = datetime.now(timezone.utc)
+
+    cached = cache_col.find_one({"_id": key})
+    if cached and cached["checked_at"].replace(tzinfo=timezone.utc) + ttl > now:
+        return [model_class.deserialize(d) for d in cached["items"]], "hit"
+
+    models = fetch() or []
+    items = [m.serialize() for m in models]
+    items_hash = content_hash(items)
+    status = "unchanged" if cached and cached["content_hash"] == items_hash else "changed"
+
+    update = {"$set": {"kind": kind, "scope": list(scope), "checked_at": now}}
+    if status == "changed":
+        update["$set"].update({"items": items, "content_hash": items_hash, "changed_at": now})
+    cache_col.update_one({"_id": key}, update, upsert=True)
+    return models, status
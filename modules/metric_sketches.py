@@ -0,0 +1,209 @@
+"""Mergeable lead/cycle/active time sketches of closed stories, maintained at ingest.
+
+Lead, cycle and active (closed - activated) times are whole days, so each sketch is a sparse histogram
+(days -> number of stories). Like a t-digest or KLL sketch it merges by adding
+counts, but it is exact and only grows with the number of distinct day values.
+
+`metric-sketches` holds one document per dataset and iteration path plus one
+for the whole dataset (`iteration_path` "*"), each with its 50/85/95th
+percentiles precomputed. Every stored work item remembers what it contributed
+(`sketch` on the work item, swapped atomically when the item is stored), so
+re-ingesting an item only moves counts when its iteration, closed date or
+iteration start changed; nothing is rescanned.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import pandas as pd
+from pymongo import ReturnDocument
+
+from modules.metrics import VALID_TYPES
+
+SKETCHES_COLLECTION = "metric-sketches"
+ALL_ITERATIONS = "*"
+SKETCH_METRICS = ("lead", "cycle", "active")
+PERCENTILES = (50, 85, 95)
+
+
+def _sketch_id(ds, iteration_path):
+    return f"{ds}|{iteration_path}"
+
+
+def _timestamp(value):
+    if value is None or value == "":
+        return None
+    ts = pd.Timestamp(value)
+    if pd.isna(ts):
+        return None
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts
+
+
+def iteration_start_dates(db, ds):
+    """Start date per iteration path of the dataset (any team's copy; paths are project-wide)."""
+    starts = {}
+    for doc in db["ado-iterations"].find({"dataset_id": ds}, {"_id": 0, "path": 1, "startDate": 1}):
+        start = _timestamp(doc.get("startDate"))
+        if doc.get("path") and start is not None:
+            starts[doc["path"]] = start
+    return starts
+
+
+def contribution(doc, iteration_starts):
+    """What a sanitized work item adds to the sketches: `{"iteration", "lead", "cycle", "active"}` or None.
+
+    Only closed stories count, and only in an iteration with a known start, as on the dashboard.
+    Negative durations (closed before the iteration started) are left out of that metric.
+    """
+    if doc.get("System_WorkItemType") not in VALID_TYPES:
+        return None
+    path = doc.get("System_IterationPath")
+    created = _timestamp(doc.get("System_CreatedDate"))
+    closed = _timestamp(doc.get("Microsoft_VSTS_Common_ClosedDate"))
+    start = iteration_starts.get(path)
+    if created is None or closed is None or start is None:
+        return None
+
+    activated = _timestamp(doc.get("Microsoft_VSTS_Common_ActivatedDate"))
+    durations = {
+        "lead": (closed - created).days,
+        "cycle": (closed - start).days,
+        "active": (closed - activated).days if activated is not None else None,
+    }
+    return {"iteration": path, **{k: v if v is not None and v >= 0 else None for k, v in durations.items()}}
+
+
+# ---------------------------------------------
+# INGEST
+# ---------------------------------------------
+def _add(increments, item_contribution, sign):
+    if not item_contribution:
+        return
+    for path in (item_contribution["iteration"], ALL_ITERATIONS):
+        for metric in SKETCH_METRICS:
+            days = item_contribution.get(metric)
+            if days is not None:
+                increments[path][f"{metric}.{days}"] += sign
+
+
+def apply_changes(db, ds, changes):
+    """Apply `(old_contribution, new_contribution)` pairs to the dataset's sketches."""
+    increments = defaultdict(Counter)
+    for old, new in changes:
+        if old != new:
+            _add(increments, old, -1)
+            _add(increments, new, 1)
+
+    sketches_col = db[SKETCHES_COLLECTION]
+    now = datetime.now(timezone.utc)
+    touched = []
+    for path, counts in increments.items():
+        counts = {k: v for k, v in counts.items() if v}
+        if not counts:
+            continue
+        sketches_col.update_one(
+            {"_id": _sketch_id(ds, path)},
+            {"$inc": {**counts, "version": 1},
+             "$set": {"dataset_id": ds, "iteration_path": path, "updated_at": now}},
+            upsert=True
+        )
+        touched.append(_sketch_id(ds, path))
+
+    # Drop emptied buckets and precompute the percentiles read by the dashboard. Only
+    # when no other writer moved the sketch since it was read; that writer does it then.
+    # Concurrent deltas can leave a bucket below zero for a moment, so only zeros go.
+    for doc in sketches_col.find({"_id": {"$in": touched}}):
+        update, unset = {}, {}
+        for metric in SKETCH_METRICS:
+            counts = {k: v for k, v in (doc.get(metric) or {}).items() if v > 0}
+            unset.update({f"{metric}.{k}": "" for k, v in (doc.get(metric) or {}).items() if v == 0})
+            update[f"summary.{metric}"] = summarize(counts)
+        sketches_col.update_one({"_id": doc["_id"], "version": doc.get("version")},
+                                {"$set": update, **({"$unset": unset} if unset else {})})
+
+
+def upsert_work_items(db, ds, docs, iteration_starts):
+    """Upsert sanitized work items with their `sketch` and move the sketches by what changed.
+
+    Each item's stored `sketch` is swapped in the same write that stores it, and
+    the delta comes from the value that write replaced. A sync and a service hook
+    storing the same item, or a resumed batch, therefore never count it twice.
+    """
+    workitems_col = db["ado-workitems"]
+    changes = []
+    for doc in docs:
+        doc["sketch"] = contribution(doc, iteration_starts)
+        previous = workitems_col.find_one_and_update(
+            {"dataset_id": ds, "System_Id": doc["System_Id"]},
+            {"$set": doc},
+            projection={"_id": 0, "sketch": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        changes.append(((previous or {}).get("sketch"), doc["sketch"]))
+    apply_changes(db, ds, changes)
+
+
+# ---------------------------------------------
+# QUERIES
+# ---------------------------------------------
+def percentile(counts, q):
+    """Nearest-rank `q`th percentile of a `{days: count}` histogram; None when empty."""
+    items = sorted((int(days), count) for days, count in counts.items() if count > 0)
+    total = sum(count for _, count in items)
+    if not total:
+        return None
+    rank = max(1, math.ceil(q / 100 * total))
+    seen = 0
+    for days, count in items:
+        seen += count
+        if seen >= rank:
+            return days
+    return items[-1][0]
+
+
+def summarize(counts):
+    """Count, mean and the standard percentiles of a histogram."""
+    total = sum(counts.values())
+    summary = {"count": total, "mean": sum(int(d) * c for d, c in counts.items()) / total if total else None}
+    summary.update({f"p{q}": percentile(counts, q) for q in PERCENTILES})
+    return summary
+
+
+def merge(sketches):
+    """Merge sketch documents (iterations, teams or projects) into `{metric: {days: count}}`."""
+    merged = {metric: Counter() for metric in SKETCH_METRICS}
+    for doc in sketches:
+        for metric in SKETCH_METRICS:
+            merged[metric].update({k: v for k, v in (doc.get(metric) or {}).items() if v > 0})
+    return merged
+
+
+def frame_summary(workitems_df):
+    """The same summary from a loaded stories frame, for views the per-iteration sketches cannot answer."""
+    closed = workitems_df[workitems_df["Microsoft_VSTS_Common_ClosedDate"].notna()]
+    durations = {"lead": closed["LeadTimeDays"], "cycle": closed["CycleTimeDays"]}
+    if "Microsoft_VSTS_Common_ActivatedDate" in closed.columns:
+        durations["active"] = (closed["Microsoft_VSTS_Common_ClosedDate"]
+                               - closed["Microsoft_VSTS_Common_ActivatedDate"]).dt.days
+    summary = {}
+    for metric in SKETCH_METRICS:
+        days = durations.get(metric, pd.Series(dtype="float64")).dropna()
+        summary[metric] = summarize(Counter(int(d) for d in days[days >= 0]))
+    return summary
+
+
+def dataset_summary(db, ds):
+    """Precomputed summary of the whole dataset; one document read."""
+    doc = db[SKETCHES_COLLECTION].find_one({"_id": _sketch_id(ds, ALL_ITERATIONS)}, {"summary": 1})
+    return (doc or {}).get("summary")
+
+
+def iterations_summary(db, ds, iteration_paths):
+    """Summary over the given iterations (e.g. a team's), merged from their sketches."""
+    sketches = db[SKETCHES_COLLECTION].find(
+        {"_id": {"$in": [_sketch_id(ds, path) for path in iteration_paths]}},
+        {metric: 1 for metric in SKETCH_METRICS}
+    )
+    merged = merge(sketches)
+    return {metric: summarize(counts) for metric, counts in merged.items()}
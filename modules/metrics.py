@@ -0,0 +1,462 @@
+import pandas as pd
+from datetime import timedelta
+
+# Functions taking `rollup` also count archived stories: it is the merged roll-up
+# of the shown iterations from `modules.archive.load_rollup` (None when nothing is archived)
+
+# Work item types counted as stories on the dashboard
+VALID_TYPES = ["User Story", "PBI", "Product Backlog Item"]
+
+# Projections used when loading dashboard data from MongoDB
+ITERATION_PROJECTION = {"_id": 0, "path": 1, "startDate": 1, "finishDate": 1}
+WORKITEM_PROJECTION = {
+    "_id": 0,
+    "System_CreatedDate": 1,
+    "Microsoft_VSTS_Common_ClosedDate": 1,
+    "System_IterationPath": 1,
+    "System_WorkItemType": 1,
+    "Microsoft_VSTS_Scheduling_Effort": 1,
+    "Microsoft_VSTS_Common_ActivatedDate": 1
+}
+
+
+# Canonical work item columns; optional ones are kept only when some document has them
+WORKITEM_DATE_COLUMNS = ["System_CreatedDate", "Microsoft_VSTS_Common_ActivatedDate", "Microsoft_VSTS_Common_ClosedDate"]
+OPTIONAL_WORKITEM_COLUMNS = ["Microsoft_VSTS_Common_ActivatedDate", "Microsoft_VSTS_Scheduling_Effort"]
+DEFAULT_FRAME_CHUNK_SIZE = 50_000
+DATETIME_DTYPE = "datetime64[us, UTC]"
+
+
+# ---------------------------------------------
+# DATAFRAME BUILD
+# ---------------------------------------------
+def build_iterations_frame(iterations):
+    iterations_df = pd.DataFrame(iterations)
+    if iterations_df.empty:
+        return iterations_df
+    iterations_df["startDate"] = pd.to_datetime(iterations_df["startDate"], utc=True, errors="coerce")
+    iterations_df["finishDate"] = pd.to_datetime(iterations_df["finishDate"], utc=True, errors="coerce")
+    return iterations_df
+
+
+def _chunks(docs, chunk_size):
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _compact_chunk(docs, path_dtype, type_dtype, iteration_starts):
+    chunk = pd.DataFrame(docs)
+    present = set(chunk.columns)
+    for column in ["System_WorkItemType", "System_IterationPath"] + WORKITEM_DATE_COLUMNS:
+        if column not in chunk.columns:
+            chunk[column] = None
+    if "Microsoft_VSTS_Scheduling_Effort" not in chunk.columns:
+        chunk["Microsoft_VSTS_Scheduling_Effort"] = float("nan")
+
+    chunk = chunk[chunk["System_WorkItemType"].isin(VALID_TYPES)]
+    frame = pd.DataFrame({
+        "System_WorkItemType": chunk["System_WorkItemType"].astype(type_dtype),
+        "System_IterationPath": chunk["System_IterationPath"].astype(path_dtype),
+        "Microsoft_VSTS_Scheduling_Effort": pd.to_numeric(
+            chunk["Microsoft_VSTS_Scheduling_Effort"], errors="coerce"
+        ).astype("float32"),
+    })
+    for column in WORKITEM_DATE_COLUMNS:
+        frame[column] = pd.to_datetime(chunk[column], utc=True, errors="coerce").astype(DATETIME_DTYPE)
+
+    # Iteration start via the path's category code (-1, an unknown path, gives NaT)
+    frame["IterationStartDate"] = iteration_starts.take(frame["System_IterationPath"].cat.codes.to_numpy(),
+                                                        allow_fill=True, fill_value=pd.NaT)
+    frame = frame.dropna(subset=["System_CreatedDate", "IterationStartDate"])
+    return frame.reset_index(drop=True), present
+
+
+def load_workitems_frame(workitems, iterations_df, chunk_size=DEFAULT_FRAME_CHUNK_SIZE):
+    """Build the compact stories frame from a Mongo cursor (or any iterable of documents) in chunks.
+
+    Only `chunk_size` raw documents are held at a time. Paths and types are
+    categoricals, effort is float32 and the three dates are the only datetime
+    columns besides `IterationStartDate`. Items without a created date or a
+    known iteration start are dropped.
+    """
+    if iterations_df.empty:
+        iterations_df = pd.DataFrame({"path": pd.Series(dtype=object),
+                                      "startDate": pd.Series(dtype=DATETIME_DTYPE)})
+    starts = iterations_df.drop_duplicates("path", keep="last").dropna(subset=["path"])
+    path_dtype = pd.CategoricalDtype(starts["path"].tolist())
+    type_dtype = pd.CategoricalDtype(VALID_TYPES)
+    iteration_starts = pd.DatetimeIndex(starts["startDate"]).astype(DATETIME_DTYPE)
+
+    frames, present = [], set()
+    for docs in _chunks(workitems, chunk_size):
+        frame, chunk_columns = _compact_chunk(docs, path_dtype, type_dtype, iteration_starts)
+        present |= chunk_columns
+        if not frame.empty:
+            frames.append(frame)
+
+    if frames:
+        workitems_df = pd.concat(frames, ignore_index=True)
+    else:
+        workitems_df, _ = _compact_chunk([], path_dtype, type_dtype, iteration_starts)
+    missing = [c for c in OPTIONAL_WORKITEM_COLUMNS if c not in present]
+    return workitems_df.drop(columns=missing)
+
+
+def build_frames(iterations, workitems):
+    """Convert Mongo documents to DataFrames, keep stories only and normalize dates."""
+    iterations_df = build_iterations_frame(iterations)
+    return iterations_df, load_workitems_frame(workitems, iterations_df)
+
+
+def frame_memory_mb(df):
+    """Steady-state size of a DataFrame, including its index and string contents."""
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+# ---------------------------------------------
+# LEAD TIME AND CYCLE TIME
+# ---------------------------------------------
+def add_lead_cycle_times(workitems_df, now):
+    """Add LeadTimeDays and CycleTimeDays columns; open items are measured up to `now`."""
+    closed = workitems_df["Microsoft_VSTS_Common_ClosedDate"].fillna(pd.Timestamp(now))
+    workitems_df["LeadTimeDays"] = (closed - workitems_df["System_CreatedDate"]).dt.days.astype("int32")
+    workitems_df["CycleTimeDays"] = (closed - workitems_df["IterationStartDate"]).dt.days.astype("int32")
+    return workitems_df
+
+
+def _mean_with_rollup(values, rollup_sum, rollup_count):
+    count = len(values) + rollup_count
+    if not count:
+        return None
+    return (values.astype("int64").sum() + rollup_sum) / count
+
+
+def lead_cycle_summary(iterations_df, workitems_df, rollup=None):
+    """Overall and last-30-days lead/cycle time averages relative to the latest iteration."""
+    latest_iteration = iterations_df.sort_values(by="finishDate", ascending=False).iloc[0]
+    latest_finish = latest_iteration["finishDate"]
+    cutoff_date = latest_finish - timedelta(days=30)
+
+    recent_items = workitems_df[workitems_df["System_CreatedDate"] > cutoff_date]
+
+    if rollup is None:
+        return {
+            "latest_iteration": latest_iteration,
+            "overall_lead_time": workitems_df["LeadTimeDays"].mean(),
+            "recent_lead_time": recent_items["LeadTimeDays"].mean() if not recent_items.empty else None,
+            "overall_cycle_time": workitems_df["CycleTimeDays"].mean(),
+            "recent_cycle_time": recent_items["CycleTimeDays"].mean() if not recent_items.empty else None,
+        }
+
+    # Archived stories are kept per created day: a day counts when part of it is after the cutoff
+    recent_days = rollup["created_n"].index > cutoff_date - timedelta(days=1)
+    recent_count = int(rollup["created_n"][recent_days].sum())
+    recent_lead = rollup["created_lead"].reindex(rollup["created_n"].index[recent_days]).sum()
+    recent_cycle = rollup["created_cycle"].reindex(rollup["created_n"].index[recent_days]).sum()
+    return {
+        "latest_iteration": latest_iteration,
+        "overall_lead_time": _mean_with_rollup(workitems_df["LeadTimeDays"],
+                                               sum(d * n for d, n in rollup["lead"].items()), rollup["count"]),
+        "recent_lead_time": _mean_with_rollup(recent_items["LeadTimeDays"], recent_lead, recent_count),
+        "overall_cycle_time": _mean_with_rollup(workitems_df["CycleTimeDays"],
+                                                sum(d * n for d, n in rollup["cycle"].items()), rollup["count"]),
+        "recent_cycle_time": _mean_with_rollup(recent_items["CycleTimeDays"], recent_cycle, recent_count),
+    }
+
+
+def duration_stats(days, histogram=None):
+    """`(min, max, mean)` of the non-negative durations, archived ones (a `{days: count}` histogram) included."""
+    days = days.dropna()
+    days = days[days >= 0]
+    archived = {d: n for d, n in (histogram or {}).items() if d >= 0}
+    count = len(days) + sum(archived.values())
+    if not count:
+        return None
+    values = list(archived) + ([days.min(), days.max()] if not days.empty else [])
+    return min(values), max(values), (days.astype("int64").sum() + sum(d * n for d, n in archived.items())) / count
+
+
+# ---------------------------------------------
+# BURN-UP
+# ---------------------------------------------
+def burnup_counts(iterations_df, workitems_df, rollup=None):
+    """Cumulative total and completed story counts per iteration finish date."""
+    archived = (rollup or {}).get("paths", {})
+    burnup_data = []
+    for _, iteration in iterations_df.iterrows():
+        path = iteration["path"]
+        finish_date = iteration["finishDate"]
+        total_items = workitems_df[workitems_df["System_IterationPath"] == path]
+        archived_count = archived.get(path, {}).get("count", 0)
+        total_count = len(total_items) + archived_count
+        completed_count = len(total_items[total_items["Microsoft_VSTS_Common_ClosedDate"].notna()]) + archived_count
+
+        burnup_data.append({
+            "IterationPath": path,
+            "FinishDate": finish_date,
+            "TotalStories": total_count,
+            "CompletedStories": completed_count
+        })
+
+    burnup_df = pd.DataFrame(burnup_data).sort_values("FinishDate")
+
+    burnup_df["CumulativeTotal"] = burnup_df["TotalStories"].cumsum()
+    burnup_df["CumulativeCompleted"] = burnup_df["CompletedStories"].cumsum()
+    return burnup_df
+
+
+def burnup_effort(iterations_df, workitems_df, rollup=None):
+    """Cumulative total and completed effort per iteration; None without an effort field."""
+    if "Microsoft_VSTS_Scheduling_Effort" not in workitems_df.columns:
+        return None
+    archived = (rollup or {}).get("paths", {})
+
+    # Effort is stored as float32; sum in float64
+    effort = workitems_df["Microsoft_VSTS_Scheduling_Effort"].astype("float64")
+    closed = workitems_df["Microsoft_VSTS_Common_ClosedDate"].notna()
+
+    burnup_effort_data = []
+    for _, iteration in iterations_df.iterrows():
+        path = iteration["path"]
+        finish_date = iteration["finishDate"]
+        in_iteration = workitems_df["System_IterationPath"] == path
+
+        archived_effort = archived.get(path, {}).get("effort_sum", 0)
+        total_effort = effort[in_iteration].sum(skipna=True) + archived_effort
+        completed_effort = effort[in_iteration & closed].sum(skipna=True) + archived_effort
+
+        burnup_effort_data.append({
+            "IterationPath": path,
+            "FinishDate": finish_date,
+            "TotalEffort": total_effort,
+            "CompletedEffort": completed_effort
+        })
+
+    burnup_effort_df = pd.DataFrame(burnup_effort_data).sort_values("FinishDate")
+
+    burnup_effort_df["CumulativeTotal"] = burnup_effort_df["TotalEffort"].cumsum()
+    burnup_effort_df["CumulativeCompleted"] = burnup_effort_df["CompletedEffort"].cumsum()
+    return burnup_effort_df
+
+
+# ---------------------------------------------
+# CUMULATIVE FLOW DIAGRAMS
+# ---------------------------------------------
+def _activated_dates(workitems_df):
+    """Activated dates, all NaT when no work item has the field."""
+    if "Microsoft_VSTS_Common_ActivatedDate" in workitems_df.columns:
+        return workitems_df["Microsoft_VSTS_Common_ActivatedDate"]
+    return pd.Series(pd.NaT, index=workitems_df.index, dtype=DATETIME_DTYPE)
+
+
+def _running_total(days, weights, date_range, archived=None):
+    """Cumulative sum of `weights` by day (NaT days never count), evaluated on each day of `date_range`."""
+    per_day = weights.groupby(days).sum()
+    if archived is not None and not archived.empty:
+        per_day = per_day.add(archived, fill_value=0)
+    return per_day.sort_index().cumsum().reindex(date_range, method="ffill").fillna(0).to_numpy()
+
+
+def _state_totals(workitems_df, weights, date_range, rollup, suffix=""):
+    """Done and In Progress totals per day from the days stories enter and leave each state.
+
+    A story is done from its closed day and in progress from its activated day
+    until it is done, i.e. until the later of its activated and closed days.
+    """
+    activated_norm = _activated_dates(workitems_df).dt.normalize()
+    closed_norm = workitems_df["Microsoft_VSTS_Common_ClosedDate"].dt.normalize()
+    leaves_norm = activated_norm.where(activated_norm > closed_norm, closed_norm)
+
+    done = _running_total(closed_norm, weights, date_range, rollup and rollup["done" + suffix])
+    started = _running_total(activated_norm, weights, date_range, rollup and rollup["progress" + suffix])
+    left = _running_total(leaves_norm.where(activated_norm.notna()), weights, date_range)
+    return done, started - left
+
+
+def _cfd_range(created_norm, last_dates, rollup, rollup_keys):
+    """Daily range from the first created day to the day after the latest of `last_dates`, archived days included."""
+    starts = [created_norm.min()]
+    ends = [dates.max() for dates in last_dates]
+    if rollup:
+        starts.append(rollup["created_n"].index.min() if not rollup["created_n"].empty else pd.NaT)
+        ends += [rollup[key].index.max() for key in rollup_keys if not rollup[key].empty]
+    min_date = min(d for d in starts if pd.notna(d))
+    max_date = max(d for d in ends if pd.notna(d))
+    return pd.date_range(start=min_date, end=max_date + pd.Timedelta(days=1), freq="D")
+
+
+def cfd_counts(workitems_df, rollup=None):
+    """Daily Done / In Progress / To Do story counts; None without an activated date field."""
+    if "Microsoft_VSTS_Common_ActivatedDate" not in workitems_df.columns:
+        return None
+
+    # Normalize the relevant dates to calendar dates for daily buckets (preserves tz)
+    created_norm = workitems_df["System_CreatedDate"].dt.normalize()
+    activated_norm = workitems_df["Microsoft_VSTS_Common_ActivatedDate"].dt.normalize()
+    closed_norm = workitems_df["Microsoft_VSTS_Common_ClosedDate"].dt.normalize()
+
+    # From the first created day to the day after the latest activated/closed day
+    date_range = _cfd_range(created_norm, [activated_norm, closed_norm], rollup, ["done", "progress"])
+
+    # Running totals of the days stories change state instead of re-scanning every story per day
+    ones = pd.Series(1, index=workitems_df.index)
+    done, in_progress = _state_totals(workitems_df, ones, date_range, rollup)
+    total = len(workitems_df) + (rollup["count"] if rollup else 0)
+
+    return pd.DataFrame({
+        "Date": date_range,
+        "Done": done.astype("int64"),
+        "In Progress": in_progress.astype("int64"),
+        "To Do": (total - done - in_progress).astype("int64"),
+    })
+
+
+def cfd_effort(workitems_df, rollup=None):
+    """Daily Done / In Progress / To Do effort sums; None without an effort field."""
+    effort_field = "Microsoft_VSTS_Scheduling_Effort"
+    if effort_field not in workitems_df.columns:
+        return None
+
+    created_norm = workitems_df["System_CreatedDate"].dt.normalize()
+    activated_norm = _activated_dates(workitems_df).dt.normalize()
+    closed_norm = workitems_df["Microsoft_VSTS_Common_ClosedDate"].dt.normalize()
+
+    # From the first created day to the day after the latest created/activated/closed day
+    date_range = _cfd_range(created_norm, [created_norm, activated_norm, closed_norm], rollup,
+                            ["created_n", "done", "progress"])
+
+    # For numeric operations ensure effort is numeric (NaN -> 0 for sums)
+    effort_series = workitems_df[effort_field].astype("float64").fillna(0)
+    done, in_progress = _state_totals(workitems_df, effort_series, date_range, rollup, suffix="_effort")
+    total = effort_series.sum() + (rollup["effort_sum"] if rollup else 0)
+    todo = total - done - in_progress
+    # Guard against tiny negative float rounding
+    todo[(todo < 0) & (todo > -1e-8)] = 0.0
+
+    return pd.DataFrame({"Date": date_range, "Done": done, "In Progress": in_progress, "To Do": todo})
+
+
+# ---------------------------------------------
+# ESTIMATE ACCURACY
+# ---------------------------------------------
+def estimate_accuracy(workitems_df, latest_iteration, rollup=None):
+    """Mean active days per story point, overall and for the latest iteration."""
+    if "Microsoft_VSTS_Scheduling_Effort" not in workitems_df.columns:
+        return None, None
+
+    # Active days per effort point of closed items with a non-zero effort
+    effort = workitems_df["Microsoft_VSTS_Scheduling_Effort"].astype("float64")
+    active_days = (workitems_df["Microsoft_VSTS_Common_ClosedDate"] - _activated_dates(workitems_df)).dt.days
+    estimates = (active_days / effort).where(effort != 0)
+
+    valid_estimates = estimates.dropna()
+    last_iter_estimates = estimates[workitems_df["System_IterationPath"] == latest_iteration["path"]].dropna()
+    if rollup is None:
+        active_time_indicator = valid_estimates.mean() if not valid_estimates.empty else None
+        active_time_indicator_last_sprint = last_iter_estimates.mean() if not last_iter_estimates.empty else None
+        return active_time_indicator, active_time_indicator_last_sprint
+
+    def mean(values, archived):
+        count = len(values) + archived.get("estimate_count", 0)
+        return (values.sum() + archived.get("estimate_sum", 0)) / count if count else None
+
+    active_time_indicator = mean(valid_estimates, rollup)
+    active_time_indicator_last_sprint = mean(last_iter_estimates, rollup["paths"].get(latest_iteration["path"], {}))
+
+    return active_time_indicator, active_time_indicator_last_sprint
+
+
+# ---------------------------------------------
+# AI METRICS SUMMARY
+# ---------------------------------------------
+def build_metrics_summary(lead_cycle, active_time_indicator, active_time_indicator_last_sprint,
+                          num_iterations, cfd_df, team_size, capacity_per_person, forecast=None):
+    """Assemble the metrics dict sent to the AI analysis (effort CFD preferred for `cfd_df`).
+
+    `forecast` is the result of `modules.forecast.delivery_forecast`, when there is one.
+    """
+    metrics_summary = {
+        "Overall lead time": lead_cycle["overall_lead_time"],
+        "Recent lead time (last 30 days)": lead_cycle["recent_lead_time"],
+        "Overall cycle time": lead_cycle["overall_cycle_time"],
+        "Recent cycle time (last 30 days)": lead_cycle["recent_cycle_time"],
+        "Overall active time indicator": active_time_indicator,
+        "Recent active time indicator": active_time_indicator_last_sprint,
+        "Last iteration": lead_cycle["latest_iteration"]["path"],
+        "Iteration count": num_iterations,
+        # "Workitem count (total number of User Stories)": len(workitems_df),
+        "Team size": team_size,
+        "Capacity per person per iteration": capacity_per_person,
+    }
+
+    # Include effort-based CFD metrics if available
+    if cfd_df is not None and not cfd_df.empty:
+        last_row = cfd_df.iloc[-1]
+        total_done_effort = last_row["Done"]
+        total_in_progress_effort = last_row["In Progress"]
+        total_todo_effort = last_row["To Do"]
+
+        avg_per_iteration_throughput = total_done_effort / num_iterations if num_iterations else 0
+
+        metrics_summary.update({
+            "Total effort done": total_done_effort,
+            "Total in progress effort": total_in_progress_effort,
+            "Total effort to be done": total_todo_effort,
+            "Average throughput (effort done per Iteration)": avg_per_iteration_throughput
+        })
+
+    if forecast is not None:
+        levels = " / ".join(f"{level}%" for level in forecast["completion_dates"])
+        dates = " / ".join(f"{d:%Y-%m-%d}" if d is not None else "beyond horizon"
+                           for d in forecast["completion_dates"].values())
+        items = " / ".join(str(n) for n in forecast["items_by_target"].values())
+        metrics_summary.update({
+            "Forecast: remaining items": forecast["remaining_items"],
+            f"Forecast: completion date of remaining items ({levels} confidence)": dates,
+            f"Forecast: items done by {forecast['target_date']:%Y-%m-%d} ({levels} confidence)": items,
+            "Forecast: simulations": f"{forecast['simulations']} Monte Carlo runs on {forecast['mode']} throughput",
+        })
+
+    return metrics_summary
+
+
+def compute_dashboard_metrics(iterations, workitems, now, forecast_options=None, rollup=None):
+    """Run the whole home.py metrics pipeline without rendering; None when there are no stories.
+
+    `forecast_options` are keyword arguments for `delivery_forecast`; `rollup`
+    covers archived stories of `iterations`.
+    """
+    from modules.archive import with_rollup_columns
+    from modules.forecast import delivery_forecast
+
+    iterations_df, workitems_df = build_frames(iterations, workitems)
+    if (workitems_df.empty and not rollup) or iterations_df.empty:
+        return None
+
+    workitems_df = with_rollup_columns(add_lead_cycle_times(workitems_df, now), rollup)
+    lead_cycle = lead_cycle_summary(iterations_df, workitems_df, rollup)
+    cfd_counts_df = cfd_counts(workitems_df, rollup)
+    cfd_effort_df = cfd_effort(workitems_df, rollup)
+    active_time_indicator, active_time_indicator_last_sprint = estimate_accuracy(
+        workitems_df, lead_cycle["latest_iteration"], rollup
+    )
+
+    return {
+        "iterations_df": iterations_df,
+        "workitems_df": workitems_df,
+        "archived_stories": rollup["count"] if rollup else 0,
+        "lead_cycle": lead_cycle,
+        "burnup_df": burnup_counts(iterations_df, workitems_df, rollup),
+        "burnup_effort_df": burnup_effort(iterations_df, workitems_df, rollup),
+        "cfd_df": cfd_counts_df,
+        "cfd_effort_df": cfd_effort_df,
+        "active_time_indicator": active_time_indicator,
+        "active_time_indicator_last_sprint": active_time_indicator_last_sprint,
+        "forecast": delivery_forecast(iterations_df, workitems_df, now, **(forecast_options or {})),
+    }
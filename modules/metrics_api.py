@@ -0,0 +1,291 @@
+"""Read-only HTTP API serving the dashboard metrics as JSON, without Streamlit.
+
+Run it next to the app (from the repository root):
+
+    python -m modules.metrics_api --port 8788
+
+Create a token under "API tokens" in your user settings and send it as a
+bearer token:
+
+    curl -H "Authorization: Bearer iop_..." http://localhost:8788/api/v1/metrics
+
+`GET /api/v1/metrics` returns the metrics of the token owner's project and
+team, computed by the same functions as the dashboard. `?team=<name>` selects
+another team of the same project and `?team=*` the whole project.
+
+Responses carry an `ETag` derived from the user's data version (bumped by
+every sync and service-hook event), the team and the day, and a
+`Cache-Control: private, max-age=<api.max_age_seconds>` header. A request with
+a matching `If-None-Match` gets `304 Not Modified` without the metrics being
+recomputed or even read from MongoDB. Serialized responses are kept in memory
+until the change listener (`modules.live_updates`, configured by `[live]`)
+sees their dataset change.
+
+Settings in `.streamlit/secrets.toml` (all optional):
+
+    [api]
+    max_age_seconds = 60
+    cache_entries = 128
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from modules.api_tokens import authenticate
+from modules.archive import load_rollup
+from modules.datasets import dataset_subscribers, user_team
+from modules.forecast import forecast_settings
+from modules.live_updates import ALL_DATASETS, DEFAULT_POLL_SECONDS, on_invalidate, start_listener
+from modules.metric_sketches import iterations_summary
+from modules.metrics import ITERATION_PROJECTION, WORKITEM_PROJECTION, compute_dashboard_metrics
+
+API_VERSION = "1"
+METRICS_PATH = "/api/v1/metrics"
+ALL_TEAMS = "*"
+DEFAULT_PORT = 8788
+DEFAULT_MAX_AGE_SECONDS = 60
+DEFAULT_CACHE_ENTRIES = 128
+
+
+# ---------------------------------------------
+# JSON CONVERSION
+# ---------------------------------------------
+def _json_value(value):
+    """Plain JSON value for a metrics scalar (NumPy numbers, Timestamps, NaN/NaT -> null)."""
+    if value is None:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return None if pd.isna(value) else value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): _json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_value(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _records(df):
+    if df is None:
+        return None
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _iterations_query(ds, team):
+    query = {"dataset_id": ds}
+    if team != ALL_TEAMS:
+        query["teams"] = team
+    return query
+
+
+def _project_iterations(iterations):
+    """Iterations of every team, each path once (paths are project-wide)."""
+    return list({doc.get("path"): doc for doc in iterations}.values())
+
+
+def metrics_payload(db, ds, team, now=None):
+    """Dashboard metrics of a dataset and team as a JSON-ready dict; None when there are no stories."""
+    now = now or datetime.now(timezone.utc)
+    iterations = list(db["ado-iterations"].find(_iterations_query(ds, team), ITERATION_PROJECTION))
+    if team == ALL_TEAMS:
+        iterations = _project_iterations(iterations)
+    if not iterations:
+        return None
+    metrics = compute_dashboard_metrics(
+        iterations,
+        db["ado-workitems"].find({"dataset_id": ds}, WORKITEM_PROJECTION),
+        now,
+        forecast_settings(),
+        load_rollup(db, ds, [doc.get("path") for doc in iterations])
+    )
+    if metrics is None:
+        return None
+
+    lead_cycle = metrics["lead_cycle"]
+    latest_iteration = lead_cycle["latest_iteration"]
+    paths = metrics["iterations_df"]["path"].dropna().unique().tolist()
+    return {
+        "generated_at": now.isoformat(),
+        "iterations": len(metrics["iterations_df"]),
+        "stories": len(metrics["workitems_df"]) + metrics["archived_stories"],
+        "lead_cycle": _json_value({
+            "overall_lead_time": lead_cycle["overall_lead_time"],
+            "recent_lead_time": lead_cycle["recent_lead_time"],
+            "overall_cycle_time": lead_cycle["overall_cycle_time"],
+            "recent_cycle_time": lead_cycle["recent_cycle_time"],
+            "latest_iteration": {
+                "path": latest_iteration["path"],
+                "startDate": latest_iteration["startDate"],
+                "finishDate": latest_iteration["finishDate"],
+            },
+        }),
+        "closed_story_percentiles": _json_value(iterations_summary(db, ds, paths)),
+        "active_time_indicator": _json_value(metrics["active_time_indicator"]),
+        "active_time_indicator_last_sprint": _json_value(metrics["active_time_indicator_last_sprint"]),
+        "burnup": _records(metrics["burnup_df"]),
+        "burnup_effort": _records(metrics["burnup_effort_df"]),
+        "cfd": _records(metrics["cfd_df"]),
+        "cfd_effort": _records(metrics["cfd_effort_df"]),
+        "forecast": _json_value(metrics["forecast"]),
+    }
+
+
+def metrics_etag(user_doc, ds, team, today):
+    """Strong validator of a response: changes with the data version, the team and the day."""
+    key = "|".join([API_VERSION, user_doc["email"], ds, team, str(user_doc.get("data_version", 0)), today])
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class PayloadCache:
+    """Small thread-safe LRU of serialized responses keyed by ETag."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # etag -> (dataset id, body)
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                return None
+            self._entries.move_to_end(etag)
+            return entry[1]
+
+    def put(self, etag, body, ds):
+        with self._lock:
+            self._entries[etag] = (ds, body)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, ds):
+        """Drop the responses of a changed dataset (`ALL_DATASETS`: all of them)."""
+        with self._lock:
+            for etag in [e for e, (entry_ds, _) in self._entries.items() if ds in (entry_ds, ALL_DATASETS)]:
+                del self._entries[etag]
+
+
+# ---------------------------------------------
+# HTTP SERVER
+# ---------------------------------------------
+class MetricsApiHandler(BaseHTTPRequestHandler):
+    db = None
+    cache = None
+    max_age = DEFAULT_MAX_AGE_SECONDS
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304 and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status, message, headers=None):
+        self._send(status, json.dumps({"error": message}).encode(), headers)
+
+    def _token(self):
+        auth = self.headers.get("Authorization", "")
+        return auth[7:].strip() if auth.startswith("Bearer ") else None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != METRICS_PATH:
+            return self._error(404, "not found")
+
+        user_doc = authenticate(self.db["users"], self._token())
+        if not user_doc:
+            return self._error(401, "invalid or missing API token", {"WWW-Authenticate": "Bearer"})
+
+        ds = user_doc.get("dataset_id")
+        if not ds or user_doc["email"] not in dataset_subscribers(self.db, ds):
+            return self._error(403, "no project data; configure your project and refresh the dashboard first")
+
+        team = (parse_qs(url.query).get("team") or [user_team(user_doc)])[0]
+        now = datetime.now(timezone.utc)
+        etag = metrics_etag(user_doc, ds, team, now.date().isoformat())
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={self.max_age}", "Vary": "Authorization"}
+        if _etag_matches(self.headers.get("If-None-Match"), etag):
+            return self._send(304, headers=headers)
+
+        body = self.cache.get(etag)
+        if body is None:
+            try:
+                payload = metrics_payload(self.db, ds, team, now)
+            except Exception as e:
+                print(f"Metrics API failed for {user_doc['email']}: {e}")
+                return self._error(500, "metrics computation failed")
+            if payload is None:
+                return self._error(404, f"no stories or iterations for team '{team}'")
+            payload.update({"dataset": ds, "team": team, "data_version": user_doc.get("data_version", 0)})
+            body = json.dumps(payload).encode()
+            self.cache.put(etag, body, ds)
+        self._send(200, body, headers)
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(db, host="0.0.0.0", port=DEFAULT_PORT, max_age=DEFAULT_MAX_AGE_SECONDS,
+                cache_entries=DEFAULT_CACHE_ENTRIES):
+    cache = PayloadCache(cache_entries)
+    on_invalidate(cache.evict)
+    handler = type("BoundMetricsApiHandler", (MetricsApiHandler,), {"db": db, "cache": cache, "max_age": max_age})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    import streamlit as st
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Serve dashboard metrics as JSON for API token holders.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    db = MongoClient(st.secrets["mongo"]["uri"])[st.secrets["mongo"].get("db_name", "insightops")]
+    settings = st.secrets.get("api", {})
+    server = make_server(
+        db, args.host, args.port,
+        int(settings.get("max_age_seconds", DEFAULT_MAX_AGE_SECONDS)),
+        int(settings.get("cache_entries", DEFAULT_CACHE_ENTRIES)),
+    )
+    live_settings = st.secrets.get("live", {})
+    if live_settings.get("enabled", True):
+        start_listener(db, live_settings.get("change_stream", True),
+                       live_settings.get("poll_seconds", DEFAULT_POLL_SECONDS))
+    print(f"Serving metrics on http://{args.host}:{args.port}{METRICS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
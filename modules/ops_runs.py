@@ -0,0 +1,99 @@
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+
+OPS_RUNS_COLLECTION = "ops-runs"
+
+# The run in progress on each thread; ADO clients are shared between runs
+_active = threading.local()
+
+
+def record_response(response, *args, **kwargs):
+    """requests response hook installed once on every ADO client (see `modules/ado_client.py`).
+
+    Counts the response for the run on the calling thread, so parallel runs on
+    the same cached client keep separate counters.
+    """
+    run = getattr(_active, "run", None)
+    if run is not None:
+        run.response_hook(response)
+
+
+class SyncRun:
+    """Counters for one refresh run, written to the `ops-runs` collection by `finish()`.
+
+    ADO responses on the creating thread count for the run until it finishes.
+    """
+
+    def __init__(self, kind, user_doc):
+        self.kind = kind
+        self.ops_user = user_doc.get("email")
+        self.organization_url = user_doc.get("organization_url", "")
+        self.project_name = user_doc.get("project_name", "")
+        self.team_name = user_doc.get("team_name", "")
+        self.items = 0
+        self.batches = 0
+        self.ado_calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.bytes = 0
+        self.errors = []
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._previous = getattr(_active, "run", None)
+        _active.run = self
+
+    def response_hook(self, response, *args, **kwargs):
+        """Count one ADO response, its size and the retries behind it."""
+        self.ado_calls += 1
+        length = response.headers.get("Content-Length")
+        self.bytes += int(length) if length else len(response.content)
+
+        # urllib3 keeps the retry history of the final response
+        retries = getattr(getattr(response, "raw", None), "retries", None)
+        history = getattr(retries, "history", None) or ()
+        self.retries += len(history)
+        self.throttled += sum(1 for h in history if h.status == 429)
+        if response.status_code == 429:
+            self.throttled += 1
+
+    def add_error(self, error):
+        self.errors.append({
+            "type": type(error).__name__,
+            "message": str(error),
+            "traceback": traceback.format_exc()
+        })
+
+    def to_document(self, status):
+        duration = time.perf_counter() - self._start
+        return {
+            "kind": self.kind,
+            "ops_user": self.ops_user,
+            "organization_url": self.organization_url,
+            "project_name": self.project_name,
+            "team_name": self.team_name,
+            "started_at": self.started_at,
+            "finished_at": datetime.now(timezone.utc),
+            "duration_seconds": duration,
+            "items": self.items,
+            "batches": self.batches,
+            "ado_calls": self.ado_calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "bytes": self.bytes,
+            "items_per_second": self.items / duration if duration > 0 else None,
+            "status": status,
+            "errors": self.errors
+        }
+
+    def finish(self, db):
+        """Stop counting responses and store the run record; never raises."""
+        if getattr(_active, "run", None) is self:
+            _active.run = self._previous
+
+        status = "failed" if self.errors else "success"
+        try:
+            db[OPS_RUNS_COLLECTION].insert_one(self.to_document(status))
+        except Exception as e:
+            print(f"Failed to record sync run: {e}")
@@ -0,0 +1,24 @@
+from functools import lru_cache
+
+import streamlit as st
+from cryptography.fernet import Fernet
+
+
+@lru_cache(maxsize=None)
+def _fernet(fernet_key):
+    return Fernet(fernet_key.encode())
+
+
+@lru_cache(maxsize=256)
+def _decrypt(fernet_key, encrypted_pat):
+    try:
+        return _fernet(fernet_key).decrypt(encrypted_pat.encode()).decode()
+    except Exception:
+        return ""
+
+
+def decrypt_pat(encrypted_pat):
+    """Decrypted PAT, or "" when it cannot be decrypted; results are memoized per token."""
+    if not encrypted_pat:
+        return ""
+    return _decrypt(st.secrets["encryption"]["fernet_key"], encrypted_pat)
@@ -0,0 +1,72 @@
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger("insightops.perf")
+
+# One trace per script run; Streamlit runs each rerun on its own script thread
+_local = threading.local()
+
+
+def start_trace(track_memory=False):
+    """Begin a new trace for the current run. Memory deltas need `track_memory` (tracemalloc)."""
+    _local.records = []
+    _local.track_memory = track_memory
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def get_trace():
+    """Return the records collected since the last `start_trace()`."""
+    return list(getattr(_local, "records", []))
+
+
+def extend_trace(records):
+    """Add records collected on another thread (e.g. a worker pool) to the current trace."""
+    if not hasattr(_local, "records"):
+        start_trace()
+    _local.records.extend(records)
+
+
+@contextmanager
+def timed(section, rows=None):
+    """Time a block and append a record to the current trace.
+
+    The yielded dict can be updated inside the block, e.g. `record["rows"] = len(df)`.
+    """
+    if not hasattr(_local, "records"):
+        start_trace()
+
+    track_memory = _local.track_memory and tracemalloc.is_tracing()
+    record = {"section": section, "rows": rows}
+    mem_before = tracemalloc.get_traced_memory()[0] if track_memory else None
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record["error"] = True
+        raise
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        if track_memory:
+            record["mem_delta_mb"] = round((tracemalloc.get_traced_memory()[0] - mem_before) / (1024 * 1024), 3)
+        _local.records.append(record)
+        logger.info(json.dumps({"event": "perf_section", **record}, default=str))
+
+
+def traced(section):
+    """Decorator form of `timed`; rows is taken from the result's length when it has one."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(section) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, "__len__"):
+                    record["rows"] = len(result)
+                return result
+        return wrapper
+    return decorator
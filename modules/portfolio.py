@@ -0,0 +1,53 @@
+"""Cross-team roll-up over a user's project/team connections (see `modules/connections.py`).
+
+Each connection is one `(dataset, team)` view of data that is already synced;
+nothing is fetched from Azure DevOps. Several views are combined into one set
+of dashboard metrics: the iterations of every team (each path of a dataset
+once) with the stories of every dataset (each dataset read once), archived
+roll-ups included.
+"""
+from itertools import chain
+
+import pandas as pd
+
+from modules.archive import load_rollups
+from modules.metrics import ITERATION_PROJECTION, WORKITEM_PROJECTION, compute_dashboard_metrics
+
+
+def views_metrics(db, views, now, forecast_options=None):
+    """Dashboard metrics over `(dataset, team)` views; None when they have no stories or iterations."""
+    iterations = {}
+    for ds, team in views:
+        for doc in db["ado-iterations"].find({"dataset_id": ds, "teams": team}, ITERATION_PROJECTION):
+            iterations[(ds, doc.get("path"))] = doc
+    if not iterations:
+        return None
+
+    datasets = list(dict.fromkeys(ds for ds, _ in views))
+    workitems = chain.from_iterable(
+        db["ado-workitems"].find({"dataset_id": ds}, WORKITEM_PROJECTION) for ds in datasets
+    )
+    rollup = load_rollups(db, [(ds, [path for d, path in iterations if d == ds]) for ds in datasets])
+    return compute_dashboard_metrics(list(iterations.values()), workitems, now, forecast_options, rollup)
+
+
+def _days(value):
+    return None if value is None or pd.isna(value) else round(float(value), 2)
+
+
+def summary_row(metrics):
+    """One table row of headline numbers from `views_metrics`."""
+    lead_cycle = metrics["lead_cycle"]
+    forecast = metrics["forecast"]
+    workitems_df = metrics["workitems_df"]
+    completion_85 = forecast["completion_dates"].get(85) if forecast else None
+    return {
+        "Iterations": len(metrics["iterations_df"]),
+        "Stories": len(workitems_df) + metrics["archived_stories"],
+        "Open stories": int(workitems_df["Microsoft_VSTS_Common_ClosedDate"].isna().sum()),
+        "Lead time (days)": _days(lead_cycle["overall_lead_time"]),
+        "Recent lead time (days)": _days(lead_cycle["recent_lead_time"]),
+        "Cycle time (days)": _days(lead_cycle["overall_cycle_time"]),
+        "Recent cycle time (days)": _days(lead_cycle["recent_cycle_time"]),
+        "Open stories done by (85%)": f"{completion_85:%Y-%m-%d}" if completion_85 is not None else None,
+    }
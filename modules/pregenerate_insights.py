@@ -0,0 +1,168 @@
+"""Pre-generate AI insights after a sync so the dashboard can show them without waiting.
+
+Each user gets one insight per data version (bumped by every sync), built from
+their saved team size and capacity. Answers go through the content-addressed AI
+insights cache; the user document only records which cache entry belongs to
+which data version.
+
+Batch run over every subscribed user (from the repository root):
+
+    python -m modules.pregenerate_insights --all --workers 4
+    python -m modules.pregenerate_insights --user someone@example.com --force
+"""
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+
+from modules.ai_insights import (
+    AI_CACHE_COLLECTION, DEFAULT_CACHE_TTL_HOURS, DEFAULT_CACHE_MAX_ENTRIES, MODEL_NAME,
+    active_model_name, cache_key, create_model, get_cached_insight, get_or_generate_insight
+)
+from modules.archive import load_rollup
+from modules.datasets import user_team
+from modules.forecast import forecast_settings
+from modules.metrics import ITERATION_PROJECTION, WORKITEM_PROJECTION, build_metrics_summary, compute_dashboard_metrics
+
+DEFAULT_TEAM_SIZE = 5
+DEFAULT_CAPACITY_PER_PERSON = 8
+DEFAULT_MAX_WORKERS = 4
+
+
+def saved_team_settings(user_doc):
+    """`(team_size, capacity_per_person)` saved on the user document, or the form defaults."""
+    user_doc = user_doc or {}
+    return (
+        int(user_doc.get("team_size", DEFAULT_TEAM_SIZE)),
+        int(user_doc.get("capacity_per_person", DEFAULT_CAPACITY_PER_PERSON)),
+    )
+
+
+def user_metrics_summary(db, user_doc, team_size, capacity_per_person, now=None):
+    """Metrics summary for the user's dataset and team, as the dashboard builds it; None without stories."""
+    ds = user_doc.get("dataset_id")
+    if not ds:
+        return None
+    iterations = list(db["ado-iterations"].find({"dataset_id": ds, "teams": user_team(user_doc)}, ITERATION_PROJECTION))
+    workitems = list(db["ado-workitems"].find({"dataset_id": ds}, WORKITEM_PROJECTION))
+    rollup = load_rollup(db, ds, [doc.get("path") for doc in iterations])
+    if not iterations or not (workitems or rollup):
+        return None
+
+    metrics = compute_dashboard_metrics(iterations, workitems, now or datetime.now(timezone.utc), forecast_settings(),
+                                        rollup)
+    if metrics is None:
+        return None
+
+    cfd_df = metrics["cfd_effort_df"] if metrics["cfd_effort_df"] is not None else metrics["cfd_df"]
+    return build_metrics_summary(
+        metrics["lead_cycle"],
+        metrics["active_time_indicator"],
+        metrics["active_time_indicator_last_sprint"],
+        len(metrics["iterations_df"]),
+        cfd_df,
+        team_size,
+        capacity_per_person,
+        metrics["forecast"],
+    )
+
+
+def get_pregenerated_insight(cache_col, user_doc, team_size, capacity_per_person, model_name=MODEL_NAME):
+    """Cached text pre-generated by `model_name` for the user's current data version and team settings, if any."""
+    user_doc = user_doc or {}
+    pregenerated = user_doc.get("ai_insight") or {}
+    if (not pregenerated
+            or pregenerated.get("model") != model_name
+            or pregenerated.get("data_version") != user_doc.get("data_version", 0)
+            or pregenerated.get("team_size") != team_size
+            or pregenerated.get("capacity_per_person") != capacity_per_person):
+        return None
+    return get_cached_insight(cache_col, pregenerated["cache_key"])
+
+
+def pregenerate_for_user(db, email, model_factory, ai_settings=None, force=False):
+    """Generate (or reuse) the insight for one user; returns a short status string."""
+    ai_settings = ai_settings or {}
+    users_col = db["users"]
+    cache_col = db[AI_CACHE_COLLECTION]
+
+    user_doc = users_col.find_one({"email": email}, {"_id": 0, "data_version": 1, "team_size": 1,
+                                                     "capacity_per_person": 1, "ai_insight": 1, "dataset_id": 1,
+                                                     "team_name": 1, "project_name": 1})
+    if not user_doc:
+        return "no-user"
+
+    data_version = user_doc.get("data_version", 0)
+    model_name = active_model_name(ai_settings)
+    team_size, capacity_per_person = saved_team_settings(user_doc)
+    if not force and get_pregenerated_insight(cache_col, user_doc, team_size, capacity_per_person,
+                                              model_name) is not None:
+        return "up-to-date"
+
+    summary = user_metrics_summary(db, user_doc, team_size, capacity_per_person)
+    if summary is None:
+        return "no-data"
+
+    _, from_cache = get_or_generate_insight(
+        cache_col,
+        summary,
+        model_factory,
+        model_name=model_name,
+        ttl_hours=ai_settings.get("cache_ttl_hours", DEFAULT_CACHE_TTL_HOURS),
+        max_entries=ai_settings.get("cache_max_entries", DEFAULT_CACHE_MAX_ENTRIES)
+    )
+    users_col.update_one({"email": email}, {"$set": {"ai_insight": {
+        "data_version": data_version,
+        "team_size": team_size,
+        "capacity_per_person": capacity_per_person,
+        "model": model_name,
+        "cache_key": cache_key(summary, model_name=model_name),
+        "generated_at": datetime.now(timezone.utc),
+    }}})
+    return "cached" if from_cache else "generated"
+
+
+def pregenerate_insights(db, emails, model_factory, ai_settings=None, max_workers=DEFAULT_MAX_WORKERS, force=False):
+    """Pre-generate for many users with at most `max_workers` model calls in flight.
+
+    Returns `{email: status}`; a failing user is reported as "failed" and does not stop the batch.
+    """
+    def run(email):
+        try:
+            return pregenerate_for_user(db, email, model_factory, ai_settings, force=force)
+        except Exception as e:
+            print(f"AI insight pre-generation failed for {email}: {e}")
+            traceback.print_exc()
+            return "failed"
+
+    emails = list(emails)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return dict(zip(emails, pool.map(run, emails)))
+
+
+def main(argv=None):
+    import streamlit as st
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Pre-generate AI insights for synced users.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Every user subscribed to a dataset.")
+    target.add_argument("--user", action="append", help="User email (repeatable).")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent model calls.")
+    parser.add_argument("--force", action="store_true", help="Regenerate even if the data version is unchanged.")
+    args = parser.parse_args(argv)
+
+    ai_settings = dict(st.secrets.get("ai", {}))
+    db = MongoClient(st.secrets["mongo"]["uri"])[st.secrets["mongo"].get("db_name", "insightops")]
+    emails = db["users"].distinct("email", {"dataset_id": {"$ne": None}}) if args.all else args.user
+    model_factory = partial(create_model, st.secrets["google"]["api_key"], ai_settings)
+    workers = args.workers or ai_settings.get("pregenerate_workers", DEFAULT_MAX_WORKERS)
+
+    results = pregenerate_insights(db, emails, model_factory, ai_settings, max_workers=workers, force=args.force)
+    for email, status in sorted(results.items()):
+        print(f"{status:>11}  {email}")
+
+
+if __name__ == "__main__":
+    main()
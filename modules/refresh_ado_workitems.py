@@ -1,58 +1,24 @@
-from azure.devops.connection import Connection
-from msrest.authentication import BasicAuthentication
 import streamlit as st
 from pymongo import MongoClient
-from cryptography.fernet import Fernet
 import traceback
-
-def sanitize_keys(d):
-    """Replace invalid MongoDB characters ('.' and '$') in JSON keys."""
-    if isinstance(d, dict):
-        return {k.replace(".", "_").replace("$", "_"): sanitize_keys(v) for k, v in d.items()}
-    elif isinstance(d, list):
-        return [sanitize_keys(i) for i in d]
-    else:
-        return d
-
-def refresh_work_items():
-    # ------------------------------------------------------------------
-    # Verify user session
-    # ------------------------------------------------------------------
-    if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
-        st.error("You are not logged in. Go to the login page.")
-        st.stop()
-
-    user_email = st.session_state["user_email"]
-
-    # ------------------------------------------------------------------
-    # MongoDB connection setup
-    # ------------------------------------------------------------------
-    MONGODB_URI = st.secrets["mongo"]["uri"]
-    DATABASE_NAME = "insightops"
-    client = MongoClient(MONGODB_URI)
-    db = client[DATABASE_NAME]
-    users_collection = db["users"]
-    workitems_collection = db["ado-workitems"]
-
-    # ------------------------------------------------------------------
-    # Fetch user document
-    # ------------------------------------------------------------------
-    user_doc = users_collection.find_one({"email": user_email.lower()})
-    if not user_doc:
-        st.error("User not found in the database.")
-        st.stop()
-
-    # ------------------------------------------------------------------
-    # Setup Fernet decryption for PAT
-    # ------------------------------------------------------------------
-    FERNET_KEY = st.secrets["encryption"]["fernet_key"]
-    fernet = Fernet(FERNET_KEY.encode())
-
-    def decrypt_pat(encrypted_pat):
-        try:
-            return fernet.decrypt(encrypted_pat.encode()).decode()
-        except Exception:
-            return ""
+from modules.perf_trace import timed
+from modules.ops_runs import SyncRun
+from modules.ado_client import get_wit_client
+from modules.pat_crypto import decrypt_pat
+from modules.datasets import dataset_id, ensure_dataset_indexes, sanitize_keys
+from modules.sync_state import resumable_state, start_sync, checkpoint_batch, fail_sync, complete_sync
+from modules.metric_sketches import iteration_start_dates, upsert_work_items
+from modules.aging_wip import mark_open
+from modules.archive import archived_revisions, restore_archived
+from modules.sync_runner import SyncConfigError
+
+def sync_work_items(db, user_doc, ui):
+    """Fetch every work item of the user's project into its shared dataset; True on success.
+
+    Independent of the Streamlit session: progress goes to `ui`, anything with
+    `info`/`warning`/`success`/`error` (the `streamlit` module, or the CLI's
+    `ConsoleReporter`). Raises `SyncConfigError` when the profile cannot be synced.
+    """
 
     # ------------------------------------------------------------------
     # Load user-specific ADO connection details
@@ -63,19 +29,15 @@ def refresh_work_items():
     personal_access_token = decrypt_pat(encrypted_pat)
 
     if not all([organization_url, project_name, personal_access_token]):
-        st.error("Missing Azure DevOps credentials in your profile. Please update your settings.")
-        st.stop()
+        raise SyncConfigError("Missing Azure DevOps credentials in your profile. Please update your settings.")
 
     # ------------------------------------------------------------------
     # Connect to Azure DevOps
     # ------------------------------------------------------------------
     try:
-        credentials = BasicAuthentication('', personal_access_token)
-        connection = Connection(base_url=organization_url, creds=credentials)
-        wit_client = connection.clients.get_work_item_tracking_client()
+        wit_client = get_wit_client(user_doc)
     except Exception as e:
-        st.error(f"Failed to connect to Azure DevOps: {e}")
-        st.stop()
+        raise SyncConfigError(f"Failed to connect to Azure DevOps: {e}") from e
 
     # ------------------------------------------------------------------
     # Define WIQL query
@@ -87,39 +49,117 @@ def refresh_work_items():
     # ------------------------------------------------------------------
     # Fetch and store work items
     # ------------------------------------------------------------------
+    run = SyncRun("workitems", user_doc)
+    ds = dataset_id(organization_url, project_name)
+    batch_size = 200
     try:
-        query_results = wit_client.query_by_wiql(wiql_query)
-        work_item_ids = [wi.id for wi in query_results.work_items]
+        ensure_dataset_indexes(db)
+
+        # Resume an interrupted sync from its checkpoint, otherwise query the IDs afresh
+        state = resumable_state(db, "workitems", ds)
+        if state:
+            work_item_ids = state["ids"]
+            batch_size = state["batch_size"]
+            completed_offsets = set(state["completed_offsets"])
+            ui.info(f"Resuming the previous sync: {len(completed_offsets)} of "
+                    f"{-(-len(work_item_ids) // batch_size)} batches already stored.")
+        else:
+            with timed("refresh_work_items.wiql") as record:
+                query_results = wit_client.query_by_wiql(wiql_query)
+                work_item_ids = [wi.id for wi in query_results.work_items]
+                record["rows"] = len(work_item_ids)
+            completed_offsets = set()
+
+            if not work_item_ids:
+                ui.warning(f"No Work Items found in project '{project_name}'.")
+                return True
+
+            start_sync(db, "workitems", ds, work_item_ids, batch_size)
+
+        ui.info(f"Total Work Items found: {len(work_item_ids)}")
+        iteration_starts = iteration_start_dates(db, ds)
 
-        if not work_item_ids:
-            st.warning(f"No Work Items found in project '{project_name}'.")
-            return
+        for i in range(0, len(work_item_ids), batch_size):
+            if i in completed_offsets:
+                continue
 
-        st.info(f"Total Work Items found: {len(work_item_ids)}")
+            batch = work_item_ids[i:i + batch_size]
+            with timed("refresh_work_items.batch", rows=len(batch)):
+                response = wit_client.get_work_items(batch, expand='All')
+
+                if not response:
+                    # Fail the run so the checkpoint keeps the missing batches for the next one
+                    raise RuntimeError(f"Azure DevOps returned no work items for the batch at offset {i}.")
+
+                run.batches += 1
+                run.items += len(response)
+                watermark = None
+
+                batch_docs = []
+                for work_item in response:
+                    sanitized_data = sanitize_keys(work_item.fields)
+                    sanitized_data["System_Id"] = work_item.id  # Ensure System.Id is present
+                    sanitized_data["dataset_id"] = ds           # Shared by every subscriber of the project
+                    changed_date = sanitized_data.get("System_ChangedDate")
+                    if changed_date and (watermark is None or changed_date > watermark):
+                        watermark = changed_date
+                    batch_docs.append(mark_open(sanitized_data))
+
+                # Archived stories stay archived unless Azure DevOps has a newer revision
+                archived = archived_revisions(db, ds, [doc["System_Id"] for doc in batch_docs])
+                if archived:
+                    batch_docs = [doc for doc in batch_docs
+                                  if (doc.get("System_Rev") or 0) > archived.get(doc["System_Id"], -1)]
+                    restore_archived(db, ds, [doc["System_Id"] for doc in batch_docs if doc["System_Id"] in archived])
+
+                # Upsert to avoid duplicates; lead/cycle time sketches move only for items whose contribution changed
+                upsert_work_items(db, ds, batch_docs, iteration_starts)
+
+            checkpoint_batch(db, "workitems", ds, i, watermark)
+
+        complete_sync(db, "workitems", ds, len(work_item_ids))
+        ui.success(f"Stored or updated {len(work_item_ids)} work items in MongoDB.")
+        return True
 
-        batch_size = 200
+    except Exception as e:
+        run.add_error(e)
+        fail_sync(db, "workitems", ds, e)
+        ui.error(f"Error fetching or storing Work Items: {e}")
+        ui.error(traceback.format_exc())
+        return False
+    finally:
+        run.finish(db)
 
-        for i in range(0, len(work_item_ids), batch_size):
-            batch = work_item_ids[i:i + batch_size]
-            response = wit_client.get_work_items(batch, expand='All')
 
-            if not response:
-                break
+def refresh_work_items():
+    """Streamlit entry point: sync the logged-in user's project."""
+    # ------------------------------------------------------------------
+    # Verify user session
+    # ------------------------------------------------------------------
+    if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
+        st.error("You are not logged in. Go to the login page.")
+        st.stop()
 
-            for work_item in response:
-                sanitized_data = sanitize_keys(work_item.fields)
-                sanitized_data["System_Id"] = work_item.id  # Ensure System.Id is present
-                sanitized_data["ops_user"] = user_email     # Add logged-in user email
+    user_email = st.session_state["user_email"]
 
-                # Upsert to avoid duplicates
-                workitems_collection.update_one(
-                    {"System_Id": sanitized_data["System_Id"]},
-                    {"$set": sanitized_data},
-                    upsert=True
-                )
+    # ------------------------------------------------------------------
+    # MongoDB connection setup
+    # ------------------------------------------------------------------
+    MONGODB_URI = st.secrets["mongo"]["uri"]
+    DATABASE_NAME = "insightops"
+    client = MongoClient(MONGODB_URI)
+    db = client[DATABASE_NAME]
 
-        st.success(f"Stored or updated {len(work_item_ids)} work items in MongoDB.")
+    # ------------------------------------------------------------------
+    # Fetch user document
+    # ------------------------------------------------------------------
+    user_doc = db["users"].find_one({"email": user_email.lower()})
+    if not user_doc:
+        st.error("User not found in the database.")
+        st.stop()
 
-    except Exception as e:
-        st.error(f"Error fetching or storing Work Items: {e}")
-        st.error(traceback.format_exc())
+    try:
+        return sync_work_items(db, user_doc, st)
+    except SyncConfigError as e:
+        st.error(str(e))
+        st.stop()
@@ -1,102 +1,85 @@
-from azure.devops.connection import Connection
-from azure.devops.v7_0.work.models import TeamContext
-from msrest.authentication import BasicAuthentication
+from azure.devops.v7_0.work.models import TeamContext, TeamSettingsIteration
 from pymongo import MongoClient
 import streamlit as st
 import traceback
 from datetime import datetime
-from cryptography.fernet import Fernet
-
-def sanitize_keys(d):
-    """Replace invalid MongoDB characters ('.' and '$') in JSON keys."""
-    if isinstance(d, dict):
-        return {k.replace(".", "_").replace("$", "_"): sanitize_keys(v) for k, v in d.items()}
-    elif isinstance(d, list):
-        return [sanitize_keys(i) for i in d]
-    else:
-        return d
-
-def refresh_iterations():
-    """Fetch iteration data and aggregated work item metrics from Azure DevOps."""
+from modules.perf_trace import timed
+from modules.ops_runs import SyncRun
+from modules.ado_client import get_work_client, get_wit_client
+from modules.pat_crypto import decrypt_pat
+from modules.datasets import dataset_id, ensure_dataset_indexes, sanitize_keys
+from modules.metadata_cache import content_hash, get_cached_metadata
+from modules.sync_runner import SyncConfigError
+from modules.archive import ARCHIVE_COLLECTION, refresh_rollups
+
+def sync_iterations(db, user_doc, ui):
+    """Fetch the user's team iterations and per-iteration metrics into the shared dataset; True on success.
+
+    Independent of the Streamlit session like `sync_work_items`; progress goes to `ui`.
+    Raises `SyncConfigError` when the profile cannot be synced.
+    """
+    # ------------------------------------------------------------------
+    # Load user-specific ADO connection details
+    # ------------------------------------------------------------------
+    organization_url = user_doc.get("organization_url", "")
+    project_name = user_doc.get("project_name", "")
+    team_name = user_doc.get("team_name", project_name)
+    encrypted_pat = user_doc.get("pat", "")
+    personal_access_token = decrypt_pat(encrypted_pat)
+
+    if not all([organization_url, project_name, personal_access_token, team_name]):
+        raise SyncConfigError("Missing Azure DevOps credentials in your profile. Please update your settings.")
+
+    collection_iterations = db["ado-iterations"]
+    collection_workitems = db["ado-workitems"]
+    collection_archive = db[ARCHIVE_COLLECTION]
+    run = None
     try:
-        st.info("🔄 Connecting to Azure DevOps...")
-
-        # ------------------------------------------------------------------
-        # Verify user session
-        # ------------------------------------------------------------------
-        if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
-            st.error("You are not logged in. Go to the login page.")
-            st.stop()
-
-        user_email = st.session_state["user_email"]
-
-        # ------------------------------------------------------------------
-        # MongoDB connection setup
-        # ------------------------------------------------------------------
-        MONGODB_URI = st.secrets["mongo"]["uri"]
-        client = MongoClient(MONGODB_URI)
-        db = client["insightops"]
-        users_collection = db["users"]
-        collection_iterations = db["ado-iterations"]
-        collection_workitems = db["ado-workitems"]
-
-        # ------------------------------------------------------------------
-        # Fetch user document
-        # ------------------------------------------------------------------
-        user_doc = users_collection.find_one({"email": user_email.lower()})
-        if not user_doc:
-            st.error("User not found in the database.")
-            st.stop()
-
-        # ------------------------------------------------------------------
-        # Setup Fernet decryption for PAT
-        # ------------------------------------------------------------------
-        FERNET_KEY = st.secrets["encryption"]["fernet_key"]
-        fernet = Fernet(FERNET_KEY.encode())
-
-        def decrypt_pat(encrypted_pat):
-            try:
-                return fernet.decrypt(encrypted_pat.encode()).decode()
-            except Exception:
-                return ""
-
-        # ------------------------------------------------------------------
-        # Load user-specific ADO connection details
-        # ------------------------------------------------------------------
-        organization_url = user_doc.get("organization_url", "")
-        project_name = user_doc.get("project_name", "")
-        team_name = user_doc.get("team_name", project_name)
-        encrypted_pat = user_doc.get("pat", "")
-        personal_access_token = decrypt_pat(encrypted_pat)
-
-        if not all([organization_url, project_name, personal_access_token, team_name]):
-            st.error("Missing Azure DevOps credentials in your profile. Please update your settings.")
-            st.stop()
+        ui.info("🔄 Connecting to Azure DevOps...")
 
         # ------------------------------------------------------------------
         # Connect to Azure DevOps
         # ------------------------------------------------------------------
-        credentials = BasicAuthentication('', personal_access_token)
-        connection = Connection(base_url=organization_url, creds=credentials)
-        work_client = connection.clients.get_work_client()
-        wit_client = connection.clients.get_work_item_tracking_client()
+        work_client = get_work_client(user_doc)
+        wit_client = get_wit_client(user_doc)
+        run = SyncRun("iterations", user_doc)
 
         # Build team context
         team_context = TeamContext(project_id=project_name, team_id=team_name)
+        ds = dataset_id(organization_url, project_name)
+        ensure_dataset_indexes(db)
 
         # ------------------------------------------------------------------
         # Fetch iterations
         # ------------------------------------------------------------------
-        st.info(f"📡 Fetching iterations for project '{project_name}' (team: '{team_name}')...")
-        iterations = work_client.get_team_iterations(team_context)
+        ui.info(f"📡 Fetching iterations for project '{project_name}' (team: '{team_name}')...")
+        with timed("refresh_iterations.fetch_iterations") as record:
+            iterations, record["cache"] = get_cached_metadata(
+                db,
+                "team_iterations",
+                (organization_url, project_name, team_name),
+                lambda: work_client.get_team_iterations(team_context),
+                TeamSettingsIteration
+            )
+            record["rows"] = len(iterations)
 
         if not iterations:
-            st.warning("No iterations found.")
-            return
+            ui.warning("No iterations found.")
+            return True
 
-        st.info(f"✅ Retrieved {len(iterations)} iterations. Fetching work items...")
+        ui.info(f"✅ Retrieved {len(iterations)} iterations. Fetching work items...")
 
         stored_count = 0
+        unchanged_count = 0
+        changed_paths = []
+
+        # Content hashes of this team's stored iteration documents, to skip unchanged upserts
+        stored_hashes = {
+            d["id"]: d.get("content_hash")
+            for d in collection_iterations.find(
+                {"dataset_id": ds, "teams": team_name}, {"_id": 0, "id": 1, "content_hash": 1}
+            )
+        }
 
         # WIQL template: fetch IDs only
         wiql_template = """
@@ -114,8 +97,10 @@ def refresh_iterations():
             wiql_query = {"query": wiql_template.format(project=project_name, iteration_path=iteration_path)}
 
             # Execute WIQL to get work item IDs
-            query_results = wit_client.query_by_wiql(wiql_query)
-            work_item_ids = [wi.id for wi in query_results.work_items]
+            with timed("refresh_iterations.wiql") as record:
+                query_results = wit_client.query_by_wiql(wiql_query)
+                work_item_ids = [wi.id for wi in query_results.work_items]
+                record["rows"] = len(work_item_ids)
 
             # Initialize metrics
             num_user_stories = 0
@@ -129,12 +114,14 @@ def refresh_iterations():
                 batch = work_item_ids[i:i + batch_size]
 
                 # Fetch details for the batch
-                response = wit_client.get_work_items(batch, fields=[
-                    "System.Id",
-                    "System.WorkItemType",
-                    "System.State",
-                    "Microsoft.VSTS.Scheduling.Effort",
-                ])
+                with timed("refresh_iterations.batch", rows=len(batch)):
+                    response = wit_client.get_work_items(batch, fields=[
+                        "System.Id",
+                        "System.WorkItemType",
+                        "System.State",
+                        "Microsoft.VSTS.Scheduling.Effort",
+                    ])
+                run.batches += 1
 
                 for wi in response:
                     wi_type = wi.fields.get("System.WorkItemType", "")
@@ -154,11 +141,16 @@ def refresh_iterations():
             num_closed_late = 0
             if finish_date:
                 query = {
+                    "dataset_id": ds,
                     "System_IterationPath": iteration_path,
                     "System_WorkItemType": "User Story",
                     "Microsoft_VSTS_Common_ClosedDate": {"$ne": None}
                 }
-                work_items_for_iteration = list(collection_workitems.find(query, {"Microsoft_VSTS_Common_ClosedDate": 1}))
+                # Old iterations' stories may have been archived
+                work_items_for_iteration = [
+                    wi for collection in (collection_workitems, collection_archive)
+                    for wi in collection.find(query, {"Microsoft_VSTS_Common_ClosedDate": 1})
+                ]
                 for wi in work_items_for_iteration:
                     closed_date = wi.get("Microsoft_VSTS_Common_ClosedDate")
                     if closed_date:
@@ -179,21 +171,71 @@ def refresh_iterations():
                 "sumEffortUserStories": sum_effort,
                 "numUserStoriesDone": num_done,
                 "numUserStoriesClosedLate": num_closed_late,
-                "ops_user": user_email
+                "dataset_id": ds
             }
 
             sanitized = sanitize_keys(data)
-
-            # Upsert into MongoDB
-            collection_iterations.update_one(
-                {"id": sanitized["id"]},
-                {"$set": sanitized},
-                upsert=True
-            )
+            sanitized["content_hash"] = content_hash(sanitized)
+
+            # Upsert into MongoDB (skipped when metadata and metrics are unchanged)
+            if stored_hashes.get(sanitized["id"]) == sanitized["content_hash"]:
+                unchanged_count += 1
+            else:
+                collection_iterations.update_one(
+                    {"dataset_id": ds, "id": sanitized["id"]},
+                    {"$set": sanitized, "$addToSet": {"teams": team_name}},
+                    upsert=True
+                )
+                changed_paths.append(sanitized["path"])
             stored_count += 1
+            run.items += 1
+
+        # Roll-ups of archived stories hold cycle times measured from the iteration start
+        refresh_rollups(db, ds, changed_paths)
 
-        st.success(f"🎉 Stored or updated {stored_count} iterations with metrics in MongoDB.")
+        ui.success(f"🎉 Stored or updated {stored_count} iterations with metrics in MongoDB "
+                   f"({unchanged_count} unchanged).")
+        return True
 
     except Exception as e:
-        st.error(f"❌ Error fetching or storing iterations: {e}")
-        st.error(traceback.format_exc())
+        if run:
+            run.add_error(e)
+        ui.error(f"❌ Error fetching or storing iterations: {e}")
+        ui.error(traceback.format_exc())
+        return False
+    finally:
+        if run:
+            run.finish(db)
+
+
+def refresh_iterations():
+    """Streamlit entry point: sync the logged-in user's team iterations."""
+    # ------------------------------------------------------------------
+    # Verify user session
+    # ------------------------------------------------------------------
+    if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
+        st.error("You are not logged in. Go to the login page.")
+        st.stop()
+
+    user_email = st.session_state["user_email"]
+
+    # ------------------------------------------------------------------
+    # MongoDB connection setup
+    # ------------------------------------------------------------------
+    MONGODB_URI = st.secrets["mongo"]["uri"]
+    client = MongoClient(MONGODB_URI)
+    db = client["insightops"]
+
+    # ------------------------------------------------------------------
+    # Fetch user document
+    # ------------------------------------------------------------------
+    user_doc = db["users"].find_one({"email": user_email.lower()})
+    if not user_doc:
+        st.error("User not found in the database.")
+        st.stop()
+
+    try:
+        return sync_iterations(db, user_doc, st)
+    except SyncConfigError as e:
+        st.error(str(e))
+        st.stop()
@@ -1,27 +1,10 @@
-import smtplib
-from email.mime.text import MIMEText
-import streamlit as st
+from modules.email_outbox import queue_email, start_outbox_worker
 
-def send_verification_email(user_email, verification_token):
-    smtp_server = st.secrets["google_smtp"]["server"]
-    smtp_port = st.secrets["google_smtp"]["port"]
-    sender_email = st.secrets["google_smtp"]["email"]
-    sender_password = st.secrets["google_smtp"]["password"]
-    
+def send_verification_email(db, user_email, verification_token):
     verification_link = f"https://insight-ops.streamlit.app/verify?token={verification_token}"
     subject = "Verify Your InsightOps Account"
     body = f"To verify your InsightOps account, follow this link: {verification_link}"
-    
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = sender_email
-    msg["To"] = user_email
-    
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, user_email, msg.as_string())
-        print("Verification email sent successfully.")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+
+    # Delivered by the outbox worker; the page does not wait for SMTP
+    queue_email(db, user_email, subject, body, "verification")
+    start_outbox_worker(db)
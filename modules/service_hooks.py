@@ -0,0 +1,183 @@
+"""Azure DevOps service-hook receiver: keeps shared datasets fresh between full syncs.
+
+Create "Web Hooks" subscriptions in the project's service hooks for
+`Work item created`, `Work item updated` and `Work item deleted`. Point them at
+
+    http://<host>:8787/hooks/ado
+
+and add the HTTP header `X-InsightOps-Secret: <service_hooks.secret>` (or
+basic auth with that secret as password). Run the receiver with
+
+    python -m modules.service_hooks --port 8787
+
+Each event is a single-item upsert (or delete) in `ado-workitems` for the
+dataset of its organization and project. Older revisions never overwrite newer
+ones. The data version of every subscriber is bumped, so pre-generated AI
+insights are regenerated. Events for projects nobody subscribes to are ignored.
+A newer revision of an archived story moves it back to `ado-workitems` (see
+`modules/archive.py`).
+`tools/replay_service_hooks.py` replays sample payloads locally.
+"""
+import argparse
+import base64
+import hmac
+import json
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.data_version import bump_data_version
+from modules.datasets import DATASETS_COLLECTION, dataset_id, sanitize_keys
+from modules.metric_sketches import apply_changes, iteration_start_dates, upsert_work_items
+from modules.aging_wip import mark_open
+from modules.archive import archived_revisions, delete_archived, restore_archived
+
+HOOK_PATH = "/hooks/ado"
+SECRET_HEADER = "X-InsightOps-Secret"
+WORKITEM_EVENTS = ("workitem.created", "workitem.updated", "workitem.deleted")
+
+
+def _event_work_item(payload):
+    """`(work_item_id, fields)` of the event; fields are the full revision after the change."""
+    resource = payload.get("resource") or {}
+    if payload["eventType"] == "workitem.updated":
+        revision = resource.get("revision") or {}
+        return resource.get("workItemId") or revision.get("id"), revision.get("fields") or {}
+    return resource.get("id"), resource.get("fields") or {}
+
+
+def _event_dataset(payload, fields):
+    containers = payload.get("resourceContainers") or {}
+    base_url = (containers.get("collection") or containers.get("account") or {}).get("baseUrl")
+    project = fields.get("System.TeamProject")
+    if not base_url or not project:
+        return None
+    return dataset_id(base_url, project)
+
+
+def apply_event(db, payload):
+    """Apply one service-hook payload; returns a short status string."""
+    event_type = payload.get("eventType")
+    if event_type not in WORKITEM_EVENTS:
+        return "ignored: event type"
+
+    work_item_id, fields = _event_work_item(payload)
+    ds = _event_dataset(payload, fields)
+    if not work_item_id or not ds:
+        return "ignored: incomplete payload"
+    if not db[DATASETS_COLLECTION].find_one({"_id": ds}, {"_id": 1}):
+        return "ignored: no subscribers"
+
+    workitems_col = db["ado-workitems"]
+    key = {"dataset_id": ds, "System_Id": work_item_id}
+
+    if event_type == "workitem.deleted":
+        deleted = workitems_col.find_one_and_delete(key, projection={"sketch": 1})
+        if deleted is None:
+            deleted = delete_archived(db, ds, work_item_id)
+        if deleted is None:
+            return "ignored: unknown work item"
+        apply_changes(db, ds, [(deleted.get("sketch"), None)])
+        status = "deleted"
+    else:
+        doc = sanitize_keys(fields)
+        doc["System_Id"] = work_item_id
+        doc["dataset_id"] = ds
+        mark_open(doc)
+
+        # Deliveries can arrive late or twice; keep the newest revision
+        stored = workitems_col.find_one(key, {"System_Rev": 1})
+        archived = archived_revisions(db, ds, [work_item_id]) if stored is None else {}
+        stored_rev = (stored or {}).get("System_Rev") or archived.get(work_item_id) or 0
+        if (stored or archived) and stored_rev >= (doc.get("System_Rev") or 0):
+            return "ignored: stale revision"
+        if archived:
+            restore_archived(db, ds, [work_item_id])
+        upsert_work_items(db, ds, [doc], iteration_start_dates(db, ds))
+        status = "upserted"
+
+    db[DATASETS_COLLECTION].update_one({"_id": ds}, {"$set": {"last_event_at": datetime.now(timezone.utc)}})
+    bump_data_version(db["users"], ds)
+    return status
+
+
+# ---------------------------------------------
+# HTTP RECEIVER
+# ---------------------------------------------
+class ServiceHookHandler(BaseHTTPRequestHandler):
+    db = None
+    secret = None
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self):
+        if not self.secret:
+            return True
+        supplied = self.headers.get(SECRET_HEADER, "")
+        auth = self.headers.get("Authorization", "")
+        if not supplied and auth.startswith("Basic "):
+            try:
+                supplied = base64.b64decode(auth[6:]).decode().partition(":")[2]
+            except ValueError:
+                supplied = ""
+        return hmac.compare_digest(supplied.encode(), self.secret.encode())
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.path.rstrip("/") != HOOK_PATH:
+            return self._reply(404, {"error": "not found"})
+        if not self._authorized():
+            return self._reply(401, {"error": "unauthorized"})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._reply(400, {"error": "invalid JSON"})
+
+        try:
+            status = apply_event(self.db, payload)
+        except Exception as e:
+            print(f"Service hook {payload.get('eventType')} failed: {e}")
+            return self._reply(500, {"error": str(e)})
+        return self._reply(200, {"status": status})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_receiver(db, secret, host="0.0.0.0", port=8787):
+    handler = type("BoundServiceHookHandler", (ServiceHookHandler,), {"db": db, "secret": secret})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    import streamlit as st
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Receive Azure DevOps work item service hooks.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args(argv)
+
+    db = MongoClient(st.secrets["mongo"]["uri"])[st.secrets["mongo"].get("db_name", "insightops")]
+    secret = st.secrets.get("service_hooks", {}).get("secret")
+    if not secret:
+        parser.error("Set service_hooks.secret in .streamlit/secrets.toml; it must match the hook's secret header.")
+
+    server = make_receiver(db, secret, args.host, args.port)
+    print(f"Listening for service hooks on http://{args.host}:{args.port}{HOOK_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
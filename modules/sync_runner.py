@@ -0,0 +1,251 @@
+"""Dashboard syncs without Streamlit: the core behind the Refresh button and the `insightops` CLI.
+
+`sync_connection` runs the same steps as Refresh (access check, shared-dataset
+claim, iterations and work items, data version bump) for one of a user's
+project/team connections. Progress messages go to a `ui` object with
+`info`/`warning`/`success`/`error`; the dashboard passes the `streamlit` module
+(or a `MessageLog` from worker threads) and the CLI a `ConsoleReporter`.
+
+`sync_user_connections` and `sync_all` sync several datasets in parallel on a
+bounded thread pool; each dataset is synced once, then only the iterations of
+each further team. Optional settings in `.streamlit/secrets.toml`:
+
+    [sync]
+    max_workers = 3
+"""
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.data_version import bump_data_version
+from modules.datasets import (
+    DATASETS_COLLECTION, claim_dataset_sync, ensure_access, release_dataset_sync, user_dataset_id, user_team
+)
+from modules.perf_trace import extend_trace, get_trace, start_trace
+
+# Statuses after which the dataset holds current data for the run
+DATASET_CURRENT_STATUSES = ("synced", "fresh", "busy")
+DEFAULT_MAX_WORKERS = 3
+
+
+class SyncConfigError(Exception):
+    """The user's profile cannot be synced (missing credentials or no connection to Azure DevOps)."""
+
+
+class ConsoleReporter:
+    """Prints sync progress for command-line runs; `quiet` keeps only warnings and errors."""
+
+    def __init__(self, prefix="", quiet=False, stream=None):
+        self.prefix = prefix
+        self.quiet = quiet
+        self.stream = stream or sys.stderr
+
+    def _print(self, level, message):
+        print(f"{self.prefix}{level:<7} {message}", file=self.stream)
+
+    def info(self, message):
+        if not self.quiet:
+            self._print("info", message)
+
+    def success(self, message):
+        if not self.quiet:
+            self._print("ok", message)
+
+    def warning(self, message):
+        self._print("warning", message)
+
+    def error(self, message):
+        self._print("error", message)
+
+
+class MessageLog:
+    """Collects the progress messages of a sync on a worker thread, to show them once it finishes."""
+
+    def __init__(self):
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def _add(self, level, message):
+        with self._lock:
+            self.messages.append((level, message))
+
+    def info(self, message):
+        self._add("info", message)
+
+    def success(self, message):
+        self._add("success", message)
+
+    def warning(self, message):
+        self._add("warning", message)
+
+    def error(self, message):
+        self._add("error", message)
+
+    def replay(self, ui):
+        for level, message in list(self.messages):
+            getattr(ui, level)(message)
+
+
+def sync_settings():
+    """`max_workers` for parallel syncs from `.streamlit/secrets.toml`."""
+    import streamlit as st
+
+    return max(1, int(st.secrets.get("sync", {}).get("max_workers", DEFAULT_MAX_WORKERS)))
+
+
+def sync_connection(db, user_doc, ui, fresh_minutes=None):
+    """Sync the shared project dataset of `user_doc` (one of a user's connections) like the Refresh button.
+
+    Returns "synced", "failed", "fresh" (someone synced it within `fresh_minutes`),
+    "busy" (another sync holds the claim) or "no-access".
+    Raises `SyncConfigError` when the connection is incomplete.
+    The Azure DevOps SDK is only imported when a sync runs.
+    """
+    from modules.refresh_iterations import sync_iterations
+    from modules.refresh_ado_workitems import sync_work_items
+
+    dataset = ensure_access(db, user_doc, force=True)
+    if not dataset:
+        return "no-access"
+
+    # One sync serves every subscriber of the project
+    claim = claim_dataset_sync(db, dataset, user_doc["email"], fresh_minutes)
+    if claim != "claimed":
+        return claim
+
+    succeeded = False
+    try:
+        # Both stages always run; the work item sync resumes from its checkpoint on failure
+        iterations_ok = sync_iterations(db, user_doc, ui)
+        workitems_ok = sync_work_items(db, user_doc, ui)
+        succeeded = bool(iterations_ok and workitems_ok)
+    finally:
+        release_dataset_sync(db, dataset, user_doc["email"], succeeded)
+    bump_data_version(db["users"], dataset)
+    return "synced" if succeeded else "failed"
+
+
+def sync_user(db, email, ui, fresh_minutes=None):
+    """Sync the user's active connection (see `sync_connection`); "no-user" when there is no such user."""
+    user_doc = db["users"].find_one({"email": email.lower()})
+    if not user_doc:
+        return "no-user"
+    return sync_connection(db, user_doc, ui, fresh_minutes)
+
+
+def sync_team_iterations(db, user_doc, ui):
+    """Sync only the iterations of the connection's team (its dataset's work items are already current)."""
+    from modules.refresh_iterations import sync_iterations
+
+    dataset = ensure_access(db, user_doc, force=True)
+    if not dataset:
+        return "no-access"
+    succeeded = sync_iterations(db, user_doc, ui)
+    bump_data_version(db["users"], dataset)
+    return "synced" if succeeded else "failed"
+
+
+def _run(step, key, *args):
+    try:
+        return step(*args)
+    except SyncConfigError as e:
+        print(f"Sync skipped for {key}: {e}")
+        return "no-config"
+    except Exception as e:
+        print(f"Sync failed for {key}: {e}")
+        traceback.print_exc()
+        return "failed"
+
+
+def _sync_dataset(db, members, ui_factory, fresh_minutes):
+    """Sync one dataset for `members`, `(key, user_doc)` pairs of its connections.
+
+    The dataset is synced once, then only the iterations of each further team;
+    members whose team was already covered are only access-checked and reported
+    as "shared".
+    """
+    results = {}
+    dataset_current = False
+    synced_teams = set()
+    for key, user_doc in members:
+        if user_doc is None:
+            results[key] = "no-user"
+            continue
+        team = user_team(user_doc)
+        if dataset_current and team in synced_teams:
+            # Nothing to download, but the member's own PAT must still grant access
+            results[key] = "shared" if ensure_access(db, user_doc) else "no-access"
+            continue
+
+        if not dataset_current:
+            status = _run(sync_connection, key, db, user_doc, ui_factory(key), fresh_minutes)
+            dataset_current = status in DATASET_CURRENT_STATUSES
+        else:
+            status = _run(sync_team_iterations, key, db, user_doc, ui_factory(key))
+        results[key] = status
+        if status in DATASET_CURRENT_STATUSES:
+            synced_teams.add(team)
+    return results
+
+
+def _traced_sync_dataset(*args):
+    # Each worker thread has its own trace; it is handed back to the caller's
+    start_trace()
+    return _sync_dataset(*args), get_trace()
+
+
+def _sync_datasets(db, groups, ui_factory, fresh_minutes, max_workers):
+    """`_sync_dataset` for each group of members on at most `max_workers` threads; returns the merged results."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [pool.submit(_traced_sync_dataset, db, members, ui_factory, fresh_minutes) for members in groups]
+        for future in futures:
+            group_results, records = future.result()
+            results.update(group_results)
+            extend_trace(records)
+    return results
+
+
+def sync_user_connections(db, email, ui_factory, fresh_minutes=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Sync every connection of the user, different datasets in parallel.
+
+    `ui_factory(name)` gives the reporter for one connection's steps.
+    Returns `{connection name: status}`, or `{email: "no-user"}`.
+    """
+    from modules.connections import connection_name, connection_user_doc, user_connections
+
+    user_doc = db["users"].find_one({"email": email.lower()})
+    if not user_doc:
+        return {email: "no-user"}
+    groups = {}
+    for connection in user_connections(user_doc):
+        groups.setdefault(user_dataset_id(connection), []).append(
+            (connection_name(connection), connection_user_doc(user_doc, connection))
+        )
+    return _sync_datasets(db, list(groups.values()), ui_factory, fresh_minutes, max_workers)
+
+
+def sync_all(db, ui_factory, fresh_minutes=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Sync every subscribed dataset once (several in parallel), plus the iterations of each further team.
+
+    `ui_factory(key)` gives the reporter for one subscriber's steps. Returns
+    `{key: status}`, keyed by email (with the connection's name for users with
+    several); subscribers whose team was already covered are reported as "shared".
+    """
+    from modules.connections import connection_name, connection_user_doc, dataset_connection, user_connections
+
+    groups = []
+    for dataset_doc in db[DATASETS_COLLECTION].find({}, {"subscribers": 1}):
+        members = []
+        for email in dataset_doc.get("subscribers", []):
+            user_doc = db["users"].find_one({"email": email})
+            connection = dataset_connection(user_doc, dataset_doc["_id"]) if user_doc else None
+            if connection is None:
+                members.append((email, None))  # no such user, or no connection to this project anymore
+            elif len(user_connections(user_doc)) > 1:
+                members.append((f"{email} ({connection_name(connection)})", connection_user_doc(user_doc, connection)))
+            else:
+                members.append((email, connection_user_doc(user_doc, connection)))
+        groups.append(members)
+    return _sync_datasets(db, groups, ui_factory, fresh_minutes, max_workers)
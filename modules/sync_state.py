@@ -0,0 +1,93 @@
+"""Checkpoints for resumable syncs, one `sync-state` document per sync kind and dataset.
+
+While a sync runs, the document holds the work item ID list, the batch offsets
+already stored and the highest `System.ChangedDate` seen (the watermark). A
+sync interrupted by a rerun, a closed tab or an Azure DevOps error is resumed
+from those offsets by the next Refresh. `last_completed` keeps describing the
+last full sync meanwhile.
+"""
+from datetime import datetime, timedelta, timezone
+
+SYNC_STATE_COLLECTION = "sync-state"
+RESUME_MAX_AGE = timedelta(hours=24)
+
+
+def _state_id(kind, dataset_id):
+    return f"{kind}:{dataset_id}"
+
+
+def get_sync_state(db, kind, dataset_id):
+    return db[SYNC_STATE_COLLECTION].find_one({"_id": _state_id(kind, dataset_id)})
+
+
+def resumable_state(db, kind, dataset_id):
+    """The unfinished state to resume, or None to start over."""
+    state = get_sync_state(db, kind, dataset_id)
+    if not state or state.get("status") not in ("running", "failed") or not state.get("ids"):
+        return None
+    if state["updated_at"].replace(tzinfo=timezone.utc) + RESUME_MAX_AGE < datetime.now(timezone.utc):
+        return None
+    return state
+
+
+def start_sync(db, kind, dataset_id, ids, batch_size):
+    """Begin a fresh sync over `ids`; any earlier progress is discarded, `last_completed` is kept."""
+    now = datetime.now(timezone.utc)
+    db[SYNC_STATE_COLLECTION].update_one(
+        {"_id": _state_id(kind, dataset_id)},
+        {
+            "$set": {
+                "kind": kind,
+                "dataset_id": dataset_id,
+                "status": "running",
+                "ids": list(ids),
+                "batch_size": batch_size,
+                "completed_offsets": [],
+                "started_at": now,
+                "updated_at": now,
+                "error": None,
+            },
+            "$unset": {"watermark": ""},
+        },
+        upsert=True
+    )
+
+
+def checkpoint_batch(db, kind, dataset_id, offset, watermark=None):
+    """Record that the batch starting at `offset` is stored."""
+    update = {
+        "$addToSet": {"completed_offsets": offset},
+        "$set": {"status": "running", "updated_at": datetime.now(timezone.utc)},
+    }
+    if watermark:
+        update["$max"] = {"watermark": watermark}
+    db[SYNC_STATE_COLLECTION].update_one({"_id": _state_id(kind, dataset_id)}, update)
+
+
+def fail_sync(db, kind, dataset_id, error):
+    db[SYNC_STATE_COLLECTION].update_one(
+        {"_id": _state_id(kind, dataset_id)},
+        {"$set": {"status": "failed", "error": str(error), "updated_at": datetime.now(timezone.utc)}}
+    )
+
+
+def complete_sync(db, kind, dataset_id, items):
+    """Mark the sync finished, publish it as `last_completed` and drop the ID list."""
+    state = get_sync_state(db, kind, dataset_id) or {}
+    now = datetime.now(timezone.utc)
+    db[SYNC_STATE_COLLECTION].update_one(
+        {"_id": _state_id(kind, dataset_id)},
+        {
+            "$set": {
+                "status": "completed",
+                "updated_at": now,
+                "last_completed": {
+                    "started_at": state.get("started_at"),
+                    "completed_at": now,
+                    "items": items,
+                    "watermark": state.get("watermark"),
+                },
+            },
+            "$unset": {"ids": "", "completed_offsets": ""},
+        }
+    )
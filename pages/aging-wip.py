@@ -0,0 +1,81 @@
+import streamlit as st
+from modules.hide_pages import hide_internal_pages
+
+# ---------------------------------------------
+# HIDE PAGES FROM NAV
+# ---------------------------------------------
+hide_internal_pages()
+
+st.set_page_config(page_title="Aging WIP", layout="wide")
+st.title("Aging Work in Progress")
+
+if "logged_in" not in st.session_state:
+    st.session_state["logged_in"] = False
+    st.session_state["user_email"] = None
+
+if not st.session_state["logged_in"]:
+    st.error("You are not logged in.")
+    st.stop()
+
+import pymongo
+import plotly.express as px
+from datetime import datetime, timezone
+from modules.aging_wip import open_items, aging_frame
+from modules.datasets import ensure_access, user_team
+from modules.metric_sketches import iterations_summary
+
+# Connect to MongoDB
+MONGODB_URI = st.secrets["mongo"]["uri"]
+client = pymongo.MongoClient(MONGODB_URI)
+db = client["insightops"]
+
+user_email = st.session_state["user_email"]
+user = db["users"].find_one({"email": user_email}, {"_id": 0})
+dataset = ensure_access(db, user) if user else None
+if not dataset:
+    st.info("Set up your Azure DevOps connection in your settings and refresh the dashboard first.")
+    st.stop()
+
+# ---------------------------------------------
+# LOAD OPEN ITEMS AND HISTORICAL ACTIVE TIMES
+# ---------------------------------------------
+team_paths = db["ado-iterations"].distinct("path", {"dataset_id": dataset, "teams": user_team(user)})
+active_summary = iterations_summary(db, dataset, team_paths)["active"]
+aging_df = aging_frame(open_items(db, dataset, team_paths), datetime.now(timezone.utc), active_summary)
+
+if aging_df.empty:
+    st.info("No stories are in progress right now (activated and not closed). Items are flagged at each sync.")
+    st.stop()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Items in progress", len(aging_df))
+col2.metric("Median active time (closed)", f"{active_summary['p50']} days" if active_summary["p50"] is not None else "N/A")
+col3.metric("85th percentile", f"{active_summary['p85']} days" if active_summary["p85"] is not None else "N/A")
+col4.metric("95th percentile", f"{active_summary['p95']} days" if active_summary["p95"] is not None else "N/A")
+
+if not active_summary["count"]:
+    st.info("No closed stories with an activated date yet, so ages cannot be compared with history.")
+
+# ---------------------------------------------
+# AGING CHART (age per state against the percentiles)
+# ---------------------------------------------
+fig = px.strip(
+    aging_df,
+    x="System_State",
+    y="AgeDays",
+    color="Status",
+    hover_data=["System_Id", "System_Title", "System_IterationPath"],
+    labels={"System_State": "State", "AgeDays": "Age (days since activated)"},
+    title="Age of in-progress stories"
+)
+for key, dash in (("p50", "dot"), ("p85", "dash"), ("p95", "solid")):
+    if active_summary[key] is not None:
+        fig.add_hline(y=active_summary[key], line_dash=dash, annotation_text=f"{key} ({active_summary[key]} d)")
+st.plotly_chart(fig, use_container_width=True)
+
+# ---------------------------------------------
+# OLDEST ITEMS
+# ---------------------------------------------
+columns = [c for c in ["System_Id", "System_Title", "System_State", "System_AssignedTo", "System_IterationPath",
+                       "AgeDays", "Status"] if c in aging_df.columns]
+st.dataframe(aging_df[columns], use_container_width=True, hide_index=True)
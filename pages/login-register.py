@@ -127,6 +127,6 @@ else:
 
                 # Send verification email
                 verification_link = f"{st.secrets['app']['base_url']}/verify?token={verification_token}"
-                send_verification_email(new_email, verification_token)
+                send_verification_email(db, new_email, verification_token)
 
                 st.success("Registration successful! A verification email has been sent.")
@@ -0,0 +1,146 @@
+import streamlit as st
+from modules.admin import is_admin
+from modules.ops_runs import OPS_RUNS_COLLECTION
+from modules.email_outbox import OUTBOX_COLLECTION, outbox_status_counts
+from modules.hide_pages import hide_internal_pages
+
+# ---------------------------------------------
+# HIDE PAGES FROM NAV
+# ---------------------------------------------
+hide_internal_pages()
+
+st.set_page_config(page_title="Ops Admin", layout="wide")
+st.title("Sync Observability")
+
+if "logged_in" not in st.session_state:
+    st.session_state["logged_in"] = False
+    st.session_state["user_email"] = None
+
+if not st.session_state["logged_in"] or not is_admin(st.session_state["user_email"]):
+    st.error("This page is only available to administrators.")
+    st.stop()
+
+import pymongo
+import pandas as pd
+import plotly.express as px
+from datetime import datetime, timedelta, timezone
+
+# Connect to MongoDB
+MONGODB_URI = st.secrets["mongo"]["uri"]
+client = pymongo.MongoClient(MONGODB_URI)
+db = client["insightops"]
+runs_collection = db[OPS_RUNS_COLLECTION]
+
+# ---------------------------------------------
+# EMAIL OUTBOX
+# ---------------------------------------------
+with st.expander("Email outbox"):
+    for column, (status, count) in zip(st.columns(4), outbox_status_counts(db).items()):
+        column.metric(status.capitalize(), count)
+    undelivered = list(db[OUTBOX_COLLECTION].find(
+        {"status": {"$in": ["pending", "failed"]}, "last_error": {"$exists": True}},
+        {"_id": 0, "to": 1, "kind": 1, "status": 1, "attempts": 1, "last_error": 1, "created_at": 1}
+    ).sort("created_at", -1).limit(50))
+    if undelivered:
+        st.dataframe(pd.DataFrame(undelivered), use_container_width=True)
+
+# ---------------------------------------------
+# LOAD RUN RECORDS
+# ---------------------------------------------
+days = st.slider("Look-back window (days)", min_value=1, max_value=90, value=14)
+since = datetime.now(timezone.utc) - timedelta(days=days)
+
+runs = list(runs_collection.find(
+    {"started_at": {"$gte": since}},
+    {"_id": 0, "errors.traceback": 0}
+).sort("started_at", -1))
+
+if not runs:
+    st.info("No sync runs recorded in this window.")
+    st.stop()
+
+runs_df = pd.DataFrame(runs)
+runs_df["started_at"] = pd.to_datetime(runs_df["started_at"], utc=True)
+runs_df["failed"] = runs_df["status"] == "failed"
+
+kinds = st.multiselect("Sync stage", sorted(runs_df["kind"].unique()), default=sorted(runs_df["kind"].unique()))
+runs_df = runs_df[runs_df["kind"].isin(kinds)]
+if runs_df.empty:
+    st.info("No runs for the selected stages.")
+    st.stop()
+
+# ---------------------------------------------
+# SUMMARY PER ORGANIZATION
+# ---------------------------------------------
+def p50(series):
+    return series.quantile(0.50)
+
+def p95(series):
+    return series.quantile(0.95)
+
+summary_df = runs_df.groupby(["organization_url", "kind"]).agg(
+    runs=("status", "size"),
+    failures=("failed", "sum"),
+    p50_seconds=("duration_seconds", p50),
+    p95_seconds=("duration_seconds", p95),
+    p50_items_per_second=("items_per_second", p50),
+    ado_calls=("ado_calls", "sum"),
+    retries=("retries", "sum"),
+    throttled=("throttled", "sum"),
+    megabytes=("bytes", lambda b: b.sum() / (1024 * 1024)),
+).reset_index()
+summary_df["failure_rate"] = summary_df["failures"] / summary_df["runs"]
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Runs", len(runs_df))
+col2.metric("Failure rate", f"{runs_df['failed'].mean() * 100:.1f} %")
+col3.metric("p95 sync latency", f"{runs_df['duration_seconds'].quantile(0.95):.1f} s")
+col4.metric("ADO calls", int(runs_df["ado_calls"].sum()))
+
+st.subheader("Per organization")
+st.dataframe(summary_df, use_container_width=True)
+
+latency_df = summary_df.melt(
+    id_vars=["organization_url", "kind"],
+    value_vars=["p50_seconds", "p95_seconds"],
+    var_name="Percentile",
+    value_name="Seconds"
+)
+fig_latency = px.bar(
+    latency_df,
+    x="organization_url",
+    y="Seconds",
+    color="Percentile",
+    barmode="group",
+    facet_col="kind",
+    title="Sync latency p50 / p95 per organization",
+    labels={"organization_url": "Organization"},
+)
+st.plotly_chart(fig_latency, use_container_width=True)
+
+fig_throughput = px.scatter(
+    runs_df.sort_values("started_at"),
+    x="started_at",
+    y="items_per_second",
+    color="organization_url",
+    symbol="kind",
+    title="Sync throughput over time (items per second)",
+    labels={"started_at": "Started", "items_per_second": "Items / s", "organization_url": "Organization"},
+)
+st.plotly_chart(fig_throughput, use_container_width=True)
+
+# ---------------------------------------------
+# RECENT FAILURES
+# ---------------------------------------------
+st.subheader("Recent failures")
+failed_df = runs_df[runs_df["failed"]]
+if failed_df.empty:
+    st.success("No failed runs in this window.")
+else:
+    failed_df = failed_df.assign(
+        error=failed_df["errors"].apply(lambda errs: errs[0]["message"] if errs else "")
+    )
+    st.dataframe(
+        failed_df[["started_at", "ops_user", "organization_url", "project_name", "kind", "error"]],
+        use_container_width=True
+    )
@@ -0,0 +1,103 @@
+import streamlit as st
+from modules.hide_pages import hide_internal_pages
+
+# ---------------------------------------------
+# HIDE PAGES FROM NAV
+# ---------------------------------------------
+hide_internal_pages()
+
+st.set_page_config(page_title="Team Roll-up", layout="wide")
+st.title("Cross-Team Roll-up")
+
+if "logged_in" not in st.session_state:
+    st.session_state["logged_in"] = False
+    st.session_state["user_email"] = None
+
+if not st.session_state["logged_in"]:
+    st.error("You are not logged in.")
+    st.stop()
+
+import pymongo
+import pandas as pd
+from datetime import datetime, timezone
+from modules.chart_data import chart_settings, reduce_points, stacked_area
+from modules.connections import connection_name, user_connections
+from modules.datasets import DATASETS_COLLECTION, user_team
+from modules.forecast import forecast_settings
+from modules.portfolio import summary_row, views_metrics
+
+# Connect to MongoDB
+MONGODB_URI = st.secrets["mongo"]["uri"]
+client = pymongo.MongoClient(MONGODB_URI)
+db = client["insightops"]
+
+user_email = st.session_state["user_email"]
+user = db["users"].find_one({"email": user_email}, {"_id": 0})
+
+# Connections whose access was verified at a sync; the others have no data yet
+views, pending = {}, []
+for connection in user_connections(user):
+    if connection.get("dataset_id"):
+        views[connection_name(connection)] = (connection["dataset_id"], user_team(connection))
+    else:
+        pending.append(connection_name(connection))
+
+if not views:
+    st.info("Add your project/team connections in your settings and refresh the dashboard first.")
+    st.stop()
+if pending:
+    st.caption(f"Not synced yet: {', '.join(pending)}. Refresh the dashboard to include them.")
+
+
+@st.cache_data(ttl=600, show_spinner="Computing metrics...")
+def cached_metrics(view_list, stamp, today):
+    """Summary rows and CFD of synced data; recomputed when a sync, hook or archive run changes a dataset."""
+    metrics = views_metrics(db, list(view_list), datetime.now(timezone.utc), forecast_settings())
+    if metrics is None:
+        return None, None
+    return summary_row(metrics), metrics["cfd_df"]
+
+
+def data_stamp(datasets):
+    docs = db[DATASETS_COLLECTION].find({"_id": {"$in": list(datasets)}},
+                                        {"last_synced_at": 1, "last_event_at": 1, "archived_at": 1})
+    return tuple(sorted((d["_id"], str(d.get("last_synced_at")), str(d.get("last_event_at")), str(d.get("archived_at")))
+                        for d in docs))
+
+
+today = datetime.now(timezone.utc).date()
+
+# ---------------------------------------------
+# ONE ROW PER CONNECTION, PLUS ALL OF THEM
+# ---------------------------------------------
+rows = {}
+for name, view in views.items():
+    row, _ = cached_metrics((view,), data_stamp([view[0]]), today)
+    if row is not None:
+        rows[name] = row
+
+all_views = tuple(dict.fromkeys(views.values()))
+combined_row, combined_cfd = cached_metrics(all_views, data_stamp({ds for ds, _ in all_views}), today)
+if combined_row is None:
+    st.info("No stories or iterations synced for your connections yet.")
+    st.stop()
+rows["All teams"] = combined_row
+
+summary_df = pd.DataFrame.from_dict(rows, orient="index")
+st.dataframe(summary_df, use_container_width=True)
+st.caption("Times are averages over all stories, archived ones included; recent values cover the 30 days "
+           "before each view's latest iteration ends. Each project's stories are counted once.")
+
+# ---------------------------------------------
+# COMBINED CUMULATIVE FLOW
+# ---------------------------------------------
+if combined_cfd is not None:
+    CFD_STATES = ["Done", "In Progress", "To Do"]
+    chart_max_points, chart_method, chart_webgl = chart_settings()
+    chart_df, granularity = reduce_points(combined_cfd, "Date", CFD_STATES, chart_max_points, chart_method)
+    st.plotly_chart(stacked_area(chart_df, "Date", CFD_STATES, "Cumulative Flow Diagram (all teams)",
+                                 "Number of Stories", {"Done": "green", "In Progress": "blue", "To Do": "gray"},
+                                 chart_webgl),
+                    use_container_width=True)
+    if len(chart_df) < len(combined_cfd):
+        st.caption(f"{len(combined_cfd)} days shown as {len(chart_df)} {granularity} points.")
@@ -6,6 +6,12 @@ from datetime import datetime
 from requests.auth import HTTPBasicAuth
 from cryptography.fernet import Fernet
 from modules.hide_pages import hide_internal_pages
+from modules.datasets import unsubscribe
+from modules.api_tokens import MAX_TOKENS_PER_USER, create_api_token, list_api_tokens, revoke_api_token
+from modules.connections import (
+    MAX_CONNECTIONS, add_connection, connection_name, remove_connection, save_active_connection, switch_connection,
+    user_connections
+)
 
 # ---------------------------------------------
 # HIDE PAGES FROM NAV
@@ -54,6 +60,9 @@ def decrypt_pat(encrypted_pat):
 def encrypt_pat(raw_pat):
     return fernet.encrypt(raw_pat.encode()).decode()
 
+if len(user_connections(user_doc)) > 1:
+    st.caption("The organization, project, team and PAT below are those of your active connection.")
+
 with st.form("update_profile_form"):
     org_url = st.text_input("Organization URL", user_doc.get("organization_url", ""))
     project_name = st.text_input("Project Name", user_doc.get("project_name", ""))
@@ -88,12 +97,60 @@ if submit_button:
         if updates:
             updates["updated_at"] = datetime.utcnow()
             with st.spinner("Updating profile..."):
-                users_collection.update_one(user_query, {"$set": updates})
+                save_active_connection(users_collection, user_doc, updates)
             st.success("Profile updated successfully!")
             st.rerun()
         else:
             st.info("No changes were made.")
 
+with st.expander("🔗 Project connections"):
+    st.caption(
+        "Each connection is a project and team the dashboard can show. All of them are synced by ↻ Refresh; "
+        "switch between them from the dashboard's sidebar or here."
+    )
+    for connection in user_connections(user_doc):
+        is_active = connection.get("id") is None or connection["id"] == user_doc.get("active_connection")
+        col1, col2, col3 = st.columns([4, 1, 1])
+        col1.write(
+            f"**{connection_name(connection)}**{' (active)' if is_active else ''} · "
+            f"{connection.get('organization_url')} · {connection.get('project_name')} / {connection.get('team_name')}"
+        )
+        if is_active:
+            continue
+        if col2.button("Switch", key=f"switch_{connection['id']}"):
+            switch_connection(users_collection, user_doc, connection["id"])
+            st.rerun()
+        if col3.button("Remove", key=f"remove_{connection['id']}"):
+            remove_connection(db, user_doc, connection["id"])
+            st.rerun()
+
+    with st.form("add_connection_form", clear_on_submit=True):
+        connection_label = st.text_input("Connection name", placeholder="e.g. Mobile team")
+        new_org_url = st.text_input("Organization URL", user_doc.get("organization_url", ""))
+        new_project_name = st.text_input("Project Name")
+        new_team_name = st.text_input("Team name")
+        new_pat = st.text_input("Personal Access Token", type="password",
+                                help="Leave empty to use the PAT of your active connection.")
+        add_connection_button = st.form_submit_button("Add connection")
+
+    if add_connection_button:
+        if not new_org_url or not new_project_name or not new_team_name:
+            st.warning("You need to provide the Organization URL, Project Name and Team Name.")
+        elif not new_pat and not user_doc.get("pat"):
+            st.warning("You need to provide a PAT.")
+        else:
+            fields = {
+                "organization_url": new_org_url.strip(),
+                "project_name": new_project_name.strip(),
+                "team_name": new_team_name.strip(),
+                "pat": encrypt_pat(new_pat) if new_pat else user_doc.get("pat"),
+            }
+            if add_connection(users_collection, user_doc, connection_label.strip(), fields):
+                st.success("Connection added. Refresh the dashboard to sync it.")
+                st.rerun()
+            else:
+                st.warning(f"You already have {MAX_CONNECTIONS} connections. Remove one first.")
+
 with st.expander("🔒 Reset Password"):
     with st.form("reset_password_form"):
         new_password = st.text_input("New password", type="password")
@@ -118,12 +175,38 @@ with st.expander("🔒 Reset Password"):
             st.success("Password successfully changed!")
             st.rerun()
 
+with st.expander("🔑 API tokens"):
+    st.caption("Tokens give read-only access to your dashboard metrics through the metrics API.")
+    with st.form("create_api_token_form", clear_on_submit=True):
+        token_name = st.text_input("Token name", placeholder="e.g. reporting script")
+        create_token_button = st.form_submit_button("Create token")
+
+    if create_token_button:
+        new_token = create_api_token(users_collection, user_email.lower(), token_name.strip())
+        if new_token:
+            st.success("Token created. Copy it now, it will not be shown again.")
+            st.code(new_token, language=None)
+        else:
+            st.warning(f"You already have {MAX_TOKENS_PER_USER} tokens. Revoke one first.")
+
+    for token in list_api_tokens(users_collection.find_one(user_query, {"api_tokens": 1})):
+        last_used = token.get("last_used_at")
+        col1, col2 = st.columns([4, 1])
+        col1.write(
+            f"**{token['name']}** · created {token['created_at']:%Y-%m-%d} · "
+            f"{'last used ' + format(last_used, '%Y-%m-%d %H:%M') if last_used else 'never used'}"
+        )
+        if col2.button("Revoke", key=f"revoke_{token['id']}"):
+            revoke_api_token(users_collection, user_email.lower(), token["id"])
+            st.rerun()
+
 with st.expander("⚠️ Delete Account"):
     st.error("This action is irreversible.")
     confirm_email = st.text_input("Type your email to confirm account deletion")
 
     if st.button("Delete My Account"):
         if confirm_email.lower() == user_email.lower():
+            unsubscribe(db, user_email.lower())
             users_collection.delete_one(user_query)
             st.success("Account deleted.")
             st.session_state["logged_in"] = False
@@ -133,7 +216,10 @@ with st.expander("⚠️ Delete Account"):
             st.warning("Confirmation email does not match. Account not deleted.")
 
 with st.expander("🧹 Delete My Azure DevOps Data"):
-    st.warning("This will delete all work items and iteration data associated with your account.")
+    st.warning(
+        "This will unsubscribe you from your project's shared work item and iteration data. "
+        "The data itself is deleted once no other user is subscribed to the project."
+    )
     
     confirm_cleanup = st.text_input(
         "Type your email to confirm deletion of associated Azure DevOps data"
@@ -141,17 +227,11 @@ with st.expander("🧹 Delete My Azure DevOps Data"):
 
     if st.button("Delete My ADO Data"):
         if confirm_cleanup.lower() == user_email.lower():
-            # Connect to the two collections
-            workitems_collection = db["ado-workitems"]
-            iterations_collection = db["ado-iterations"]
-
-            # Delete documents where ops_user matches the logged-in user
-            deleted_workitems = workitems_collection.delete_many({"ops_user": user_email.lower()})
-            deleted_iterations = iterations_collection.delete_many({"ops_user": user_email.lower()})
+            deleted_workitems, deleted_iterations = unsubscribe(db, user_email.lower())
 
             st.success(
-                f"Deleted {deleted_workitems.deleted_count} work items and "
-                f"{deleted_iterations.deleted_count} iterations belonging to your account."
+                f"Unsubscribed. Deleted {deleted_workitems} work items and "
+                f"{deleted_iterations} iterations no other user is subscribed to."
             )
         else:
             st.warning("Email does not match. ADO data was NOT deleted.")
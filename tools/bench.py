@@ -0,0 +1,172 @@
+"""Benchmark the dashboard metric stages against synthetic Azure DevOps data.
+
+Usage (from the repository root):
+
+    python -m tools.bench                              # 1k, 10k, 100k and 1M items
+    python -m tools.bench --sizes 1000 10000 --json bench.json
+    python -m tools.bench --mongo-uri mongodb://localhost:27017   # also time Mongo upsert/load
+
+Every stage of `home.py` is timed separately and reported with throughput
+(items per second) and peak Python memory (tracemalloc); `dataframe_build` also
+reports the steady-state size of the work item frame. The dataset is
+generated from a fixed seed so repeated runs are comparable.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from modules.metrics import (
+    ITERATION_PROJECTION, WORKITEM_PROJECTION, build_frames, add_lead_cycle_times, lead_cycle_summary,
+    burnup_counts, burnup_effort, cfd_counts, cfd_effort, estimate_accuracy, frame_memory_mb
+)
+from tools.synthetic_ado import generate_dataset
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+BENCH_DATABASE = "insightops_bench"
+
+
+def _project(docs, projection):
+    """Apply a Mongo-style inclusion projection in memory (used when no Mongo is available)."""
+    fields = [k for k, v in projection.items() if v and k != "_id"]
+    return [{f: d[f] for f in fields if f in d} for d in docs]
+
+
+class StageTimer:
+    """Collect wall time and peak memory for each named stage of one run."""
+
+    def __init__(self, num_items, track_memory=True):
+        self.num_items = num_items
+        self.track_memory = track_memory
+        self.results = []
+
+    def run(self, stage, func, *args, **kwargs):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        peak_mb = None
+        if self.track_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            peak_mb = (peak - base) / (1024 * 1024)
+
+        self.results.append({
+            "items": self.num_items,
+            "stage": stage,
+            "seconds": elapsed,
+            "items_per_second": self.num_items / elapsed if elapsed > 0 else None,
+            "peak_mb": peak_mb
+        })
+        return result
+
+
+def _mongo_roundtrip(mongo_uri, iterations, workitems, timer):
+    """Upsert the dataset the way the refresh modules do, then load it the way home.py does."""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_uri)
+    db = client[BENCH_DATABASE]
+    db.drop_collection("ado-iterations")
+    db.drop_collection("ado-workitems")
+    iterations_col = db["ado-iterations"]
+    workitems_col = db["ado-workitems"]
+    dataset_id = workitems[0]["dataset_id"]
+
+    def upsert_all():
+        for doc in iterations:
+            iterations_col.update_one({"dataset_id": dataset_id, "id": doc["id"]}, {"$set": doc}, upsert=True)
+        for doc in workitems:
+            workitems_col.update_one({"dataset_id": dataset_id, "System_Id": doc["System_Id"]}, {"$set": doc}, upsert=True)
+
+    def load_all():
+        return (
+            list(iterations_col.find({"dataset_id": dataset_id}, ITERATION_PROJECTION)),
+            list(workitems_col.find({"dataset_id": dataset_id}, WORKITEM_PROJECTION))
+        )
+
+    try:
+        timer.run("mongo_upsert", upsert_all)
+        return timer.run("mongo_load", load_all)
+    finally:
+        client.drop_database(BENCH_DATABASE)
+        client.close()
+
+
+def run_size(num_items, seed=42, mongo_uri=None, track_memory=True):
+    """Run every stage once for a dataset of `num_items` work items and return the stage results."""
+    iterations, workitems = generate_dataset(num_items, seed=seed)
+    timer = StageTimer(num_items, track_memory=track_memory)
+
+    if mongo_uri:
+        loaded_iterations, loaded_workitems = _mongo_roundtrip(mongo_uri, iterations, workitems, timer)
+    else:
+        loaded_iterations = _project(iterations, ITERATION_PROJECTION)
+        loaded_workitems = _project(workitems, WORKITEM_PROJECTION)
+    del iterations, workitems
+
+    iterations_df, workitems_df = timer.run("dataframe_build", build_frames, loaded_iterations, loaded_workitems)
+    timer.results[-1]["frame_mb"] = frame_memory_mb(workitems_df)
+    del loaded_iterations, loaded_workitems
+
+    now = datetime.now(timezone.utc)
+
+    def lead_cycle():
+        add_lead_cycle_times(workitems_df, now)
+        return lead_cycle_summary(iterations_df, workitems_df)
+
+    summary = timer.run("lead_cycle_time", lead_cycle)
+
+    def burnup():
+        burnup_counts(iterations_df, workitems_df)
+        burnup_effort(iterations_df, workitems_df)
+
+    timer.run("burnup", burnup)
+    timer.run("cfd_counts", cfd_counts, workitems_df)
+    timer.run("cfd_effort", cfd_effort, workitems_df)
+    timer.run("estimate_accuracy", estimate_accuracy, workitems_df, summary["latest_iteration"])
+
+    return timer.results
+
+
+def format_results(results):
+    lines = [f"{'items':>9}  {'stage':<18} {'seconds':>10} {'items/s':>12} {'peak MB':>9} {'frame MB':>9}"]
+    for r in results:
+        rate = f"{r['items_per_second']:,.0f}" if r["items_per_second"] else "-"
+        peak = f"{r['peak_mb']:.1f}" if r["peak_mb"] is not None else "-"
+        frame = f"{r['frame_mb']:.1f}" if r.get("frame_mb") is not None else "-"
+        lines.append(f"{r['items']:>9,}  {r['stage']:<18} {r['seconds']:>10.3f} {rate:>12} {peak:>9} {frame:>9}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark InsightOps dashboard metrics on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Work item counts to run.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic dataset generator.")
+    parser.add_argument("--mongo-uri", help="MongoDB URI; enables the mongo_upsert and mongo_load stages.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (faster, no peak memory).")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    track_memory = not args.no_memory
+    if track_memory:
+        tracemalloc.start()
+
+    all_results = []
+    for size in args.sizes:
+        results = run_size(size, seed=args.seed, mongo_uri=args.mongo_uri, track_memory=track_memory)
+        print(format_results(results), flush=True)
+        print()
+        all_results.extend(results)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"seed": args.seed, "results": all_results}, f, indent=2)
+
+    return all_results
+
+
+if __name__ == "__main__":
+    main()
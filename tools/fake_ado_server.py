@@ -0,0 +1,397 @@
+"""Local stand-in for the Azure DevOps REST endpoints used by the refresh modules.
+
+Serves WIQL, work items (GET and workitemsbatch), work item updates, team
+iterations and the project lookup used for access checks for a seeded synthetic project, plus the OPTIONS / resource-area
+discovery calls `azure.devops.connection.Connection` makes first. Point a user's
+organization URL at it to run `refresh_work_items` / `refresh_iterations` offline:
+
+    python -m tools.fake_ado_server --items 50000 --latency-ms 40 --throttle-probability 0.05
+
+    organization_url = http://127.0.0.1:8765/synthetic-org
+    project_name     = Synthetic
+    team_name        = Synthetic Team
+    pat              = anything
+
+`GET /_fake/stats` returns request, throttle and byte counters; `POST /_fake/reset`
+clears them.
+"""
+import argparse
+import base64
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from tools.synthetic_ado import generate_dataset
+
+# Resource locations advertised to the SDK (ids match azure-devops v7.x clients)
+RESOURCE_LOCATIONS = [
+    {"id": "e81700f7-3be2-46de-8624-2eb35882fcaa", "area": "Location", "resourceName": "ResourceAreas",
+     "routeTemplate": "_apis/{resource}/{areaId}"},
+    {"id": "1a9c53f7-f243-4447-b110-35ef023636e4", "area": "wit", "resourceName": "wiql",
+     "routeTemplate": "{project}/{team}/_apis/{area}/{resource}/{id}"},
+    {"id": "72c7ddf8-2cdc-4f60-90cd-ab71c14a399b", "area": "wit", "resourceName": "workItems",
+     "routeTemplate": "{project}/_apis/{area}/{resource}/{id}"},
+    {"id": "908509b6-4248-4475-a1cd-829139ba419f", "area": "wit", "resourceName": "workItemsBatch",
+     "routeTemplate": "{project}/_apis/{area}/{resource}"},
+    {"id": "6570bf97-d02c-4a91-8d93-3abe9895b1a9", "area": "wit", "resourceName": "updates",
+     "routeTemplate": "{project}/_apis/{area}/workItems/{id}/{resource}/{updateNumber}"},
+    {"id": "c9175577-28a1-4b06-9197-8636af9f64ad", "area": "work", "resourceName": "iterations",
+     "routeTemplate": "{project}/{team}/_apis/{area}/teamsettings/{resource}/{id}"},
+]
+for _location in RESOURCE_LOCATIONS:
+    _location.update({"minVersion": "1.0", "maxVersion": "7.1", "releasedVersion": "7.1", "resourceVersion": 3})
+
+WIQL_PROJECT = re.compile(r"\[System\.TeamProject\]\s*=\s*'([^']*)'", re.IGNORECASE)
+WIQL_ITERATION = re.compile(r"\[System\.IterationPath\]\s*=\s*'([^']*)'", re.IGNORECASE)
+WIQL_TYPES = re.compile(r"\[System\.WorkItemType\]\s+IN\s*\(([^)]*)\)", re.IGNORECASE)
+
+
+def _field_name(key):
+    """Undo `sanitize_keys`: stored `Microsoft_VSTS_Common_ClosedDate` -> `Microsoft.VSTS.Common.ClosedDate`."""
+    return key.replace("_", ".")
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeAdoState:
+    """Dataset, behaviour knobs and counters shared by all request handler threads."""
+
+    def __init__(self, items=10_000, seed=42, project="Synthetic", team="Synthetic Team", pat=None,
+                 latency_ms=0, jitter_ms=0, throttle_probability=0.0, max_rps=None, retry_after=1,
+                 max_batch=200, wiql_limit=None, updates_page_size=200, use_gzip=True):
+        self.project = project
+        self.team = team
+        self.pat = pat
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_probability = throttle_probability
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.max_batch = max_batch
+        self.wiql_limit = wiql_limit
+        self.updates_page_size = updates_page_size
+        self.use_gzip = use_gzip
+
+        self.iterations, workitems = generate_dataset(items, seed=seed, project=project)
+        self.workitems = {doc["System_Id"]: doc for doc in workitems}
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "throttled": 0, "bytes_sent": 0, "work_items_served": 0, "by_endpoint": {}}
+
+    def record(self, endpoint, sent_bytes, work_items=0):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_sent"] += sent_bytes
+            self.stats["work_items_served"] += work_items
+            self.stats["by_endpoint"][endpoint] = self.stats["by_endpoint"].get(endpoint, 0) + 1
+
+    def should_throttle(self):
+        """Decide whether this request gets a 429, by probability and/or a requests-per-second cap."""
+        with self._lock:
+            if self.max_rps:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                if self._window_count > self.max_rps:
+                    self.stats["throttled"] += 1
+                    return True
+            if self.throttle_probability and self._rng.random() < self.throttle_probability:
+                self.stats["throttled"] += 1
+                return True
+        return False
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            with self._lock:
+                jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+            time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    # ------------------------------------------------------------------
+    # Response bodies
+    # ------------------------------------------------------------------
+    def work_item(self, doc, fields=None):
+        all_fields = {_field_name(k): v for k, v in doc.items() if k != "dataset_id"}
+        if fields:
+            all_fields = {k: v for k, v in all_fields.items() if k in fields}
+        return {"id": doc["System_Id"], "rev": 3, "fields": all_fields,
+                "url": f"/_apis/wit/workItems/{doc['System_Id']}"}
+
+    def query_ids(self, query):
+        project = WIQL_PROJECT.search(query)
+        iteration = WIQL_ITERATION.search(query)
+        types = WIQL_TYPES.search(query)
+        type_set = {t.strip().strip("'") for t in types.group(1).split(",")} if types else None
+
+        ids = []
+        for item_id, doc in self.workitems.items():
+            if project and doc["System_TeamProject"] != project.group(1):
+                continue
+            if iteration and doc["System_IterationPath"] != iteration.group(1):
+                continue
+            if type_set and doc["System_WorkItemType"] not in type_set:
+                continue
+            ids.append(item_id)
+        return ids
+
+    def updates(self, doc):
+        """Synthesize the New -> Active -> Closed revision history of a work item."""
+        revisions = [("System_CreatedDate", None, "New")]
+        if doc.get("Microsoft_VSTS_Common_ActivatedDate"):
+            revisions.append(("Microsoft_VSTS_Common_ActivatedDate", "New", "Active"))
+        if doc.get("Microsoft_VSTS_Common_ClosedDate"):
+            revisions.append(("Microsoft_VSTS_Common_ClosedDate", revisions[-1][2], "Closed"))
+
+        updates = []
+        for rev, (date_field, old_state, new_state) in enumerate(revisions, start=1):
+            state_change = {"newValue": new_state}
+            if old_state:
+                state_change["oldValue"] = old_state
+            updates.append({
+                "id": rev, "rev": rev, "workItemId": doc["System_Id"], "revisedDate": doc[date_field],
+                "fields": {"System.State": state_change, _field_name(date_field): {"newValue": doc[date_field]}}
+            })
+        return updates
+
+    def team_iterations(self):
+        now = self.iterations[-1]["startDate"] - timedelta(days=14)
+        values = []
+        for it in self.iterations:
+            time_frame = "past" if it["finishDate"] < now else ("current" if it["startDate"] <= now else "future")
+            values.append({
+                "id": it["id"], "name": it["name"], "path": it["path"],
+                "attributes": {"startDate": _iso(it["startDate"]), "finishDate": _iso(it["finishDate"]),
+                               "timeFrame": time_frame},
+                "url": f"/_apis/work/teamsettings/iterations/{it['id']}"
+            })
+        return values
+
+
+class FakeAdoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    # ------------------------------------------------------------------
+    # Plumbing
+    # ------------------------------------------------------------------
+    def _send_json(self, status, body, endpoint, work_items=0, headers=None):
+        payload = json.dumps(body).encode()
+        extra = dict(headers or {})
+        if self.state.use_gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload)
+            extra["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in extra.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.state.record(endpoint, len(payload), work_items)
+
+    def _error(self, status, message, endpoint, headers=None):
+        self._send_json(status, {"$id": "1", "message": message, "typeKey": "FakeAdoError"}, endpoint, headers=headers)
+
+    def _collection(self, values, endpoint, work_items=0):
+        self._send_json(200, {"count": len(values), "value": values}, endpoint, work_items)
+
+    def _read_body(self):
+        if self._body is None:
+            length = int(self.headers.get("Content-Length") or 0)
+            self._body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        return self._body
+
+    def _authorized(self):
+        if not self.state.pat:
+            return True
+        expected = "Basic " + base64.b64encode(f":{self.state.pat}".encode()).decode()
+        return self.headers.get("Authorization") == expected
+
+    def _route(self):
+        """Split `/{org}/{project?}/{team?}/_apis/{rest...}` into its parts."""
+        parts = urlsplit(self.path)
+        segments = [unquote(s) for s in parts.path.strip("/").split("/") if s]
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        if "_apis" not in segments:
+            return segments, [], query
+        idx = segments.index("_apis")
+        scope = segments[1:idx]  # drop organization
+        return scope, [s.lower() for s in segments[idx + 1:]], query
+
+    def _handle(self, method):
+        # Consume the body up front so early error replies leave a kept-alive connection clean
+        self._body = None
+        self._read_body()
+        scope, api, query = self._route()
+
+        if api[:1] == [] and scope[:1] == ["_fake"]:
+            return self._fake_control(method, scope[1:])
+        if method == "OPTIONS" and not api:
+            return self._collection(RESOURCE_LOCATIONS, "options")
+        if not self._authorized():
+            return self._error(401, "Unauthorized", "unauthorized")
+
+        endpoint = "/".join(a for a in api if not a.isdigit())[:40]
+        self.state.delay()
+        if self.state.should_throttle():
+            return self._error(429, "TF400733: Request was blocked due to exceeding usage of resource.",
+                               endpoint, headers={"Retry-After": str(self.state.retry_after)})
+
+        if api[:1] == ["resourceareas"]:
+            return self._collection([], "resourceareas")
+        if method == "POST" and api[:2] == ["wit", "wiql"]:
+            return self._wiql()
+        if method == "GET" and api[:2] == ["wit", "workitems"] and len(api) == 2:
+            return self._work_items(query)
+        if method == "POST" and api[:2] == ["wit", "workitemsbatch"]:
+            return self._work_items_batch()
+        if method == "GET" and api[:2] == ["wit", "workitems"] and api[3:4] == ["updates"]:
+            return self._updates(int(api[2]), query)
+        if method == "GET" and api[:3] == ["work", "teamsettings", "iterations"]:
+            return self._iterations(scope)
+        if method == "GET" and api[:1] == ["projects"] and len(api) == 2:
+            return self._project(api[1])
+        return self._error(404, f"No fake route for {method} {self.path}", "not_found")
+
+    def _fake_control(self, method, scope):
+        if method == "GET" and scope == ["stats"]:
+            return self._send_json(200, self.state.stats, "_fake")
+        if method == "POST" and scope == ["reset"]:
+            self.state.reset_stats()
+            return self._send_json(200, {"reset": True}, "_fake")
+        return self._error(404, "Unknown control endpoint", "_fake")
+
+    # ------------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------------
+    def _wiql(self):
+        query = self._read_body().get("query", "")
+        ids = self.state.query_ids(query)
+        if self.state.wiql_limit and len(ids) > self.state.wiql_limit:
+            return self._error(400, f"VS402337: The number of work items returned exceeds the size limit "
+                                    f"of {self.state.wiql_limit}.", "wit/wiql")
+        body = {
+            "queryType": "flat", "queryResultType": "workItem", "asOf": _iso(datetime.now(timezone.utc)),
+            "columns": [{"referenceName": "System.Id", "name": "ID"}],
+            "workItems": [{"id": i, "url": f"/_apis/wit/workItems/{i}"} for i in ids]
+        }
+        self._send_json(200, body, "wit/wiql")
+
+    def _serve_items(self, ids, fields, endpoint):
+        if len(ids) > self.state.max_batch:
+            return self._error(400, f"VS403474: The maximum number of work items in a batch is "
+                                    f"{self.state.max_batch}.", endpoint)
+        docs = [self.state.workitems[i] for i in ids if i in self.state.workitems]
+        self._collection([self.state.work_item(d, fields) for d in docs], endpoint, work_items=len(docs))
+
+    def _work_items(self, query):
+        ids = [int(i) for i in query.get("ids", "").split(",") if i]
+        fields = set(query["fields"].split(",")) if query.get("fields") else None
+        self._serve_items(ids, fields, "wit/workitems")
+
+    def _work_items_batch(self):
+        body = self._read_body()
+        fields = set(body["fields"]) if body.get("fields") else None
+        self._serve_items([int(i) for i in body.get("ids", [])], fields, "wit/workitemsbatch")
+
+    def _updates(self, item_id, query):
+        doc = self.state.workitems.get(item_id)
+        if not doc:
+            return self._error(404, f"TF401232: Work item {item_id} does not exist.", "wit/updates")
+        top = min(int(query.get("$top", self.state.updates_page_size)), self.state.updates_page_size)
+        skip = int(query.get("$skip", 0))
+        self._collection(self.state.updates(doc)[skip:skip + top], "wit/updates")
+
+    def _iterations(self, scope):
+        if scope[:1] and scope[0] != self.state.project:
+            return self._error(404, f"TF200016: The project '{scope[0]}' does not exist.", "work/iterations")
+        self._collection(self.state.team_iterations(), "work/iterations")
+
+    def _project(self, name):
+        if name != self.state.project.lower():
+            return self._error(404, f"TF200016: The project '{name}' does not exist.", "projects")
+        self._send_json(200, {"id": "00000000-0000-0000-0000-000000000001", "name": self.state.project,
+                              "state": "wellFormed", "visibility": "private"}, "projects")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_OPTIONS(self):
+        self._handle("OPTIONS")
+
+
+def make_server(state, host="127.0.0.1", port=8765):
+    handler = type("BoundFakeAdoHandler", (FakeAdoHandler,), {"state": state})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_in_thread(state, host="127.0.0.1", port=0, organization="synthetic-org"):
+    """Start the fake server on a background thread; returns `(server, organization_url)`."""
+    server = make_server(state, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/{organization}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local Azure DevOps stand-in for ingestion load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=10_000, help="Number of synthetic work items to serve.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--project", default="Synthetic")
+    parser.add_argument("--team", default="Synthetic Team")
+    parser.add_argument("--pat", help="Only accept this PAT (default: accept any).")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency per API call.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Uniform +/- jitter on the latency.")
+    parser.add_argument("--throttle-probability", type=float, default=0.0, help="Chance of a 429 per call.")
+    parser.add_argument("--max-rps", type=int, help="Answer 429 above this many requests per second.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s.")
+    parser.add_argument("--max-batch", type=int, default=200, help="Max ids per work item batch (ADO: 200).")
+    parser.add_argument("--wiql-limit", type=int, help="Fail WIQL queries above this many results (ADO: 20000).")
+    parser.add_argument("--updates-page-size", type=int, default=200, help="Max updates returned per page.")
+    parser.add_argument("--no-gzip", action="store_true", help="Never gzip responses.")
+    args = parser.parse_args(argv)
+
+    state = FakeAdoState(
+        items=args.items, seed=args.seed, project=args.project, team=args.team, pat=args.pat,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, throttle_probability=args.throttle_probability,
+        max_rps=args.max_rps, retry_after=args.retry_after, max_batch=args.max_batch,
+        wiql_limit=args.wiql_limit, updates_page_size=args.updates_page_size, use_gzip=not args.no_gzip
+    )
+    server = make_server(state, args.host, args.port)
+    print(f"Fake Azure DevOps serving {args.items} work items at http://{args.host}:{args.port}/synthetic-org "
+          f"(project '{args.project}', team '{args.team}')", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Offline stand-in for `google.generativeai.GenerativeModel`.
+
+Enable it in `.streamlit/secrets.toml` to exercise the AI Insights section without
+network access or quota, with controllable latency:
+
+    [ai]
+    fake_model = true
+    fake_first_token_seconds = 2.0
+    fake_tokens_per_second = 30
+
+Only `generate_content(prompt, stream=...)` and the `.text` attribute of responses
+and stream chunks are implemented, which is all `modules.ai_insights` uses.
+"""
+import time
+
+DEFAULT_TEXT = (
+    "**Performance trends:** Lead and cycle time are stable across recent iterations.\n\n"
+    "**Bottlenecks:** Work in progress is high relative to team capacity, which stretches cycle time.\n\n"
+    "**Recommendations:** Limit WIP per person, split stories above 8 points and review estimates "
+    "in a short refinement workshop.\n\n"
+    "_This analysis was produced by the local fake model._"
+)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Returns canned text after `first_token_seconds`, then streams words at `tokens_per_second`."""
+
+    def __init__(self, model_name="fake-gemini", first_token_seconds=1.0, tokens_per_second=40, text=DEFAULT_TEXT):
+        self.model_name = model_name
+        self.first_token_seconds = first_token_seconds
+        self.tokens_per_second = tokens_per_second
+        self.text = text
+        self.prompts = []
+
+    def _tokens(self):
+        words = self.text.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def _stream(self):
+        time.sleep(self.first_token_seconds)
+        for token in self._tokens():
+            yield FakeResponse(token)
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.prompts.append(prompt)
+        if stream:
+            return self._stream()
+        time.sleep(self.first_token_seconds)
+        if self.tokens_per_second:
+            time.sleep(len(self._tokens()) / self.tokens_per_second)
+        return FakeResponse(self.text)
@@ -0,0 +1,190 @@
+"""Local SMTP stand-in for the email outbox (`modules/email_outbox.py`).
+
+Speaks EHLO/HELO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP and QUIT (no
+STARTTLS), keeps the received messages in memory and can fail on purpose:
+
+    python -m tools.fake_smtp_server --port 8025 --fail-probability 0.2 --reject @bounce.example
+
+    [google_smtp]
+    server   = "127.0.0.1"
+    port     = 8025
+    email    = "insightops@example.com"
+    password = "anything"
+    starttls = false
+
+Failed DATA commands answer 451 (retried by the outbox), rejected recipients
+550 (not retried). `--drop-after N` closes each connection after N messages,
+like a server timing out an idle client. Counters are printed on exit.
+"""
+import argparse
+import base64
+import random
+import socketserver
+import threading
+from email import message_from_string
+
+
+class FakeSmtpState:
+    """Messages and counters shared by the connections of one fake server."""
+
+    def __init__(self, password=None, fail_probability=0.0, reject=None, drop_after=None, seed=42, verbose=False):
+        self.password = password
+        self.fail_probability = fail_probability
+        self.reject = reject
+        self.drop_after = drop_after
+        self.verbose = verbose
+        self.messages = []
+        self.stats = {"connections": 0, "logins": 0, "messages": 0, "failed": 0, "rejected": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.fail_probability
+
+    def store(self, mail_from, rcpts, data):
+        message = message_from_string(data)
+        with self._lock:
+            self.messages.append({"from": mail_from, "to": list(rcpts), "subject": message["Subject"],
+                                  "body": message.get_payload(), "data": data})
+            self.stats["messages"] += 1
+        if self.verbose:
+            print(f"{', '.join(rcpts)}: {message['Subject']}", flush=True)
+
+
+class FakeSmtpHandler(socketserver.StreamRequestHandler):
+    state = None  # set by make_server
+
+    def _reply(self, code, text):
+        self.wfile.write(f"{code} {text}\r\n".encode())
+
+    def _auth_plain(self, credentials):
+        try:
+            _, _, password = base64.b64decode(credentials).decode().split("\0")
+        except ValueError:
+            return self._reply(501, "Malformed AUTH PLAIN")
+        if self.state.password is not None and password != self.state.password:
+            return self._reply(535, "Authentication credentials invalid")
+        self.state.count("logins")
+        self._reply(235, "Authentication successful")
+
+    def _read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline().decode()
+            if not line or line in (".\r\n", ".\n"):
+                return "".join(lines)
+            lines.append(line[1:] if line.startswith("..") else line)
+
+    def handle(self):
+        state = self.state
+        state.count("connections")
+        self._reply(220, "fake-smtp ready")
+        mail_from, rcpts, delivered = None, [], 0
+        while True:
+            line = self.rfile.readline().decode()
+            if not line:
+                return
+            command, _, arg = line.rstrip("\r\n").partition(" ")
+            command = command.upper()
+
+            if command == "EHLO":
+                self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif command == "HELO":
+                self._reply(250, "fake-smtp")
+            elif command == "AUTH":
+                mechanism, _, credentials = arg.partition(" ")
+                if mechanism.upper() != "PLAIN":
+                    self._reply(504, "Only AUTH PLAIN is supported")
+                elif not credentials:
+                    self._reply(334, "")
+                    self._auth_plain(self.rfile.readline().strip())
+                else:
+                    self._auth_plain(credentials)
+            elif command == "MAIL":
+                mail_from, rcpts = arg.partition(":")[2].strip(" <>"), []
+                self._reply(250, "OK")
+            elif command == "RCPT":
+                rcpt = arg.partition(":")[2].strip(" <>")
+                if state.reject and state.reject in rcpt:
+                    state.count("rejected")
+                    self._reply(550, f"No such user: {rcpt}")
+                else:
+                    rcpts.append(rcpt)
+                    self._reply(250, "OK")
+            elif command == "DATA":
+                if not rcpts:
+                    self._reply(503, "Need RCPT first")
+                    continue
+                self._reply(354, "End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                if state.should_fail():
+                    state.count("failed")
+                    self._reply(451, "Temporary local problem, try again later")
+                else:
+                    state.store(mail_from, rcpts, data)
+                    self._reply(250, "OK: queued")
+                    delivered += 1
+                mail_from, rcpts = None, []
+                if state.drop_after and delivered >= state.drop_after:
+                    return
+            elif command == "RSET":
+                mail_from, rcpts = None, []
+                self._reply(250, "OK")
+            elif command == "NOOP":
+                self._reply(250, "OK")
+            elif command == "QUIT":
+                self._reply(221, "Bye")
+                return
+            else:
+                self._reply(502, "Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def make_server(state, host="127.0.0.1", port=8025):
+    handler = type("BoundFakeSmtpHandler", (FakeSmtpHandler,), {"state": state})
+    return _Server((host, port), handler)
+
+
+def start_in_thread(state, host="127.0.0.1", port=0):
+    """Start the fake server on a background thread; returns `(server, port)`."""
+    server = make_server(state, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local SMTP stand-in for the email outbox.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--password", help="Only accept this password (default: accept any).")
+    parser.add_argument("--fail-probability", type=float, default=0.0, help="Chance of a 451 reply to DATA.")
+    parser.add_argument("--reject", help="Refuse recipients containing this text with 550.")
+    parser.add_argument("--drop-after", type=int, help="Close each connection after this many messages.")
+    parser.add_argument("--quiet", action="store_true", help="Do not print received messages.")
+    args = parser.parse_args(argv)
+
+    state = FakeSmtpState(password=args.password, fail_probability=args.fail_probability,
+                          reject=args.reject, drop_after=args.drop_after, verbose=not args.quiet)
+    server = make_server(state, args.host, args.port)
+    print(f"Fake SMTP server listening on {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(state.stats)
+
+
+if __name__ == "__main__":
+    main()
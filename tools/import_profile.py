@@ -0,0 +1,113 @@
+"""Profile module-level import time of every Streamlit page.
+
+Usage (from the repository root):
+
+    python -m tools.import_profile            # all pages
+    python -m tools.import_profile home.py --top 15
+
+For each page the top-level imports are replayed in a fresh interpreter with
+`python -X importtime`. Imports inside top-level `with` / `try` blocks count;
+those in `if` branches or functions are lazy and are skipped. Two numbers are
+reported: the cost of every top-level import, and the cost of the imports that run before the page's login gate
+(the first top-level statement that calls `st.stop()`), which is what an
+unauthenticated visitor pays on a cold start.
+"""
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _calls_st_stop(node):
+    for child in ast.walk(node):
+        if (isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+                and child.func.attr == "stop"):
+            return True
+    return False
+
+
+def _unconditional_imports(node):
+    """Imports a top-level statement always executes (including inside `with` / `try` bodies)."""
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return [node]
+    if isinstance(node, (ast.With, ast.Try)):
+        found = []
+        for child in node.body:
+            found.extend(_unconditional_imports(child))
+        return found
+    return []
+
+
+def page_imports(path):
+    """Return `(all_imports, imports_before_gate)` as lists of import statements (source text)."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source)
+
+    all_imports, before_gate = [], []
+    gated = False
+    for node in tree.body:
+        statements = [ast.get_source_segment(source, n) for n in _unconditional_imports(node)]
+        all_imports.extend(statements)
+        if not gated:
+            before_gate.extend(statements)
+        if not gated and _calls_st_stop(node):
+            gated = True
+    return all_imports, before_gate
+
+
+def measure(import_statements, exclude=()):
+    """Run the statements under `-X importtime`; return (total_us, {top-level package: cumulative_us}).
+
+    Packages named in `exclude` (interpreter start-up imports) are left out.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(import_statements) or "pass"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        # Top-level entries are not indented in the importtime tree
+        name = raw_name.strip()
+        if not raw_name.startswith("  ") and name not in exclude:
+            packages[name] = packages.get(name, 0) + int(cumulative)
+    return sum(packages.values()), packages
+
+
+def profile_page(path, top=10, baseline=()):
+    all_imports, before_gate = page_imports(path)
+    total_us, packages = measure(all_imports, exclude=baseline)
+    gate_us, _ = measure(before_gate, exclude=baseline)
+    heaviest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {"page": os.path.relpath(path, REPO_ROOT), "all_ms": total_us / 1000,
+            "before_gate_ms": gate_us / 1000, "heaviest": heaviest}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile module-level import time of each Streamlit page.")
+    parser.add_argument("pages", nargs="*", help="Page files (default: home.py and pages/*.py).")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest packages to list per page.")
+    args = parser.parse_args(argv)
+
+    pages = args.pages or [os.path.join(REPO_ROOT, "home.py")] + sorted(glob.glob(os.path.join(REPO_ROOT, "pages", "*.py")))
+    _, startup = measure([])
+    for path in pages:
+        report = profile_page(os.path.abspath(path), top=args.top, baseline=set(startup))
+        print(f"{report['page']}: {report['all_ms']:.0f} ms top-level imports, "
+              f"{report['before_gate_ms']:.0f} ms before login gate")
+        for name, us in report["heaviest"]:
+            print(f"    {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""One-off migration from per-user copies (`ops_user`) to shared per-project datasets.
+
+Usage (from the repository root, reads `.streamlit/secrets.toml`):
+
+    python -m tools.migrate_shared_datasets --dry-run
+    python -m tools.migrate_shared_datasets
+
+Every user with an organization URL and project gets a `dataset_id` and is added
+to that dataset's subscribers. Their `ado-workitems` / `ado-iterations` copies
+are folded into the dataset: per work item the most recently changed copy is
+kept, per iteration the first one (tagged with the user's team), and the other
+copies are deleted. PAT access is not checked here; the dashboard verifies it on
+each user's next visit. Safe to run more than once.
+"""
+import argparse
+from collections import Counter
+from datetime import datetime, timezone
+
+from modules.datasets import DATASETS_COLLECTION, ensure_dataset_indexes, user_dataset_id, user_team
+from modules.sync_state import SYNC_STATE_COLLECTION
+
+
+def _fold(col, doc, ds, key_field, newer=None, extra_update=None):
+    """Keep `doc` as the dataset copy or delete it; returns "kept", "replaced" or "dropped"."""
+    existing = col.find_one({"dataset_id": ds, key_field: doc[key_field]})
+    status = "kept"
+    if existing is not None and existing["_id"] != doc["_id"]:
+        if newer is None or not newer(doc, existing):
+            col.delete_one({"_id": doc["_id"]})
+            return "dropped"
+        col.delete_one({"_id": existing["_id"]})
+        status = "replaced"
+
+    update = {"$set": {"dataset_id": ds}, "$unset": {"ops_user": ""}}
+    update.update(extra_update or {})
+    col.update_one({"_id": doc["_id"]}, update)
+    return status
+
+
+def _changed_later(doc, existing):
+    return str(doc.get("System_ChangedDate") or "") > str(existing.get("System_ChangedDate") or "")
+
+
+def migrate(db, dry_run=False):
+    """Move every user's copies into shared datasets; returns counters of what was (or would be) done."""
+    stats = Counter()
+    datasets = set()
+    users_col = db["users"]
+    workitems_col = db["ado-workitems"]
+    iterations_col = db["ado-iterations"]
+    now = datetime.now(timezone.utc)
+
+    users = list(users_col.find(
+        {"organization_url": {"$nin": [None, ""]}, "project_name": {"$nin": [None, ""]}},
+        {"email": 1, "organization_url": 1, "project_name": 1, "team_name": 1}
+    ))
+    if not dry_run:
+        ensure_dataset_indexes(db)
+
+    for user in users:
+        ds = user_dataset_id(user)
+        email = user["email"]
+        datasets.add(ds)
+        stats["users"] += 1
+
+        if dry_run:
+            stats["workitems_to_fold"] += workitems_col.count_documents({"ops_user": email})
+            stats["iterations_to_fold"] += iterations_col.count_documents({"ops_user": email})
+            continue
+
+        users_col.update_one({"_id": user["_id"]}, {"$set": {"dataset_id": ds}})
+        db[DATASETS_COLLECTION].update_one(
+            {"_id": ds},
+            {
+                "$setOnInsert": {
+                    "organization_url": user["organization_url"],
+                    "project_name": user["project_name"],
+                    "created_at": now,
+                },
+                "$addToSet": {"subscribers": email},
+            },
+            upsert=True
+        )
+
+        for doc in workitems_col.find({"ops_user": email}, {"_id": 1, "System_Id": 1, "System_ChangedDate": 1}):
+            stats["workitems_" + _fold(workitems_col, doc, ds, "System_Id", newer=_changed_later)] += 1
+
+        team = user_team(user)
+        for doc in iterations_col.find({"ops_user": email}, {"_id": 1, "id": 1}):
+            status = _fold(iterations_col, doc, ds, "id", extra_update={"$addToSet": {"teams": team}})
+            if status == "dropped":
+                iterations_col.update_one({"dataset_id": ds, "id": doc["id"]}, {"$addToSet": {"teams": team}})
+            stats["iterations_" + status] += 1
+
+    stats["datasets"] = len(datasets)
+    # Per-user checkpoints cannot be resumed against the shared documents
+    if not dry_run:
+        stats["sync_states_dropped"] = db[SYNC_STATE_COLLECTION].delete_many({"ops_user": {"$exists": True}}).deleted_count
+    return stats
+
+
+def main(argv=None):
+    import streamlit as st
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Fold per-user ADO copies into shared per-project datasets.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would change.")
+    args = parser.parse_args(argv)
+
+    db = MongoClient(st.secrets["mongo"]["uri"])[st.secrets["mongo"].get("db_name", "insightops")]
+    stats = migrate(db, dry_run=args.dry_run)
+    for key, value in sorted(stats.items()):
+        print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
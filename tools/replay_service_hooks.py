@@ -0,0 +1,63 @@
+"""Replay Azure DevOps service-hook payloads against a running receiver.
+
+Usage (from the repository root):
+
+    python -m modules.service_hooks --port 8787          # in another terminal
+    python -m tools.replay_service_hooks --secret s3cret
+    python -m tools.replay_service_hooks --secret s3cret --base-url http://localhost:8765 \\
+        tools/sample_hooks/workitem_updated.json
+
+Without files the samples in `tools/sample_hooks/` are sent in order (created,
+updated, deleted). `--base-url` rewrites the organization URL in the payloads,
+e.g. to hit a dataset synced from `tools.fake_ado_server`.
+"""
+import argparse
+import json
+from pathlib import Path
+
+import requests
+
+from modules.service_hooks import HOOK_PATH, SECRET_HEADER
+
+SAMPLE_DIR = Path(__file__).parent / "sample_hooks"
+SAMPLE_ORDER = ["workitem_created.json", "workitem_updated.json", "workitem_deleted.json"]
+
+
+def load_payload(path, base_url=None):
+    payload = json.loads(Path(path).read_text())
+    if base_url:
+        for container in (payload.get("resourceContainers") or {}).values():
+            container["baseUrl"] = base_url.rstrip("/") + "/"
+    return payload
+
+
+def replay(url, paths, secret=None, base_url=None, timeout=10):
+    """POST each payload to `url`; returns a list of `(path, http_status, response_json)`."""
+    headers = {SECRET_HEADER: secret} if secret else {}
+    results = []
+    with requests.Session() as session:
+        for path in paths:
+            response = session.post(url, json=load_payload(path, base_url), headers=headers, timeout=timeout)
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            results.append((str(path), response.status_code, body))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send sample service-hook payloads to the receiver.")
+    parser.add_argument("files", nargs="*", help="Payload files (default: the samples in tools/sample_hooks).")
+    parser.add_argument("--url", default=f"http://localhost:8787{HOOK_PATH}")
+    parser.add_argument("--secret", help="Value of the shared secret header.")
+    parser.add_argument("--base-url", help="Organization URL to put into the payloads.")
+    args = parser.parse_args(argv)
+
+    paths = args.files or [SAMPLE_DIR / name for name in SAMPLE_ORDER]
+    for path, status, body in replay(args.url, paths, args.secret, args.base_url):
+        print(f"{status} {Path(path).name}: {body}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# Fibonacci effort scale used by the teams (see AI prompt in home.py)
+EFFORT_SCALE = [1, 2, 3, 5, 8, 13, 21]
+
+# Relative frequency of work item types in a typical backlog
+TYPE_WEIGHTS = {"User Story": 70, "Product Backlog Item": 10, "Bug": 20}
+
+STATES_OPEN = ["New", "Active", "Resolved"]
+
+# Shared dataset id the generated documents belong to (see modules/datasets.py)
+SYNTHETIC_DATASET = "https://dev.azure.com/synthetic-org|synthetic"
+
+
+def _iso(dt):
+    """Format a datetime the way Azure DevOps returns date fields."""
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def default_iteration_count(num_items):
+    """Roughly 100 items per sprint, between six months and ten years of history."""
+    return min(max(num_items // 100, 12), 260)
+
+
+def generate_iterations(num_iterations, project="Synthetic", dataset_id=SYNTHETIC_DATASET, team="Synthetic Team",
+                        start=None, sprint_days=14):
+    """Build `ado-iterations` documents for consecutive two-week sprints ending around today."""
+    if start is None:
+        start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        start -= timedelta(days=sprint_days * (num_iterations - 2))
+
+    iterations = []
+    for n in range(num_iterations):
+        start_date = start + timedelta(days=n * sprint_days)
+        finish_date = start_date + timedelta(days=sprint_days - 1)
+        iterations.append({
+            "id": f"00000000-0000-0000-0000-{n:012d}",
+            "name": f"Sprint {n + 1}",
+            "path": f"{project}\\Sprint {n + 1}",
+            "startDate": start_date,
+            "finishDate": finish_date,
+            "numUserStories": 0,
+            "numBugs": 0,
+            "sumEffortUserStories": 0,
+            "numUserStoriesDone": 0,
+            "numUserStoriesClosedLate": 0,
+            "dataset_id": dataset_id,
+            "teams": [team]
+        })
+    return iterations
+
+
+def generate_workitems(num_items, iterations, project="Synthetic", dataset_id=SYNTHETIC_DATASET,
+                       seed=42, now=None):
+    """Build `ado-workitems` documents (sanitized keys) spread over the given iterations.
+
+    Generation is fully determined by `seed`, so runs with the same arguments are comparable.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    types = list(TYPE_WEIGHTS)
+    weights = list(TYPE_WEIGHTS.values())
+    area_paths = [project] + [f"{project}\\Area {n}" for n in range(1, 6)]
+
+    workitems = []
+    for item_id in range(1, num_items + 1):
+        iteration = iterations[rng.randrange(len(iterations))]
+        start_date = iteration["startDate"]
+        finish_date = iteration["finishDate"]
+        wi_type = rng.choices(types, weights)[0]
+
+        # Nothing is created or activated after `now`, as in a real project
+        created = min(start_date - timedelta(days=rng.randint(0, 60), seconds=rng.randint(0, 86399)), now)
+        activated = None
+        closed = None
+
+        # Items in past sprints are mostly done; current/future sprints are mostly open
+        if start_date <= now and rng.random() < 0.9:
+            activated = min(start_date + timedelta(days=rng.randint(0, 6), seconds=rng.randint(0, 86399)), now)
+            if finish_date < now and rng.random() < 0.92:
+                # A small share spills over the sprint end
+                closed = activated + timedelta(days=rng.randint(1, 16), seconds=rng.randint(0, 86399))
+                if closed > now:
+                    closed = None
+
+        state = "Closed" if closed else rng.choice(STATES_OPEN[1:] if activated else STATES_OPEN[:1])
+        changed = closed or activated or created
+
+        doc = {
+            "System_Id": item_id,
+            "System_TeamProject": project,
+            "System_AreaPath": rng.choice(area_paths),
+            "System_IterationPath": iteration["path"],
+            "System_WorkItemType": wi_type,
+            "System_State": state,
+            "System_Title": f"{wi_type} {item_id}",
+            "System_CreatedDate": _iso(created),
+            "System_ChangedDate": _iso(changed),
+            "dataset_id": dataset_id
+        }
+        if wi_type != "Bug" and rng.random() < 0.85:
+            doc["Microsoft_VSTS_Scheduling_Effort"] = float(rng.choice(EFFORT_SCALE))
+        if activated:
+            doc["Microsoft_VSTS_Common_ActivatedDate"] = _iso(activated)
+        if closed:
+            doc["Microsoft_VSTS_Common_ClosedDate"] = _iso(closed)
+        workitems.append(doc)
+
+    return workitems
+
+
+def generate_dataset(num_items, num_iterations=None, seed=42, project="Synthetic",
+                     dataset_id=SYNTHETIC_DATASET, team="Synthetic Team"):
+    """Return `(iterations, workitems)` for a synthetic project of `num_items` work items."""
+    num_iterations = num_iterations or default_iteration_count(num_items)
+    iterations = generate_iterations(num_iterations, project=project, dataset_id=dataset_id, team=team)
+    workitems = generate_workitems(num_items, iterations, project=project, dataset_id=dataset_id, seed=seed)
+    return iterations, workitems